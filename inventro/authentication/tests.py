@@ -1,3 +1,29 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group, User
 
-# Create your tests here.
+from inventory.tests import QueryBudgetTestCase
+
+
+class AuthenticationQueryBudgetTests(QueryBudgetTestCase):
+    def test_login(self):
+        self.assertQueryBudget(0, "/")
+        self.client.force_login(self.user)
+        self.assertQueryBudget(2, "/")
+
+    def test_add_user(self):
+        Group.objects.create(name="STAFF")
+        self.client.force_login(self.user)
+        self.assertQueryBudget(2, "/user/")
+        self.assertQueryBudget(
+            7, "/user/", method="post",
+            data=lambda: {
+                "username": f"user{User.objects.count()}",
+                "password1": "a-long-Passw0rd",
+                "password2": "a-long-Passw0rd",
+                "role": "STAFF",
+            },
+        )
+
+    def test_logout(self):
+        # Logging out changes what the next request sees, so there is no second run after grow()
+        self.client.force_login(self.user)
+        self.assertLessEqual(self.count_queries("get", "/logout"), 4)
@@ -1,171 +1,156 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.utils import timezone
-from datetime import datetime, timedelta
-from django.db.models import Count, Q, F
-from inventory.models import Item, ItemCategory
-from decimal import Decimal
-import pandas as pd
+from inventory.models import StockMovement
+from inventory import cube, stats as inventory_stats
+from inventory.conditional import conditional, request_stats, stats_etag
+from inventory.pagination import KeysetPagination
+from django.utils.dateparse import parse_date
+
+from .metrics import BUCKETS, DEFAULT_MAX_POINTS, build_metrics
 
 
 @api_view(['GET'])
+@conditional(stats_etag)
 def dashboard_stats(request):
     """
-    Dashboard stats:
+    Dashboard stats, read from the incrementally maintained rollup:
       - total_items
-      - low_stock (in_stock <= total_amount and > 0, where total_amount is the minimum threshold)
+      - low_stock (0 < in_stock <= low_stock_bar)
       - out_of_stock (in_stock <= 0)
       - inventory_value (sum of in_stock * cost)
-      - new_items_7d (requires Item.created_at)
-      - categories (ItemCategory count via FK)
+      - new_items_7d
+      - categories (ItemCategory count)
     """
-    active_items = Item.objects.filter(is_active=True)
-
-    # Total items (only active)
-    total_items = active_items.count()
-
-    # Low stock / out of stock
-    # total_amount is the minimum quantity threshold
-    low_stock_count = active_items.filter(
-        Q(in_stock__lte=F('low_stock_bar')) & Q(in_stock__gt=0)
-    ).count()
-    out_of_stock_count = active_items.filter(in_stock__lte=0).count()
-
-    # Inventory value (in_stock * cost) — safe on SQLite using Python loop
-    total_value = Decimal('0')
-    for item in active_items:
-        qty = item.in_stock or 0
-        price = item.cost or 0
-        total_value += Decimal(str(qty)) * Decimal(str(price))
-    inventory_value = total_value
-
-    # New items (7d) — requires created_at DateTimeField on Item
-    seven_days_ago = timezone.now() - timedelta(days=7)
-    try:
-        new_items_count = Item.objects.filter(created_at__gte=seven_days_ago).count()
-    except Exception:
-        new_items_count = 0  # fallback if created_at doesn't exist
-
-    # Categories
-    try:
-        # If you have a FK Item.category -> ItemCategory(name=...)
-        categories_count = ItemCategory.objects.count()
-    except Exception:
-        # Else, category is a CharField on Item
-        categories_count = (
-            active_items.exclude(category__isnull=True)
-                        .exclude(category__exact='')
-                        .values('category').annotate(n=Count('id')).count()
-        )
-
+    rollup = request_stats(request)
     return Response({
-        'total_items': total_items,
-        'low_stock': low_stock_count,
-        'out_of_stock': out_of_stock_count,
-        'inventory_value': float(inventory_value),
-        'new_items_7d': new_items_count,
-        'categories': categories_count,
+        'total_items': rollup.total_items,
+        'low_stock': rollup.low_stock,
+        'out_of_stock': rollup.out_of_stock,
+        'inventory_value': float(rollup.inventory_value),
+        'new_items_7d': inventory_stats.new_items_since(7),
+        'categories': rollup.categories,
     })
 
 
 @api_view(['GET'])
-def metrics(_):
-    num_active_items = Item.objects.filter(is_active=True).count()
-    if num_active_items == 0:
-        return Response({
-            'inventoryTrend': '[]',
-            'categoryCount': '[]',
-            'valueOverTime': '[]',
-            'categoryValueTrends': '[]',
-        })
-    active_items = Item.objects.filter(is_active=True)
-    items_dataframe = pd.DataFrame.from_records(active_items.values("name", "in_stock", "total_amount", "location", "cost", "category__name", "created_at"))
-
-    # ---- Inventory Category Trend ----
-    cat_counts_over_time = items_dataframe['created_at'].dt.date.value_counts().sort_index().reset_index()
-    cat_counts_over_time.columns = ['date','count']
-    
-    # ---- Value Trend ----
-    value_over_time = items_dataframe.groupby(items_dataframe['created_at'].dt.date)['cost'].sum().reset_index()
-    value_over_time.columns = ['date', 'cost']
-
-    # ---- Category Value Trend ----
-    category_value = items_dataframe.groupby(items_dataframe['category__name'])['cost'].apply(list).reset_index()
-    category_value.columns = ['category', 'costs']
-
-    # ---- Category Count ----
-    category_counts = items_dataframe.groupby(items_dataframe['category__name']).size().reset_index(name='count')
-    category_counts.columns = ['category', 'count']
-    return Response({
-        'inventoryTrend': cat_counts_over_time.to_json(orient='records', date_format='iso'),
-        'categoryCount': category_counts.to_json(orient='records'),
-        'valueOverTime': value_over_time.to_json(orient='records', date_format='iso'),
-        'categoryValueTrends': category_value.to_json(orient='records'),
-    })
+def metrics(request):
+    """
+    Chart series, aggregated in the database.
+
+    Query parameters:
+      - from / to: ISO dates bounding Item.created_at (inclusive)
+      - bucket: day (default), week or month
+      - max_points: upper bound on points per series (default 500)
+    """
+    params = request.query_params if hasattr(request, 'query_params') else request.GET
+    try:
+        options = parse_metrics_params(params)
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=400)
+    return Response(build_metrics(**options))
+
+
+@api_view(['GET'])
+def metrics_cube(request):
+    """
+    Any slice or roll-up of the analytics cube (active items by category,
+    location and creation day), without reading the item table.
+
+    Query parameters:
+      - group_by: comma-separated category, location and/or date (default: no grouping, one total row)
+      - from / to / bucket: as for /api/metrics/; ``date`` groups by bucket
+      - category: category id to keep (repeatable)
+      - location: location to keep (repeatable; empty for items without one)
+    """
+    params = request.query_params
+    try:
+        options = parse_metrics_params(params)
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=400)
+    try:
+        categories = [int(value) for value in params.getlist('category')]
+    except ValueError:
+        return Response({'detail': "'category' must be a category id."}, status=400)
+    group_by = [name for name in (params.get('group_by') or '').split(',') if name]
+    unknown = set(group_by) - set(cube.GROUPS)
+    if unknown:
+        return Response({'detail': f"'group_by' takes {', '.join(cube.GROUPS)}."}, status=400)
+
+    rows = cube.rollup(
+        group_by, options.get('start'), options.get('end'),
+        categories=categories, locations=params.getlist('location'), bucket=options['bucket'],
+    )
+    for row in rows:
+        for field in ('inventory_value', 'total_cost'):
+            row[field] = float(row[field])
+        if 'date' in row:
+            row['date'] = row['date'].isoformat()
+    return Response({'results': rows})
+
+
+def parse_metrics_params(params) -> dict:
+    options = {}
+    for key, name in (('from', 'start'), ('to', 'end')):
+        value = params.get(key)
+        if value:
+            parsed = parse_date(value)
+            if parsed is None:
+                raise ValueError(f"'{key}' must be an ISO date (YYYY-MM-DD).")
+            options[name] = parsed
+    bucket = params.get('bucket') or 'day'
+    if bucket not in BUCKETS:
+        raise ValueError(f"'bucket' must be one of: {', '.join(BUCKETS)}.")
+    options['bucket'] = bucket
+    try:
+        max_points = int(params.get('max_points') or DEFAULT_MAX_POINTS)
+    except ValueError:
+        raise ValueError("'max_points' must be an integer.")
+    options['max_points'] = min(max(max_points, 2), 5000)
+    return options
+
+
+class ActivityPagination(KeysetPagination):
+    ordering = ('-id',)
+    page_size = 10
+    max_page_size = 100
+
+    def default_count(self):
+        # The ledger only grows; a feed has no use for its size
+        return None
+
+
+ACTIONS = {
+    StockMovement.REASON_CREATE: 'created',
+    StockMovement.REASON_DELETE: 'deleted',
+}
+
+
+def _activity(movement):
+    summary = movement.get_reason_display()
+    if movement.delta:
+        summary = f"{summary} ({movement.delta:+d})"
+    user = movement.actor
+    return {
+        'id': movement.item_id,
+        'name': movement.item.name,
+        'action': ACTIONS.get(movement.reason, 'updated'),
+        'reason': movement.reason,
+        'delta': movement.delta,
+        'summary': summary,
+        'user': (user.get_full_name() or user.username) if user else None,
+        'timestamp': movement.created_at.isoformat(),
+    }
 
 
 @api_view(['GET'])
 def recent_activity(request):
     """
-    Returns the latest item events (created/updated/deleted) based on timestamps.
-    This is a lightweight approximation suitable for dashboards.
+    The stock ledger, newest first: one entry per item write with its actor,
+    reason and stock change. Cursor-paginated (``cursor``, ``page_size``,
+    default 10); items and actors come in the same query.
     """
-    qs = Item.objects.order_by('-updated_at')[:10]
-
-    def classify(item):
-        if not item.is_active:
-            return 'deleted'
-        if item.created_at and item.updated_at and (item.updated_at - item.created_at) < timedelta(minutes=1):
-            return 'created'
-        return 'updated'
-
-    def actor(item):
-        user = item.updated_by or item.created_by
-        if not user:
-            return None
-        return user.get_full_name() or user.username
-
-    results = []
-    for item in qs:
-        action = classify(item)
-        results.append({
-            'id': item.id,
-            'name': item.name,
-            'action': action,
-            'summary': 'Removed from inventory' if action == 'deleted'
-                       else ('New item added' if action == 'created' else 'Details updated'),
-            'user': actor(item),
-            'timestamp': item.updated_at.isoformat() if item.updated_at else None,
-        })
-
-    if not results:
-        # demo fallback so UI is never blank
-        now = timezone.now()
-        results = [
-            {
-                'id': 0,
-                'name': 'Wireless Mouse',
-                'action': 'updated',
-                'summary': 'Quantity updated from 150 to 145',
-                'user': 'System',
-                'timestamp': (now - timedelta(minutes=2)).isoformat(),
-            },
-            {
-                'id': 0,
-                'name': 'USB-C Hub',
-                'action': 'created',
-                'summary': 'New item added',
-                'user': 'System',
-                'timestamp': (now - timedelta(hours=1)).isoformat(),
-            },
-            {
-                'id': 0,
-                'name': 'Old Monitor',
-                'action': 'deleted',
-                'summary': 'Removed from inventory',
-                'user': 'System',
-                'timestamp': (now - timedelta(hours=3)).isoformat(),
-            },
-        ]
-
-    return Response({'results': results})
+    movements = (StockMovement.objects.select_related('item', 'actor')
+                 .exclude(reason=StockMovement.REASON_OPENING))
+    paginator = ActivityPagination()
+    page = paginator.paginate_queryset(movements, request)
+    return paginator.get_paginated_response([_activity(movement) for movement in page])
@@ -1,5 +1,8 @@
 import json
-from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer, AsyncWebsocketConsumer
+
+from inventory import deltas
 
 
 class LowStockConsumer(AsyncWebsocketConsumer):
@@ -18,11 +21,95 @@ class LowStockConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def low_stock_alert(self, event):
+        # One message per batch of items that just went low
         await self.send(
             text_data=json.dumps(
                 {
                     "type": "low_stock",
-                    "item": event.get("item", {}),
+                    "items": event.get("items", []),
                 }
             )
         )
+
+
+class InventoryDeltaConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Streams item deltas to open inventory screens.
+
+    Clients send ``{"action": "subscribe", "categories": [...], "items": [...],
+    "since": <version>}``; empty ``categories`` and ``items`` mean every item.
+    With ``since`` the server first replays what changed since that version,
+    or sends ``reset`` when too much did and the client should reload. Deleted
+    items replay as inactive. ``subscribed`` messages, and ``delta`` messages
+    once one has settled, carry the version to resume from next time (see
+    ``inventory.deltas``).
+    """
+
+    group_name = deltas.GROUP
+    max_ids = 1000
+    catch_up_limit = 500
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if not user or not user.is_authenticated:
+            await self.close()
+            return
+        self.categories = self.item_ids = None
+        self.joined = False
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if getattr(self, "joined", False):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        if not isinstance(content, dict) or content.get("action") != "subscribe":
+            await self.send_json({"type": "error", "error": "Expected a subscribe action."})
+            return
+        try:
+            categories = self._ids(content.get("categories"))
+            item_ids = self._ids(content.get("items"))
+            since = int(content["since"]) if content.get("since") is not None else None
+        except (TypeError, ValueError):
+            await self.send_json({"type": "error", "error": "categories and items must be lists of ids, since a version."})
+            return
+
+        self.categories, self.item_ids = categories, item_ids
+        if not self.joined:
+            # Join before reading so nothing committed in between is missed
+            await self.channel_layer.group_add(self.group_name, self.channel_name)
+            self.joined = True
+
+        # Read the version before replaying: everything below it has committed by then
+        version = await database_sync_to_async(deltas.current_version)()
+        if since is not None:
+            rows, complete = await database_sync_to_async(deltas.changed_since)(
+                since, categories, item_ids, self.catch_up_limit
+            )
+            if not complete or since > version:
+                # Too far behind, or a version this server never handed out
+                await self.send_json({"type": "reset", "version": version})
+            elif rows:
+                await self.send_json({"type": "delta", "items": rows, "version": version})
+        await self.send_json({"type": "subscribed", "version": version})
+
+    def _ids(self, value):
+        if value in (None, []):
+            return None
+        if not isinstance(value, list) or len(value) > self.max_ids:
+            raise ValueError(value)
+        return {int(pk) for pk in value}
+
+    def wants(self, row):
+        if self.categories is None and self.item_ids is None:
+            return True
+        return ((self.categories is not None and row["category"] in self.categories)
+                or (self.item_ids is not None and row["id"] in self.item_ids))
+
+    async def inventory_delta(self, event):
+        rows = [row for row in event["items"] if self.wants(row)]
+        if rows:
+            message = {"type": "delta", "items": rows}
+            if "version" in event:
+                message["version"] = event["version"]
+            await self.send_json(message)
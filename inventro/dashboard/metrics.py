@@ -0,0 +1,104 @@
+"""
+Time-series metrics for the dashboard charts.
+
+The counts and value series are roll-ups of the analytics cube (see
+``inventory.cube``) and the cost spread is sampled from its cost histogram,
+so none of them read the item table. Python sees one row per bucket and
+series longer than ``max_points`` are merged into wider buckets before they
+are returned.
+"""
+from __future__ import annotations
+
+import json
+import math
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+from inventory import cube
+from inventory.models import Item
+
+BUCKETS = ("day", "week", "month")
+DEFAULT_MAX_POINTS = 500
+
+
+def _midnight(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def active_items(start: date | None = None, end: date | None = None):
+    # Plain created_at range (not __date) so an index on created_at can be used
+    qs = Item.objects.filter(is_active=True)
+    if start:
+        qs = qs.filter(created_at__gte=_midnight(start))
+    if end:
+        qs = qs.filter(created_at__lt=_midnight(end + timedelta(days=1)))
+    return qs
+
+
+def downsample(series: list[dict], max_points: int) -> list[dict]:
+    """Merge runs of adjacent buckets so at most ``max_points`` remain.
+
+    Values are per-bucket totals, so merged buckets are summed and take the
+    date of their first member.
+    """
+    if len(series) <= max_points:
+        return series
+    size = math.ceil(len(series) / max_points)
+    merged = []
+    for start in range(0, len(series), size):
+        group = series[start:start + size]
+        point = {"date": group[0]["date"]}
+        for key in group[0]:
+            if key != "date":
+                point[key] = sum(row[key] for row in group)
+        merged.append(point)
+    return merged
+
+
+def category_cost_samples(distribution: dict, max_points: int) -> list[dict]:
+    """Per category, up to ``max_points`` costs spread evenly over the sorted distribution.
+
+    ``distribution`` is :func:`inventory.cube.cost_distribution`: each
+    category's cost buckets in ascending order with their item counts. Every
+    k-th item is kept, k picked per category, so the chart gets the shape of
+    the distribution (to the bucket's two significant figures) without the
+    full list.
+    """
+    samples = []
+    for name, buckets in distribution.items():
+        size = sum(items for _, items in buckets)
+        step = math.ceil(size / max_points)
+        costs, position = [], 0
+        for cost, items in buckets:
+            # Positions position .. position + items - 1 fall in this bucket; keep the multiples of step
+            first = -(-position // step) * step
+            costs += [float(cost)] * len(range(first, position + items, step))
+            position += items
+        samples.append({"category": name, "costs": costs})
+    return samples
+
+
+def _records(rows, value_key, out_key, cast=float):
+    return [
+        {"date": row["date"].isoformat(), out_key: cast(row[value_key] or 0)}
+        for row in rows
+    ]
+
+
+def build_metrics(start=None, end=None, bucket="day", max_points=DEFAULT_MAX_POINTS) -> dict:
+    """Payload for ``/api/metrics/``; each series is a JSON string, as the charts expect."""
+    series = downsample([
+        {"date": row["date"], "count": row["total_items"], "cost": row["total_cost"]}
+        for row in cube.rollup(("date",), start, end, bucket=bucket) if row["total_items"]
+    ], max_points)
+    categories = [
+        {"category": row["category"], "count": row["total_items"]}
+        for row in cube.rollup(("category",), start, end) if row["total_items"]
+    ]
+    return {
+        "inventoryTrend": json.dumps(_records(series, "count", "count", int)),
+        "categoryCount": json.dumps(categories),
+        "valueOverTime": json.dumps(_records(series, "cost", "cost")),
+        "categoryValueTrends": json.dumps(category_cost_samples(cube.cost_distribution(start, end), max_points)),
+    }
@@ -1,3 +1,164 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from inventory import alerts, cube, deltas
+from inventory.models import Item, ItemCategory
+from inventory.tests import QueryBudgetTestCase, make_items
+
+from .consumers import InventoryDeltaConsumer
+from .metrics import build_metrics
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        for days, item in enumerate(make_items(60)):
+            Item.objects.filter(pk=item.pk).update(cost=days, created_at=now - timedelta(days=days))
+        # The updates bypass the signals that keep the cube current
+        cube.refresh()
+
+    def series(self, response, key):
+        return json.loads(response.json()[key])
+
+    def test_series_are_bounded_by_max_points(self):
+        metrics = build_metrics(max_points=10)
+
+        trend = json.loads(metrics["inventoryTrend"])
+        self.assertLessEqual(len(trend), 10)
+        self.assertEqual(sum(point["count"] for point in trend), 60)
+        costs, = json.loads(metrics["categoryValueTrends"])
+        self.assertLessEqual(len(costs["costs"]), 10)
+        self.assertEqual(costs["costs"][0], 0.0)
+
+    def test_range_and_bucket_parameters(self):
+        start = (timezone.now() - timedelta(days=13)).date().isoformat()
+        response = self.client.get("/api/metrics/", {"from": start, "bucket": "week"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(p["count"] for p in self.series(response, "inventoryTrend")), 14)
+        self.assertLessEqual(len(self.series(response, "inventoryTrend")), 3)
+
+    def test_series_never_read_the_item_table(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/metrics/", {"bucket": "week"})
+
+        self.assertEqual(len(json.loads(response.json()["categoryValueTrends"])[0]["costs"]), 60)
+        self.assertFalse([query["sql"] for query in ctx.captured_queries if '"inventory_item"' in query["sql"]])
+
+    def test_rejects_unknown_bucket(self):
+        response = self.client.get("/api/metrics/", {"bucket": "year"})
+        self.assertEqual(response.status_code, 400)
+
+
+# The consumer reads through database_sync_to_async, which closes the connection a TestCase shares
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class InventoryDeltaConsumerTests(TransactionTestCase):
+    def setUp(self):
+        # Only the deltas each test sends itself should reach the consumer
+        for publisher in (alerts.alerts, deltas.publisher):
+            patcher = mock.patch.object(publisher, "submit")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user("staff", password="pw")
+        self.audio = make_items(2)
+        self.video = make_items(1, category=ItemCategory.objects.create(name="Video"))
+        self.version = deltas.current_version()
+        for item in (self.audio[0], self.video[0]):
+            item.in_stock = 7
+            item.save()
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(InventoryDeltaConsumer.as_asgi(), "/ws/inventory/")
+        communicator.scope["user"] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    def test_resume_replays_only_subscribed_changes_then_filters_the_stream(self):
+        async def scenario():
+            communicator = await self.connect()
+            await communicator.send_json_to({
+                "action": "subscribe", "categories": [self.audio[0].category_id], "since": self.version,
+            })
+            replay = await communicator.receive_json_from()
+            subscribed = await communicator.receive_json_from()
+
+            await get_channel_layer().group_send(deltas.GROUP, {"type": "inventory_delta", "items": [
+                deltas.item_delta(self.video[0]), deltas.item_delta(self.audio[1]),
+            ]})
+            live = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return replay, subscribed, live
+
+        replay, subscribed, live = async_to_sync(scenario)()
+
+        self.assertEqual(replay["type"], "delta")
+        self.assertEqual([(row["id"], row["in_stock"]) for row in replay["items"]], [(self.audio[0].pk, 7)])
+        self.assertEqual(subscribed, {"type": "subscribed", "version": deltas.current_version()})
+        self.assertEqual([row["id"] for row in live["items"]], [self.audio[1].pk])
+
+    def test_resume_from_far_behind_asks_for_a_reload(self):
+        async def scenario():
+            communicator = await self.connect()
+            await communicator.send_json_to({"action": "subscribe", "since": self.version})
+            reply = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return reply
+
+        with mock.patch.object(InventoryDeltaConsumer, "catch_up_limit", 1):
+            reply = async_to_sync(scenario)()
+
+        self.assertEqual(reply["type"], "reset")
+
+    def test_resume_replays_hard_deletes(self):
+        gone = self.audio[1].pk
+        self.audio[1].delete()
+
+        async def scenario():
+            communicator = await self.connect()
+            await communicator.send_json_to({"action": "subscribe", "items": [gone], "since": self.version})
+            reply = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return reply
+
+        reply = async_to_sync(scenario)()
+
+        self.assertEqual(reply["type"], "delta")
+        self.assertEqual([(row["id"], row["is_active"]) for row in reply["items"]], [(gone, False)])
+
+    def test_unknown_version_asks_for_a_reload(self):
+        since = deltas.current_version() + 1000
+
+        async def scenario():
+            communicator = await self.connect()
+            await communicator.send_json_to({"action": "subscribe", "since": since})
+            reply = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return reply
+
+        self.assertEqual(async_to_sync(scenario)()["type"], "reset")
+
+
+class DashboardQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_pages(self):
+        self.assertQueryBudget(8, "/dashboard/")
+        self.assertQueryBudget(9, "/dashboard/analytics/")
+
+    def test_api(self):
+        self.assertQueryBudget(4, "/api/stats/")
+        self.assertQueryBudget(6, "/api/metrics/")
+        self.assertQueryBudget(6, "/api/metrics/", data={"bucket": "week", "max_points": 5})
+        self.assertQueryBudget(3, "/api/activity/")
@@ -5,20 +5,20 @@ from django.http import JsonResponse
 
 
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum
+from django.db.models import Count, Sum
 from django.http import JsonResponse
 from django.shortcuts import render
 from django.utils import timezone
 from datetime import timedelta
 from inventory.models import Item, ItemCategory
-from django.db.models import F
+from inventory import cube, stats as inventory_stats
 
-from .api_views import metrics as get_other_metrics
+from .metrics import build_metrics
 
 
 @login_required
 def index(request):
-    metrics2 = get_other_metrics(request).data
+    metrics2 = build_metrics()
     return render(request, "dashboard/index.html", {"metrics": _metrics_dict(), "metrics2": metrics2})
 
 @login_required
@@ -30,18 +30,18 @@ def analytics(request):
     this page.
     """
     metrics = _metrics_dict()
-    metrics2 = get_other_metrics(request).data
+    metrics2 = build_metrics()
     low_stock_count = metrics.get("low_stock")
     out_of_stock_count = metrics.get("out_of_stock")
     in_stock_count = metrics.get("total_items") - low_stock_count - out_of_stock_count
-    items = ItemCategory.objects.all()
-    
+    # Active items per category, rolled up from the analytics cube
     cat_counts = [
         {
-            "name": category.name,
-            "total": category.items.count(),
+            "name": row["category"],
+            "total": row["total_items"],
         }
-        for category in items
+        for row in cube.rollup(("category",))
+        if row["total_items"]
     ]
     context = {
         "metrics": metrics,
@@ -83,21 +83,17 @@ def _metrics_dict():
     as a fallback.
     """
 
-    qs = Item.objects.filter(is_active=True)
-    total_items = qs.count()
-    # Items at or below the low stock threshold
-    low_stock = qs.filter(in_stock__lte=F("low_stock_bar"), in_stock__gt=0).count()
-    # Items completely out of stock
-    out_of_stock = qs.filter(in_stock=0).count()
-    # Aggregate the total number of units
-    total_quantity = qs.aggregate(total=Sum("in_stock"))["total"] or 0
+    # All of these come from the stats rollup (one read summing its shards)
+    rollup = inventory_stats.get()
+    total_items = rollup.total_items
+    low_stock = rollup.low_stock
+    out_of_stock = rollup.out_of_stock
+    total_quantity = rollup.total_quantity
     # Sum of ``cost`` from the product catalogue as a crude inventory value
-    inventory_value = qs.aggregate(total=Sum("cost"))["total"] or 0
+    inventory_value = rollup.total_cost
     # Count items created in the last 7 days
-    seven_days_ago = timezone.now() - timedelta(days=7)
-    new_items_7d = qs.filter(created_at__gte=seven_days_ago).count()
-    # Count distinct categories represented in the inventory via the related product
-    categories = ItemCategory.objects.count()
+    new_items_7d = inventory_stats.new_items_since(7)
+    categories = rollup.categories
 
     return {
         "total_items": total_items,
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Item, ItemCategory, InventoryItem
+from .models import Item, ItemCategory, InventoryItem, OutboxEvent
 
 class CategoryListFilter(admin.SimpleListFilter):
     title = "category"
@@ -12,7 +12,7 @@ class CategoryListFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value():
-            return queryset.filter(item__category_id=self.value())
+            return queryset.filter(category_id=self.value())
         return queryset
 
 
@@ -21,7 +21,7 @@ class ItemAdmin(admin.ModelAdmin):
     # Show a readable Category column derived from the related Item
     list_display = (
         "name",
-        "category",          # <-- callable defined below
+        "category",
         "location",
         "in_stock",
         "total_amount",
@@ -29,22 +29,25 @@ class ItemAdmin(admin.ModelAdmin):
         "updated_at",
     )
 
-    # Filter by related category and by location
+    list_select_related = ("category",)
+
+    # Filter by category and by location
     list_filter = (
-        CategoryListFilter,  # <-- custom filter through item__category
+        CategoryListFilter,
         "location",
     )
 
     search_fields = (
         "name",
+        "sku",
         "location",
-        "item__name",
     )
 
     ordering = ("name",)
 
-    def category(self, obj):
-        # Gracefully handle items without category
-        return getattr(getattr(obj, "item", None), "category", None)
-    category.short_description = "Category"
-    category.admin_order_field = "item__category"
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "topic", "status", "attempts", "available_at", "created_at")
+    list_filter = ("status", "topic")
+    readonly_fields = ("last_error",)
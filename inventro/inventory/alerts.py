@@ -0,0 +1,123 @@
+"""
+Coalesced low-stock alerts for the ``low_stock`` WebSocket group.
+
+Writes hand the ids of items that just dropped below ``total_amount`` to
+:func:`submit` once their transaction commits. A background thread per
+process waits ``INVENTRO_LOW_STOCK_ALERT_DELAY`` seconds to let a burst
+(a checkout, an import) gather, re-reads the items that are still low in one
+query and sends them as a single ``low_stock_alert`` message. An item that
+was announced less than ``INVENTRO_LOW_STOCK_ALERT_WINDOW`` seconds ago is
+left out, so stock bouncing around the threshold doesn't flood dashboards.
+
+Saves never wait on the channel layer; if it is down the batch is logged and
+dropped, like any other best-effort notification.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, models
+
+from .channel_layer import close_sender
+from .models import Item
+
+LOGGER = logging.getLogger(__name__)
+
+GROUP = "low_stock"
+
+
+def build_payload(item: Item) -> dict:
+    return {
+        "id": item.pk,
+        "name": item.name,
+        "sku": item.sku,
+        "in_stock": item.in_stock,
+        "min_qty": item.total_amount,
+        "category": getattr(item.category, "name", ""),
+    }
+
+
+class LowStockAlerts:
+    def __init__(self, window: float = 300, delay: float = 1.0, group: str = GROUP):
+        self.window = window
+        self.delay = delay
+        self.group = group
+        self._lock = threading.Lock()
+        self._pending: set[int] = set()
+        self._sent: dict[int, float] = {}
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def submit(self, item_ids):
+        """Queue items for the next batch; returns immediately."""
+        with self._lock:
+            self._pending.update(item_ids)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="low-stock-alerts", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait()
+            if not self._stopping.is_set():
+                time.sleep(self.delay)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                LOGGER.exception("Could not send low-stock alerts")
+            finally:
+                close_old_connections()
+        close_sender(get_channel_layer())
+
+    def stop(self, timeout: float = 5.0):
+        """Send what is pending, end the thread and close the layer's sending connection."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        thread.join(timeout)
+        self._stopping.clear()
+
+    def flush(self) -> list[dict]:
+        """Send everything pending now; returns the payloads that went out."""
+        with self._lock:
+            ids, self._pending = self._pending, set()
+        now = time.monotonic()
+        self._sent = {pk: at for pk, at in self._sent.items() if now - at < self.window}
+        ids = [pk for pk in ids if pk not in self._sent]
+        if not ids:
+            return []
+
+        # Only items that are still low by the time the batch goes out
+        items = (Item.objects.filter(pk__in=ids, is_active=True, in_stock__lt=models.F("total_amount"))
+                 .select_related("category").order_by("name", "id"))
+        payloads = [build_payload(item) for item in items]
+        layer = get_channel_layer()
+        if not payloads or layer is None:
+            return []
+        async_to_sync(layer.group_send)(self.group, {"type": "low_stock_alert", "items": payloads})
+        for payload in payloads:
+            self._sent[payload["id"]] = now
+        return payloads
+
+
+alerts = LowStockAlerts(
+    window=getattr(settings, "INVENTRO_LOW_STOCK_ALERT_WINDOW", 300),
+    delay=getattr(settings, "INVENTRO_LOW_STOCK_ALERT_DELAY", 1.0),
+)
+atexit.register(alerts.stop)
+
+
+def submit(item_ids):
+    alerts.submit(item_ids)
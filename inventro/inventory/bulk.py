@@ -0,0 +1,167 @@
+"""
+Bulk item writes behind ``POST /api/items/bulk/``.
+
+A request carries up to three arrays::
+
+    {"create": [{...item fields...}],
+     "update": [{"id": 1, ...changed fields...}, {"sku": "A-001", ...}],
+     "delete": [1, "A-002"]}
+
+Every row is validated first, with the referenced items and categories read
+in one query each; if anything is wrong nothing is written and the errors
+come back by array and position. Updates can't take ``in_stock`` below what
+carts hold, and ones that move it bump ``Item.version``. Otherwise the writes go out in one
+transaction as ``bulk_create``/``bulk_update`` statements (deletes are soft,
+like ``ItemViewSet.destroy``) and a single ``items_changed`` covers them all,
+so stats, search indexing and alerts see one batch.
+"""
+from __future__ import annotations
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import Item, ItemCategory
+from .serializers import BulkItemSerializer
+from .signals import ItemChange, items_changed
+
+ACTIONS = ("create", "update", "delete")
+MAX_ROWS = 50_000
+# Rows per UPDATE; bulk_update's CASE expressions get slow when much longer
+UPDATE_BATCH = 1000
+
+
+class BulkError(Exception):
+    """Raised with ``errors`` shaped like the request when nothing was written."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _key(value):
+    """An item reference: an int is an id, anything else a SKU."""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, int):
+        return "id", value
+    if isinstance(value, str) and value.strip():
+        return "sku", value.strip()
+    raise ValueError(value)
+
+
+def _update_key(row):
+    if not isinstance(row, dict):
+        raise ValueError(row)
+    return _key(row["id"]) if "id" in row else _key(row.get("sku"))
+
+
+def _lookup(refs):
+    """Lock and fetch items by ("id", pk) and ("sku", sku); a SKU shared by several items maps to None."""
+    ids = [value for kind, value in refs if kind == "id"]
+    skus = [value for kind, value in refs if kind == "sku"]
+    found = {}
+    if not ids and not skus:
+        return found
+    # Lock in primary-key order so concurrent writers (checkout, other bulk requests) can't deadlock
+    locked = (Item.objects.select_for_update(of=("self",))
+              .filter(models.Q(pk__in=ids) | models.Q(sku__in=skus)).order_by("pk"))
+    for item in locked:
+        if item.pk in ids:
+            found["id", item.pk] = item
+        if item.sku in skus:
+            found["sku", item.sku] = None if ("sku", item.sku) in found else item
+    return found
+
+
+def apply(data, user=None) -> dict:
+    """Validate and apply a bulk request; returns the ids created, updated and deleted."""
+    if not isinstance(data, dict) or not set(data) <= set(ACTIONS):
+        raise BulkError({"non_field_errors": [f"Expected an object with {', '.join(ACTIONS)} arrays."]})
+    rows = {action: data.get(action) or [] for action in ACTIONS}
+    if not all(isinstance(value, list) for value in rows.values()):
+        raise BulkError({"non_field_errors": ["create, update and delete must be arrays."]})
+    if sum(map(len, rows.values())) > MAX_ROWS:
+        raise BulkError({"non_field_errors": [f"At most {MAX_ROWS} rows per request."]})
+
+    errors = {action: [{} for _ in rows[action]] for action in ACTIONS}
+    refs = {}
+    for action in ("update", "delete"):
+        for i, row in enumerate(rows[action]):
+            try:
+                refs[action, i] = _update_key(row) if action == "update" else _key(row)
+            except (KeyError, ValueError):
+                errors[action][i] = {"non_field_errors": ["Reference an item by integer id or SKU."]}
+
+    with transaction.atomic():
+        items = _lookup(refs.values())
+        category_ids = {row.get("category_id") for action in ("create", "update") for row in rows[action]
+                        if isinstance(row, dict)}
+        categories = ItemCategory.objects.in_bulk([pk for pk in category_ids if isinstance(pk, int)])
+        context = {"categories": categories}
+
+        creates = []
+        for i, row in enumerate(rows["create"]):
+            serializer = BulkItemSerializer(data=row, context=context)
+            if not serializer.is_valid():
+                errors["create"][i] = serializer.errors
+            elif "category" not in serializer.validated_data:
+                errors["create"][i] = {"category_id": ["This field is required."]}
+            else:
+                creates.append(Item(**serializer.validated_data, created_by=user, updated_by=user))
+
+        touched, deleted = {}, set()
+        for action in ("update", "delete"):
+            for i, row in enumerate(rows[action]):
+                if (action, i) not in refs:
+                    continue
+                ref = refs[action, i]
+                item = items.get(ref)
+                if item is None:
+                    reason = "SKU matches several items; use the id." if ref in items else "No such item."
+                    errors[action][i] = {"non_field_errors": [reason]}
+                    continue
+                if item.pk in touched:
+                    errors[action][i] = {"non_field_errors": ["Item appears more than once in this request."]}
+                    continue
+                if action == "delete":
+                    touched[item.pk] = (item, {"is_active": False})
+                    deleted.add(item.pk)
+                    continue
+                fields = {key: value for key, value in row.items() if key != "id"}
+                serializer = BulkItemSerializer(item, data=fields, partial=True, context=context)
+                if serializer.is_valid():
+                    touched[item.pk] = (item, serializer.validated_data)
+                else:
+                    errors[action][i] = serializer.errors
+
+        if any(any(row) for row in errors.values()):
+            raise BulkError({action: rows for action, rows in errors.items() if any(rows)})
+
+        now = timezone.now()
+        changes = []
+        update_fields = {"updated_at", "updated_by"}
+        for item, values in touched.values():
+            for name, value in values.items():
+                setattr(item, name, value)
+            if "in_stock" in item.changed_fields:
+                # The row is locked, so this is one past the version the UPDATE replaces
+                item.version += 1
+            update_fields.update(item.changed_fields)
+            changes.append(ItemChange(item, {name: item.previous_value(name) for name in item.changed_fields}))
+            item.updated_at = now
+            item.updated_by = user
+        if touched:
+            Item.objects.bulk_update([item for item, _ in touched.values()], sorted(update_fields),
+                                     batch_size=UPDATE_BATCH)
+        created = Item.objects.bulk_create(creates)
+        changes.extend(ItemChange(item, created=True) for item in created)
+
+        # bulk statements skip post_save; announce the whole request at once
+        if changes:
+            items_changed.send(sender=Item, changes=changes)
+
+    return {
+        "created": [item.pk for item in created],
+        "updated": sorted(set(touched) - deleted),
+        "deleted": sorted(deleted),
+    }
@@ -0,0 +1,352 @@
+"""
+Channel layer on PostgreSQL LISTEN/NOTIFY.
+
+Lets WebSocket consumers in any worker or pod receive ``group_send``s made
+anywhere else, using the database we already run instead of Redis.
+
+* Every process LISTENs on one Postgres channel per process-specific channel
+  prefix it hands out (``new_channel``) and one per group it has local
+  members in. Group membership itself is kept in memory, per process, so a
+  ``group_send`` is a single NOTIFY however many consumers are listening;
+  each process fans it out to its own members.
+* Messages are msgpack-encoded and carry their expiry time. A NOTIFY payload
+  is limited to 8000 bytes, so larger messages are written to
+  ``ChannelMessage`` and the notification carries only the row id. Those
+  rows are read by every listening process and purged once expired.
+  Notifications are buffered per poll and spilled rows resolved in place,
+  so messages are delivered in the order they were sent.
+* Capacity is enforced on the receiving side: a full channel drops the
+  message (and ``send`` raises ``ChannelFull`` when the channel is local).
+* Named channels without ``!`` work too, but every process that receives on
+  one gets every message sent to it.
+
+Sends go through one blocking autocommit connection per process, run in a
+thread, so callers using ``async_to_sync`` from WSGI workers don't open a
+connection per event loop. Receiving uses an async connection owned by a
+listener task on the consumer's event loop. Background publishers call
+:func:`close_sender` when they stop so no connection outlives them.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from copy import deepcopy
+
+import msgpack
+import psycopg
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_LIMIT = 7900
+SPILL_PREFIX = "@"
+PURGE_INTERVAL = 60
+
+
+def _conninfo(alias):
+    params = connections[alias].settings_dict
+    kwargs = {
+        "dbname": params["NAME"],
+        "user": params.get("USER") or None,
+        "password": params.get("PASSWORD") or None,
+        "host": params.get("HOST") or None,
+        "port": params.get("PORT") or None,
+        **params.get("OPTIONS", {}),
+    }
+    return {k: v for k, v in kwargs.items() if v is not None}
+
+
+def close_sender(layer):
+    """Close ``layer``'s sending connection if it keeps one open."""
+    close = getattr(layer, "close_sender", None)
+    if close is not None:
+        close()
+
+
+class PostgresChannelLayer(BaseChannelLayer):
+    extensions = ["groups", "flush"]
+
+    def __init__(self, alias="default", prefix="asgi", expiry=60, group_expiry=86400, capacity=100,
+                 channel_capacity=None, poll_interval=0.2):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.alias = alias
+        self.prefix = prefix
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.client_prefix = uuid.uuid4().hex
+
+        self._send_conn = None
+        self._send_lock = threading.Lock()
+        self._last_purge = 0.0
+        self._reset_local()
+
+    def _reset_local(self):
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._groups: dict[str, dict[str, float]] = {}
+        self._listening: set[str] = set()
+        self._pending: list[tuple[str, str, asyncio.Future]] = []
+        self._listener: asyncio.Task | None = None
+        self._loop = None
+
+    # --- Naming ---
+
+    def pg_channel(self, name: str) -> str:
+        """The Postgres channel for a layer channel or group name (identifiers max out at 63 bytes)."""
+        return f"{self.prefix}_{hashlib.blake2b(name.encode(), digest_size=16).hexdigest()}"
+
+    def _group_key(self, group):
+        return f"group:{group}"
+
+    def _channel_key(self, channel):
+        # Process-specific channels share their process's Postgres channel
+        return f"channel:{channel.split('!', 1)[0]}"
+
+    # --- Encoding ---
+
+    def _decode(self, payload: bytes | str) -> dict:
+        if isinstance(payload, str):
+            payload = base64.b64decode(payload)
+        return msgpack.unpackb(payload, raw=False)
+
+    # --- Sending (blocking connection, run in a thread) ---
+
+    def _connect_sender(self):
+        if self._send_conn is None or self._send_conn.closed:
+            self._send_conn = psycopg.connect(**_conninfo(self.alias), autocommit=True)
+        return self._send_conn
+
+    def _table(self):
+        from .models import ChannelMessage
+        return ChannelMessage._meta.db_table
+
+    def _notify_blocking(self, key: str, envelope: dict):
+        packed = msgpack.packb(envelope, use_bin_type=True)
+        payload = base64.b64encode(packed).decode()
+        with self._send_lock:
+            for attempt in (1, 2):
+                try:
+                    conn = self._connect_sender()
+                    if len(payload) > NOTIFY_LIMIT:
+                        payload = self._spill(conn, packed, envelope["e"])
+                    conn.execute("SELECT pg_notify(%s, %s)", (self.pg_channel(key), payload))
+                    return
+                except psycopg.OperationalError:
+                    # Dropped connection (server restart, idle timeout): reconnect once
+                    self._send_conn = None
+                    if attempt == 2:
+                        raise
+
+    def _spill(self, conn, packed: bytes, expires: float) -> str:
+        table = self._table()
+        now = time.time()
+        if now - self._last_purge > PURGE_INTERVAL:
+            conn.execute(f"DELETE FROM {table} WHERE expires_at < now()")
+            self._last_purge = now
+        row = conn.execute(
+            f"INSERT INTO {table} (payload, expires_at) VALUES (%s, to_timestamp(%s)) RETURNING id",
+            (packed, expires),
+        ).fetchone()
+        return f"{SPILL_PREFIX}{row[0]}"
+
+    def _fetch_spilled(self, ids: list[int]) -> dict[int, bytes]:
+        with self._send_lock:
+            rows = self._connect_sender().execute(
+                f"SELECT id, payload FROM {self._table()} WHERE id = ANY(%s)", (ids,)
+            ).fetchall()
+        return {row_id: bytes(payload) for row_id, payload in rows}
+
+    async def _notify(self, key: str, envelope: dict):
+        await asyncio.to_thread(self._notify_blocking, key, envelope)
+
+    # --- Channel layer API ---
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        assert "__asgi_channel__" not in message
+
+        envelope = {"c": channel, "m": message, "e": time.time() + self.expiry}
+        key = self._channel_key(channel)
+        if "!" in channel and key in self._listening and self._loop is asyncio.get_running_loop():
+            # One of our own process-specific channels: skip the round trip through the database
+            if not self._deliver(channel, envelope["e"], deepcopy(message)):
+                raise ChannelFull(channel)
+            return
+        await self._notify(key, envelope)
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        await self._subscribe(self._channel_key(channel))
+        queue = self._queues.setdefault(channel, asyncio.Queue())
+        while True:
+            expires, message = await queue.get()
+            if expires >= time.time():
+                return message
+
+    async def new_channel(self, prefix="specific."):
+        channel = f"{prefix}{self.client_prefix}!{uuid.uuid4().hex[:12]}"
+        await self._subscribe(self._channel_key(channel))
+        return channel
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        self._ensure_listener()
+        self._groups.setdefault(group, {})[channel] = time.time()
+        await self._subscribe(self._group_key(group))
+
+    async def group_discard(self, group, channel):
+        assert self.valid_channel_name(channel), "Invalid channel name"
+        assert self.valid_group_name(group), "Invalid group name"
+        members = self._groups.get(group)
+        if members is None:
+            return
+        members.pop(channel, None)
+        if not members:
+            del self._groups[group]
+            await self._unsubscribe(self._group_key(group))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        assert self.valid_group_name(group), "Invalid group name"
+        await self._notify(self._group_key(group), {"g": group, "m": message, "e": time.time() + self.expiry})
+
+    async def flush(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        self._reset_local()
+        await asyncio.to_thread(self._flush_blocking)
+
+    def _flush_blocking(self):
+        with self._send_lock:
+            self._connect_sender().execute(f"DELETE FROM {self._table()}")
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        self.close_sender()
+
+    def close_sender(self):
+        """Close the shared sending connection; the next send reconnects."""
+        with self._send_lock:
+            if self._send_conn is not None:
+                self._send_conn.close()
+                self._send_conn = None
+
+    # --- Receiving ---
+
+    def _deliver(self, channel, expires, message) -> bool:
+        queue = self._queues.setdefault(channel, asyncio.Queue())
+        if queue.qsize() >= self.get_capacity(channel):
+            return False
+        queue.put_nowait((expires, message))
+        return True
+
+    def _expire_members(self, group):
+        members = self._groups.get(group, {})
+        cutoff = time.time() - self.group_expiry
+        for channel, joined in list(members.items()):
+            if joined < cutoff:
+                del members[channel]
+        return members
+
+    def _dispatch(self, envelope: dict):
+        if envelope["e"] < time.time():
+            return
+        if "g" in envelope:
+            for channel in list(self._expire_members(envelope["g"])):
+                if not self._deliver(channel, envelope["e"], deepcopy(envelope["m"])):
+                    logger.debug("Channel %s is full; dropped a message for group %s", channel, envelope["g"])
+        elif not self._deliver(envelope["c"], envelope["e"], envelope["m"]):
+            logger.debug("Channel %s is full; dropped a message", envelope["c"])
+
+    def _wanted(self, key):
+        return not key.startswith("group:") or key[len("group:"):] in self._groups
+
+    async def _subscribe(self, key):
+        await self._change_subscription("LISTEN", key)
+
+    async def _unsubscribe(self, key):
+        await self._change_subscription("UNLISTEN", key)
+
+    async def _change_subscription(self, command, key):
+        self._ensure_listener()
+        if (command == "LISTEN") == (key in self._listening):
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((command, key, future))
+        await future
+
+    def _ensure_listener(self):
+        loop = asyncio.get_running_loop()
+        if self._listener is not None and not self._listener.done() and self._loop is loop:
+            return
+        if self._loop is not None and self._loop is not loop:
+            # The previous event loop is gone (e.g. a test's loop); its queues and futures are unusable
+            self._reset_local()
+        self._loop = loop
+        self._listener = loop.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(**_conninfo(self.alias), autocommit=True)
+            except psycopg.OperationalError:
+                logger.exception("Channel layer listener could not connect; retrying")
+                await asyncio.sleep(1)
+                continue
+            try:
+                async with conn:
+                    # Re-establish subscriptions after a reconnect
+                    for key in self._listening:
+                        await conn.execute(f'LISTEN "{self.pg_channel(key)}"')
+                    await self._listen_on(conn)
+            except psycopg.OperationalError:
+                logger.exception("Channel layer listener lost its connection; reconnecting")
+                await asyncio.sleep(1)
+
+    async def _listen_on(self, conn):
+        while True:
+            pending, self._pending = self._pending, []
+            for command, key, future in pending:
+                if command == "UNLISTEN" and self._wanted(key):
+                    # Someone joined the group again while the UNLISTEN was queued
+                    pass
+                elif (command == "LISTEN") != (key in self._listening):
+                    await conn.execute(f'{command} "{self.pg_channel(key)}"')
+                    if command == "LISTEN":
+                        self._listening.add(key)
+                    else:
+                        self._listening.discard(key)
+                if not future.done():
+                    future.set_result(None)
+
+            # Inline payloads and spilled row ids, in arrival order
+            received = []
+            async for notify in conn.notifies(timeout=self.poll_interval):
+                if notify.payload.startswith(SPILL_PREFIX):
+                    received.append(int(notify.payload[len(SPILL_PREFIX):]))
+                else:
+                    received.append(notify.payload)
+            spilled = [entry for entry in received if isinstance(entry, int)]
+            rows = await asyncio.to_thread(self._fetch_spilled, spilled) if spilled else {}
+            for entry in received:
+                payload = rows.get(entry) if isinstance(entry, int) else entry
+                if payload is not None:
+                    self._dispatch_payload(payload)
+
+    def _dispatch_payload(self, payload):
+        try:
+            self._dispatch(self._decode(payload))
+        except Exception:
+            # A bad message must not take the listener (and every consumer in this process) down
+            logger.exception("Channel layer could not deliver a message")
@@ -0,0 +1,62 @@
+"""
+Cart checkout.
+
+Moves every line of a user's cart into their borrowed inventory in one
+transaction. The stock is taken with one all-or-nothing conditional UPDATE
+(``Item.objects.adjust_stock``, see ``inventory.stock``) and the holdings
+are written as bulk statements, so the number of queries does not grow with
+the size of the cart and no item row is locked before it is written. The
+cart's lines are holds (see ``inventory.reservations``), so the stock they
+took out of ``reserved`` leaves ``in_stock`` instead.
+"""
+from __future__ import annotations
+
+from django.db import transaction
+
+from .models import InventoryItem, Item, StockMovement
+from .stock import StockChange, StockError
+
+
+class CheckoutError(Exception):
+    """Raised when a cart cannot be checked out. Nothing has been written."""
+
+
+def checkout_cart(user, cart) -> list[Item]:
+    """Check out ``cart`` into ``user``'s inventory and return the updated items."""
+    with transaction.atomic():
+        wanted: dict[int, int] = {}
+        # Locking the cart's lines makes a double-submitted checkout wait for the first and find the cart empty
+        for item_id, quantity in cart.cart_items.select_for_update().values_list("item_id", "quantity"):
+            wanted[item_id] = wanted.get(item_id, 0) + quantity
+        if not wanted:
+            return []
+
+        try:
+            results = Item.objects.adjust_stock(
+                [StockChange(item_id, -quantity, release=quantity) for item_id, quantity in wanted.items()],
+                all_or_nothing=True, actor=user, reason=StockMovement.REASON_CHECKOUT,
+            )
+        except StockError as e:
+            short = next(result for result in e.results if not result.ok)
+            name = short.item.name if short.item else "item"
+            raise CheckoutError(f"Not enough {name}'s in stock")
+
+        holdings = {
+            inv.item_id: inv
+            for inv in InventoryItem.objects.filter(borrower=user, item_id__in=wanted)
+        }
+        to_update, to_create = [], []
+        for item_id, quantity in wanted.items():
+            inventory_item = holdings.get(item_id)
+            if inventory_item is None:
+                to_create.append(InventoryItem(borrower=user, item_id=item_id, quantity=quantity))
+            else:
+                inventory_item.quantity += quantity
+                to_update.append(inventory_item)
+        if to_update:
+            InventoryItem.objects.bulk_update(to_update, ["quantity"])
+        if to_create:
+            InventoryItem.objects.bulk_create(to_create)
+
+        cart.cart_items.all().delete()
+    return [result.item for result in results]
@@ -0,0 +1,129 @@
+"""
+Conditional GET for the read endpoints dashboards keep polling.
+
+List responses are validated by the stats version, which every Item and
+ItemCategory write bumps (see ``inventory.stats``), together with the
+cart holds' version (see ``inventory.reservations``), since the lists show
+``reserved``; the later of the two ``updated_at`` is ``Last-Modified``. That
+is a sum over the few stats shards and another over the few hold
+counters. Item details use the item's own ``updated_at`` (plus the
+columns that change without it: the category name, the cart holds in
+``reserved`` and the stock ``version``). A client that
+revalidates with ``If-None-Match``/``If-Modified-Since`` gets a 304 before the
+view runs any of its queries, and every response carries ``Cache-Control:
+no-cache`` so clients revalidate instead of guessing how long a copy is good.
+"""
+from __future__ import annotations
+
+import hashlib
+from functools import wraps
+
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import reservations, stats
+from .models import Item
+
+
+def conditional(etag_func=None, last_modified_func=None, private=False):
+    """Django's ``condition()``, plus ``Cache-Control: no-cache`` (and ``private``) on the response."""
+    def decorator(view):
+        checked = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = checked(request, *args, **kwargs)
+            patch_cache_control(response, no_cache=True)
+            if private:
+                patch_cache_control(response, private=True)
+            return response
+        return inner
+    return decorator
+
+
+def _digest(*parts) -> str:
+    return hashlib.md5("|".join(map(str, parts)).encode()).hexdigest()[:16]
+
+
+def request_stats(request):
+    """``stats.get()``, read once per request and shared with the view."""
+    if not hasattr(request, "_inventory_stats"):
+        request._inventory_stats = stats.get()
+    return request._inventory_stats
+
+
+def request_holds(request):
+    """``reservations.version()``, read once per request."""
+    if not hasattr(request, "_hold_version"):
+        request._hold_version = reservations.version()
+    return request._hold_version
+
+
+def _shared(request) -> bool:
+    # The browsable API page shows the signed-in user and a CSRF token; only JSON is the same for everyone
+    renderer = getattr(request, "accepted_renderer", None)
+    return renderer is None or renderer.format == "json"
+
+
+def _inventory_version(request) -> str:
+    return f"{request_stats(request).version}.{request_holds(request)[0]}"
+
+
+def inventory_etag(request, *args, **kwargs):
+    return f'"inventory-{_inventory_version(request)}"' if _shared(request) else None
+
+
+def inventory_last_modified(request, *args, **kwargs):
+    if not _shared(request):
+        return None
+    held_at = request_holds(request)[1]
+    updated_at = request_stats(request).updated_at
+    return max(updated_at, held_at) if held_at else updated_at
+
+
+def category_etag(request, *args, **kwargs):
+    # Categories don't show holds, so the stats version alone validates them
+    return f'"categories-{request_stats(request).version}"' if _shared(request) else None
+
+
+def category_last_modified(request, *args, **kwargs):
+    return request_stats(request).updated_at if _shared(request) else None
+
+
+def stats_etag(request, *args, **kwargs):
+    # new_items_7d slides with the clock, so the hour is part of the tag; no Last-Modified for the same reason
+    return f'"stats-{request_stats(request).version}-{timezone.now():%Y%m%d%H}"' if _shared(request) else None
+
+
+def _item(request, pk):
+    """``(updated_at, category name, reserved, version)`` of item ``pk``, or None if there is no such item."""
+    if not hasattr(request, "_item_state"):
+        try:
+            request._item_state = (Item.objects.filter(pk=pk)
+                                   .values_list("updated_at", "category__name", "reserved", "version").first())
+        except ValueError:
+            request._item_state = None
+    return request._item_state
+
+
+def item_etag(request, pk=None, **kwargs):
+    row = _item(request, pk) if _shared(request) else None
+    # Renaming the category and holding stock in carts change the representation but not the item's updated_at
+    return f'"item-{_digest(pk, *row)}"' if row else None
+
+
+def item_last_modified(request, pk=None, **kwargs):
+    row = _item(request, pk) if _shared(request) else None
+    return row[0] if row else None
+
+
+def inventory_table_etag(request, *args, **kwargs):
+    """The HTMX inventory table: per version, user role and CSRF secret, since it embeds staff actions and a token."""
+    if "HX-Request" not in request.headers:
+        return None
+    user = request.user
+    get_token(request)
+    variant = _digest(user.pk, user.is_staff, user.is_superuser, request.META["CSRF_COOKIE"])
+    return f'"inventory-{_inventory_version(request)}-{variant}"'
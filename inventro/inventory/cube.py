@@ -0,0 +1,293 @@
+"""
+Analytics cube.
+
+``InventoryCube`` breaks the stats rollup's totals (see ``inventory.stats``)
+down by category, location and the day items were created. Writes keep it
+current the same way they keep the rollup: each changed item's contribution
+is taken out of the cell it was in and added to the cell it is in now, with
+one upsert per write. :func:`refresh` recomputes cells from the item table,
+all of them or just a range of days, after writes that bypass the signals
+(imports, generated data) or to repair drift.
+
+:func:`rollup` answers any slice or roll-up: grouped by any of category,
+location and a day/week/month bucket and filtered by category, location and
+a range of days. It only ever reads cube rows.
+
+``InventoryCostCube`` is a histogram beside it: per category and creation
+day, how many items fall in each cost bucket (the cost rounded down to two
+significant figures, so buckets are at most 10% wide). The same writes keep
+it current, though only writes that move an item between buckets (a new
+cost, category or active flag) touch it. :func:`cost_distribution` reads a
+category's sorted costs back from it.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce, Trunc, TruncDate
+from django.utils import timezone
+
+from . import stats
+from .models import InventoryCostCube, InventoryCube, Item
+
+FIELDS = stats.FIELDS
+GROUPS = ("category", "location", "date")
+
+
+def _values(item: Item) -> dict:
+    return {
+        "is_active": item.is_active,
+        "in_stock": item.in_stock,
+        "low_stock_bar": item.low_stock_bar,
+        "cost": item.cost,
+        "category": item.category_id,
+        "location": item.location,
+        "created_at": item.created_at,
+    }
+
+
+def _cell(values: dict) -> tuple:
+    return values["category"], values["location"] or "", timezone.localdate(values["created_at"])
+
+
+def cost_bucket(cost) -> Decimal:
+    """``cost`` rounded down to two significant figures; zero for costs of zero or less."""
+    cost = Decimal(cost or 0)
+    if cost <= 0:
+        return Decimal(0).quantize(stats.CENT)
+    step = Decimal(1).scaleb(cost.adjusted() - 1)
+    return ((cost // step) * step).quantize(stats.CENT)
+
+
+def _cost_cell(values: dict) -> tuple:
+    return values["category"], timezone.localdate(values["created_at"]), cost_bucket(values["cost"])
+
+
+def change_delta(changes) -> dict:
+    """``{(category_id, location, day): {field: delta}}`` for a list of ``ItemChange``."""
+    cells: dict[tuple, dict] = {}
+
+    def add(values, sign):
+        part = stats.contribution(values)
+        if not any(part.values()):
+            return
+        cell = cells.setdefault(_cell(values), dict.fromkeys(FIELDS, 0))
+        for field in FIELDS:
+            cell[field] += sign * part[field]
+
+    for change in changes:
+        after = _values(change.item)
+        add(after, 1)
+        if not change.created:
+            add({**after, **change.previous}, -1)
+    return {key: cell for key, cell in cells.items() if any(cell.values())}
+
+
+def cost_delta(changes) -> dict:
+    """``{(category_id, day, cost bucket): items}`` for a list of ``ItemChange``."""
+    cells = Counter()
+    for change in changes:
+        after = _values(change.item)
+        if after["is_active"]:
+            cells[_cost_cell(after)] += 1
+        before = {**after, **change.previous}
+        if not change.created and before["is_active"]:
+            cells[_cost_cell(before)] -= 1
+    return {key: items for key, items in cells.items() if items}
+
+
+def apply(cells: dict):
+    """Add each cell's deltas to the stored cell, creating missing ones, in a single upsert."""
+    if not cells:
+        return
+    table = connection.ops.quote_name(InventoryCube._meta.db_table)
+    row = f"({', '.join(['%s'] * (3 + len(FIELDS)))})"
+    params = []
+    # Sorted, so concurrent writers lock cells in the same order
+    for (category_id, location, day), cell in sorted(cells.items()):
+        params += [category_id, location, connection.ops.adapt_datefield_value(day), *(cell[f] for f in FIELDS)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (category_id, location, day, {', '.join(FIELDS)}) "
+            f"VALUES {', '.join([row] * len(cells))} "
+            f"ON CONFLICT (category_id, location, day) DO UPDATE SET "
+            + ", ".join(f"{field} = {table}.{field} + EXCLUDED.{field}" for field in FIELDS),
+            params,
+        )
+
+
+def apply_costs(cells: dict):
+    """Add each cost cell's item count to the stored one, creating missing cells, in a single upsert."""
+    if not cells:
+        return
+    table = connection.ops.quote_name(InventoryCostCube._meta.db_table)
+    params = []
+    for (category_id, day, cost), items in sorted(cells.items()):
+        params += [category_id, connection.ops.adapt_datefield_value(day),
+                   connection.ops.adapt_decimalfield_value(cost, 15, 2), items]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (category_id, day, cost, items) "
+            f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(cells))} "
+            f"ON CONFLICT (category_id, day, cost) DO UPDATE SET items = {table}.items + EXCLUDED.items",
+            params,
+        )
+
+
+def record_changes(changes):
+    apply(change_delta(changes))
+    apply_costs(cost_delta(changes))
+
+
+def record_removal(item: Item):
+    values = _values(item)
+    part = stats.contribution(values)
+    if any(part.values()):
+        apply({_cell(values): {field: -value for field, value in part.items()}})
+    if values["is_active"]:
+        apply_costs({_cost_cell(values): -1})
+
+
+def _midnight(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _cells(start: date | None, end: date | None):
+    cells = InventoryCube.objects.all()
+    if start:
+        cells = cells.filter(day__gte=start)
+    if end:
+        cells = cells.filter(day__lte=end)
+    return cells
+
+
+def _cost_cells(start: date | None, end: date | None):
+    cells = InventoryCostCube.objects.all()
+    if start:
+        cells = cells.filter(day__gte=start)
+    if end:
+        cells = cells.filter(day__lte=end)
+    return cells
+
+
+def _items(start: date | None, end: date | None):
+    items = Item.objects.filter(is_active=True)
+    if start:
+        items = items.filter(created_at__gte=_midnight(start))
+    if end:
+        items = items.filter(created_at__lt=_midnight(end + timedelta(days=1)))
+    return items
+
+
+def compute(start: date | None = None, end: date | None = None) -> dict:
+    """The cells for items created from ``start`` to ``end`` (inclusive), computed from the item table."""
+    rows = (
+        _items(start, end).annotate(day=TruncDate("created_at"), place=Coalesce("location", models.Value("")))
+        .order_by().values("category_id", "place", "day")
+        .annotate(**stats.aggregates())
+    )
+    return {(row["category_id"], row["place"], row["day"]): {field: row[field] for field in FIELDS} for row in rows}
+
+
+def compute_costs(start: date | None = None, end: date | None = None) -> dict:
+    """The cost cells for items created from ``start`` to ``end``, computed from the item table."""
+    # Bucketed in Python, with the same rounding the writes use
+    rows = _items(start, end).values_list("category_id", "created_at", "cost").order_by()
+    cells = Counter(_cost_cell({"category": category_id, "created_at": created_at, "cost": cost})
+                    for category_id, created_at, cost in rows.iterator(chunk_size=10000))
+    return dict(cells)
+
+
+def _same(stored: dict, expected: dict) -> bool:
+    return all(Decimal(stored[field]).quantize(stats.CENT) == Decimal(expected[field]).quantize(stats.CENT)
+               for field in FIELDS)
+
+
+def _drift(expected: dict, start, end) -> list[tuple]:
+    zero = dict.fromkeys(FIELDS, 0)
+    stored = {(row["category_id"], row["location"], row["day"]): row
+              for row in _cells(start, end).values("category_id", "location", "day", *FIELDS)}
+    return sorted(key for key in expected.keys() | stored.keys()
+                  if not _same(stored.get(key, zero), expected.get(key, zero)))
+
+
+def _cost_drift(expected: dict, start, end) -> list[tuple]:
+    stored = {(row["category_id"], row["day"], Decimal(row["cost"]).quantize(stats.CENT)): row["items"]
+              for row in _cost_cells(start, end).values("category_id", "day", "cost", "items")}
+    return sorted(key for key in expected.keys() | stored.keys() if stored.get(key, 0) != expected.get(key, 0))
+
+
+def drift(start: date | None = None, end: date | None = None) -> list[tuple]:
+    """Keys of the cells in the range whose stored totals differ from the item table's."""
+    return _drift(compute(start, end), start, end)
+
+
+def cost_drift(start: date | None = None, end: date | None = None) -> list[tuple]:
+    """Keys of the cost cells in the range whose stored counts differ from the item table's."""
+    return _cost_drift(compute_costs(start, end), start, end)
+
+
+def refresh(start: date | None = None, end: date | None = None) -> int:
+    """Recompute the cells and cost cells from ``start`` to ``end`` (all by default); returns how many were off."""
+    with transaction.atomic():
+        expected = compute(start, end)
+        wrong = _drift(expected, start, end)
+        _cells(start, end).delete()
+        InventoryCube.objects.bulk_create(
+            (InventoryCube(category_id=category_id, location=location, day=day, **cell)
+             for (category_id, location, day), cell in expected.items()),
+            batch_size=1000,
+        )
+        expected_costs = compute_costs(start, end)
+        wrong_costs = _cost_drift(expected_costs, start, end)
+        _cost_cells(start, end).delete()
+        InventoryCostCube.objects.bulk_create(
+            (InventoryCostCube(category_id=category_id, day=day, cost=cost, items=items)
+             for (category_id, day, cost), items in expected_costs.items()),
+            batch_size=1000,
+        )
+    return len(wrong) + len(wrong_costs)
+
+
+def rollup(group_by=(), start: date | None = None, end: date | None = None, categories=None, locations=None,
+           bucket: str = "day") -> list[dict]:
+    """
+    Totals grouped by ``group_by`` (any of :data:`GROUPS`; ``date`` is the
+    ``bucket`` of the creation day), over the cells from ``start`` to
+    ``end`` and, when given, only the listed category ids and locations.
+    """
+    cells = _cells(start, end)
+    if categories:
+        cells = cells.filter(category__in=categories)
+    if locations:
+        cells = cells.filter(location__in=locations)
+    totals = {field: models.Sum(field) for field in FIELDS}
+    if not group_by:
+        return [{field: value or 0 for field, value in cells.aggregate(**totals).items()}]
+
+    columns = []
+    if "category" in group_by:
+        columns.append("category__name")
+    if "location" in group_by:
+        columns.append("location")
+    if "date" in group_by:
+        cells = cells.annotate(date=Trunc("day", bucket, output_field=models.DateField()))
+        columns.append("date")
+    rows = cells.order_by().values(*columns).annotate(**totals).order_by(*columns)
+    return [{("category" if key == "category__name" else key): value for key, value in row.items()} for row in rows]
+
+
+def cost_distribution(start: date | None = None, end: date | None = None) -> dict[str, list[tuple[Decimal, int]]]:
+    """Per category name, ``(cost bucket, items)`` pairs in ascending cost over the cost cells from ``start`` to ``end``."""
+    rows = (
+        _cost_cells(start, end).order_by().values("category__name", "cost")
+        .annotate(total=models.Sum("items")).filter(total__gt=0)
+        .order_by("category__name", "cost")
+    )
+    distribution: dict[str, list[tuple[Decimal, int]]] = {}
+    for row in rows:
+        distribution.setdefault(row["category__name"], []).append((row["cost"], row["total"]))
+    return distribution
@@ -0,0 +1,341 @@
+"""
+Synthetic dataset generator behind ``manage.py generate_dataset``.
+
+Values are drawn a whole column at a time from one seeded NumPy generator,
+so the same seed, sizes and ``as_of`` date always produce the same rows:
+
+* categories follow a skewed mix and costs a per-category normal (the same
+  means as ``util/populate_database.py``), locations a weighted mix;
+* ``total_amount`` is log-normal; ``in_stock`` is what's left after the
+  generated holdings, so the low/out-of-stock share comes out of demand;
+* ``created_at`` is exponential with a 120-day mean before ``as_of`` and
+  ``updated_at`` falls somewhere between creation and ``as_of``;
+* holdings (``InventoryItem``) pick users by a log-normal activity level and
+  items by a Zipf-like popularity, one row per user and item;
+* a share of users has an open cart of a few lines; totals grow so that
+  stock on hand covers every line's hold, as the hold engine requires;
+* a small share of users is staff.
+
+On PostgreSQL each batch is formatted as COPY text and streamed in; other
+databases fall back to ``bulk_create``. Signals don't fire either way, so the
+stats rollup and analytics cube are rebuilt and the items' opening ledger
+lines written at the end.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timezone as dt_timezone
+
+import numpy as np
+from django.db import connection, transaction
+
+from . import cube, ledger, reservations, stats
+from .models import Cart, CartItem, InventoryItem, Item, ItemCategory, hold_expiry
+from authentication.models import User
+
+# name: (share of items, cost mean, cost sigma)
+CATEGORIES = {
+    "Audio": (0.22, 500, 250),
+    "Lighting": (0.18, 1500, 500),
+    "Video": (0.12, 1200, 300),
+    "Backstage": (0.10, 800, 300),
+    "Sets/Props": (0.10, 2000, 750),
+    "Costume/Wardrobe": (0.10, 1500, 400),
+    "Special Effects": (0.06, 1300, 450),
+    "Storage/Transport": (0.07, 1000, 350),
+    "Miscellaneous": (0.05, 700, 200),
+}
+# Name stems per category, so search benchmarks see varied words
+NOUNS = {
+    "Audio": ("Wireless Microphone", "Mixer", "Monitor Speaker", "DI Box", "XLR Cable"),
+    "Lighting": ("LED Par", "Moving Head", "Fresnel", "Dimmer Pack", "Gel Frame"),
+    "Video": ("Projector", "Camera", "HDMI Switcher", "Confidence Monitor", "SDI Cable"),
+    "Backstage": ("Road Case", "Gaffer Tape", "Headset", "Cue Light", "Stage Weight"),
+    "Sets/Props": ("Flat", "Platform", "Prop Table", "Rostrum", "Backdrop"),
+    "Costume/Wardrobe": ("Garment Rack", "Steamer", "Dress Form", "Wig Stand", "Costume"),
+    "Special Effects": ("Haze Machine", "Fog Fluid", "Confetti Cannon", "Bubble Machine", "Snow Machine"),
+    "Storage/Transport": ("Dolly", "Flight Case", "Cable Trunk", "Pallet", "Ratchet Strap"),
+    "Miscellaneous": ("Extension Lead", "Ladder", "Toolkit", "First Aid Kit", "Radio"),
+}
+LOCATIONS = {
+    "Main Warehouse": 0.35, "Shelf A": 0.12, "Shelf B": 0.12, "Shelf C": 0.08,
+    "Cage 1": 0.08, "Cage 2": 0.05, "Truck": 0.05, "Toronto, Canada": 0.08, "New York, America": 0.07,
+}
+
+MIN_COST = 150
+MEAN_AGE_DAYS = 120
+ZIPF_EXPONENT = 1.1
+# Share of generated users with is_staff (who may delete items)
+STAFF_SHARE = 0.02
+
+
+@dataclass
+class DatasetSpec:
+    items: int = 1_000_000
+    users: int = 100_000
+    holdings: int = 1_000_000
+    # Share of users with an open cart, and the mean lines per cart
+    cart_share: float = 0.2
+    cart_lines: float = 3.0
+    seed: int = 1
+    as_of: date | None = None
+    prefix: str = "GEN-"
+    batch_size: int = 50_000
+
+    @property
+    def user_prefix(self) -> str:
+        return self.prefix.lower()
+
+
+@dataclass
+class TableResult:
+    table: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+# --- Generation ---
+
+def _as_of(spec: DatasetSpec) -> np.datetime64:
+    day = spec.as_of or date.today()
+    return np.datetime64(day.isoformat(), "us")
+
+
+def generate_items(rng: np.random.Generator, spec: DatasetSpec) -> dict[str, np.ndarray]:
+    n = spec.items
+    names = list(CATEGORIES)
+    shares = np.array([CATEGORIES[name][0] for name in names])
+    category = rng.choice(len(names), size=n, p=shares / shares.sum())
+    mu = np.array([CATEGORIES[name][1] for name in names])[category]
+    sigma = np.array([CATEGORIES[name][2] for name in names])[category]
+    cost = np.round(np.maximum(rng.normal(mu, sigma), MIN_COST), 2)
+
+    location_weights = np.array(list(LOCATIONS.values()))
+    location = rng.choice(len(LOCATIONS), size=n, p=location_weights / location_weights.sum())
+
+    total = np.clip(np.rint(rng.lognormal(mean=2.5, sigma=1.0, size=n)), 1, 10_000).astype(np.int64)
+
+    as_of = _as_of(spec)
+    age = (rng.exponential(MEAN_AGE_DAYS * 86_400e6, size=n)).astype("timedelta64[us]")
+    created = as_of - age
+    updated = created + (age * rng.random(n)).astype("timedelta64[us]")
+    stems = np.array([[f"{noun} {model}" for noun in NOUNS[name] for model in ("Mk I", "Mk II", "Pro")]
+                      for name in names])
+    name = stems[category, rng.integers(0, stems.shape[1], size=n)]
+    return {"category": category, "name": name, "cost": cost, "location": location, "total": total,
+            "created": created, "updated": updated}
+
+
+def _popularity(rng, n, exponent=ZIPF_EXPONENT):
+    """Zipf-like weights over ``n`` entries in random order."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _unique_pairs(rng, count, user_p, item_p, n_items):
+    """``count`` distinct (user, item) index pairs, fewer if the space runs out."""
+    keys = np.empty(0, dtype=np.int64)
+    for _ in range(5):
+        missing = count - len(keys)
+        if missing <= 0:
+            break
+        draw = int(missing * 1.2) + 16
+        users = rng.choice(len(user_p), size=draw, p=user_p)
+        items = rng.choice(n_items, size=draw, p=item_p)
+        keys = np.unique(np.concatenate([keys, users.astype(np.int64) * n_items + items]))
+    keys = rng.permutation(keys)[:count]
+    return keys // n_items, keys % n_items
+
+
+def generate_holdings(rng, spec: DatasetSpec, items: dict) -> dict[str, np.ndarray]:
+    if not spec.users or not spec.items or not spec.holdings:
+        return {"user": np.empty(0, np.int64), "item": np.empty(0, np.int64), "quantity": np.empty(0, np.int64)}
+    activity = rng.lognormal(mean=0.0, sigma=1.0, size=spec.users)
+    user, item = _unique_pairs(rng, spec.holdings, activity / activity.sum(),
+                               _popularity(rng, spec.items), spec.items)
+    quantity = rng.geometric(0.6, size=len(user)).astype(np.int64)
+
+    # Stock that is out on loan; totals grow to cover it and in_stock is what's left
+    borrowed = np.bincount(item, weights=quantity, minlength=spec.items).astype(np.int64)
+    items["total"] = np.maximum(items["total"], borrowed)
+    items["in_stock"] = items["total"] - borrowed
+    return {"user": user, "item": item, "quantity": quantity}
+
+
+def generate_carts(rng, spec: DatasetSpec, items: dict) -> dict[str, np.ndarray]:
+    n_carts = int(spec.users * spec.cart_share)
+    if not n_carts or not spec.items:
+        return {"user": np.empty(0, np.int64), "cart": np.empty(0, np.int64),
+                "item": np.empty(0, np.int64), "quantity": np.empty(0, np.int64)}
+    users = rng.choice(spec.users, size=n_carts, replace=False)
+    lines = rng.poisson(spec.cart_lines - 1, size=n_carts) + 1
+    cart = np.repeat(np.arange(n_carts), lines)
+    item = rng.choice(spec.items, size=len(cart), p=_popularity(rng, spec.items))
+    keys = np.unique(cart.astype(np.int64) * spec.items + item)
+    quantity = rng.integers(1, 4, size=len(keys))
+
+    # Held stock comes out of in_stock; totals grow so nothing is held that isn't on hand
+    held = np.bincount(keys % spec.items, weights=quantity, minlength=spec.items).astype(np.int64)
+    short = np.maximum(held - items["in_stock"], 0)
+    items["total"] = items["total"] + short
+    items["in_stock"] = items["in_stock"] + short
+    return {
+        "user": users,
+        "cart": keys // spec.items,
+        "item": keys % spec.items,
+        "quantity": quantity,
+    }
+
+
+# --- Loading ---
+
+def _copy_text(values) -> list[str]:
+    """One COPY text column; generated values never contain tabs, newlines or backslashes."""
+    if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64):
+        return [f"{v}+00" for v in values.astype(str).tolist()]
+    if isinstance(values, np.ndarray):
+        return list(map(str, values.tolist()))
+    return [r"\N" if v is None else str(v) for v in values]
+
+
+def _python(values):
+    if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64):
+        return [v.replace(tzinfo=dt_timezone.utc) for v in values.astype("datetime64[us]").astype(datetime)]
+    if isinstance(values, np.ndarray):
+        return values.tolist()
+    return list(values)
+
+
+class Loader:
+    """Writes column batches with COPY on PostgreSQL and ``bulk_create`` elsewhere."""
+
+    def __init__(self, batch_size: int, log=print):
+        self.batch_size = batch_size
+        self.log = log
+        self.copy = connection.vendor == "postgresql"
+        self.results: list[TableResult] = []
+
+    def load(self, model, columns: dict, rows: int):
+        """``columns`` maps field attnames to sequences of ``rows`` values."""
+        started = time.perf_counter()
+        for start in range(0, rows, self.batch_size):
+            batch = {name: values[start:start + self.batch_size] for name, values in columns.items()}
+            with transaction.atomic():
+                if self.copy:
+                    self._copy(model, batch)
+                else:
+                    self._bulk_create(model, batch)
+            self.log(f"{model._meta.db_table}: {min(start + self.batch_size, rows):,}/{rows:,}")
+        self.results.append(TableResult(model._meta.db_table, rows, time.perf_counter() - started))
+
+    def _copy(self, model, batch):
+        text = "\n".join(map("\t".join, zip(*(_copy_text(values) for values in batch.values())))) + "\n"
+        with connection.cursor() as cursor:
+            with cursor.copy(f"COPY {model._meta.db_table} ({', '.join(batch)}) FROM STDIN") as copy:
+                copy.write(text)
+
+    def _bulk_create(self, model, batch):
+        names = list(batch)
+        objs = [model(**dict(zip(names, row))) for row in zip(*(_python(values) for values in batch.values()))]
+        created = model.objects.bulk_create(objs)
+        # auto_now(_add) fields were overwritten on save; put the generated values back
+        stamped = [f.attname for f in model._meta.concrete_fields
+                   if getattr(f, "auto_now", False) or getattr(f, "auto_now_add", False)]
+        stamped = [name for name in stamped if name in batch]
+        if stamped and created and created[0].pk is not None:
+            for obj, *values in zip(created, *(_python(batch[name]) for name in stamped)):
+                for name, value in zip(stamped, values):
+                    setattr(obj, name, value)
+            model.objects.bulk_update(created, stamped)
+
+
+def _ids(queryset, field: str) -> np.ndarray:
+    """Primary keys of the generated rows in generation order (their keys are zero-padded)."""
+    return np.fromiter(queryset.order_by(field).values_list("pk", flat=True), dtype=np.int64)
+
+
+def generate(spec: DatasetSpec, log=print) -> list[TableResult]:
+    if Item.objects.filter(sku__startswith=spec.prefix).exists():
+        raise ValueError(f"Items with SKU prefix {spec.prefix!r} already exist; pick another --prefix.")
+    if User.objects.filter(username__startswith=spec.user_prefix).exists():
+        raise ValueError(f"Users named {spec.user_prefix!r}... already exist; pick another --prefix.")
+
+    rng = np.random.default_rng(spec.seed)
+    items = generate_items(rng, spec)
+    holdings = generate_holdings(rng, spec, items)
+    items.setdefault("in_stock", items["total"])
+    carts = generate_carts(rng, spec, items)
+    loader = Loader(spec.batch_size, log)
+
+    category_ids = np.array([ItemCategory.objects.get_or_create(name=name)[0].pk for name in CATEGORIES])
+    width = len(str(max(spec.items, spec.users)))
+    loader.load(Item, {
+        "name": [f"{name} #{i}" for i, name in enumerate(items["name"].tolist())],
+        "sku": [f"{spec.prefix}{i:0{width}d}" for i in range(spec.items)],
+        "in_stock": items["in_stock"],
+        # Filled in from the generated carts by reservations.rebuild() below
+        "reserved": np.zeros(spec.items, dtype=np.int64),
+        "version": np.zeros(spec.items, dtype=np.int64),
+        "total_amount": items["total"],
+        "low_stock_bar": np.maximum(items["total"] // 2, 1),
+        "cost": items["cost"],
+        "category_id": category_ids[items["category"]],
+        "location": np.array(list(LOCATIONS))[items["location"]],
+        "is_active": np.ones(spec.items, dtype=bool),
+        "created_at": items["created"],
+        "updated_at": items["updated"],
+    }, spec.items)
+
+    as_of = _as_of(spec)
+    joined = as_of - rng.exponential(365 * 86_400e6, size=spec.users).astype("timedelta64[us]")
+    loader.load(User, {
+        "username": [f"{spec.user_prefix}{i:0{width}d}" for i in range(spec.users)],
+        "password": ["!"] * spec.users,
+        "first_name": [""] * spec.users,
+        "last_name": [""] * spec.users,
+        "email": [""] * spec.users,
+        "is_staff": rng.random(spec.users) < STAFF_SHARE,
+        "is_superuser": np.zeros(spec.users, dtype=bool),
+        "is_active": np.ones(spec.users, dtype=bool),
+        "date_joined": joined,
+    }, spec.users)
+
+    item_ids = _ids(Item.objects.filter(sku__startswith=spec.prefix), "sku")
+    user_ids = _ids(User.objects.filter(username__startswith=spec.user_prefix), "username")
+    loader.load(InventoryItem, {
+        "borrower_id": user_ids[holdings["user"]],
+        "item_id": item_ids[holdings["item"]],
+        "quantity": holdings["quantity"],
+    }, len(holdings["user"]))
+
+    cart_users = user_ids[carts["user"]]
+    loader.load(Cart, {"user_id": cart_users}, len(cart_users))
+    # One cart per user: in username order they line up with the sorted user indices
+    cart_ids = _ids(Cart.objects.filter(user__username__startswith=spec.user_prefix), "user__username")
+    cart_ids = cart_ids[np.argsort(np.argsort(carts["user"]))]
+    loader.load(CartItem, {
+        "cart_id": cart_ids[carts["cart"]],
+        "item_id": item_ids[carts["item"]],
+        "quantity": carts["quantity"],
+        "added_at": np.full(len(carts["cart"]), as_of),
+        # Holds count from the load, or the sweeper would empty every cart at once
+        "expires_at": np.full(len(carts["cart"]), np.datetime64(hold_expiry().astimezone(dt_timezone.utc)
+                                                                .replace(tzinfo=None), "us")),
+    }, len(carts["cart"]))
+
+    # Generated items start the stock ledger with their stock as of creation
+    ledger.open_balances()
+    reservations.rebuild()
+    stats.rebuild()
+    cube.refresh()
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            for model in (Item, User, InventoryItem, Cart, CartItem):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+    return loader.results
@@ -0,0 +1,195 @@
+"""
+Item deltas for live inventory screens.
+
+Every committed item write is published to the ``inventory_deltas`` group as
+a compact row (id, category, in_stock, is_active). Like the low-stock alerts,
+publishing happens on a background thread per process: writes queue their
+rows after commit, later rows for the same item replace earlier ones, and one
+message carries the whole batch.
+
+Reconnecting clients catch up from ``ItemDelta`` instead of reloading. The
+writing transaction upserts each item's row there, deletions included, and
+stamps it with its position: the transaction id on PostgreSQL, a counter on
+SQLite, where one transaction writes at a time. Positions are taken before
+commit, so they are not in commit order; a version is therefore the oldest
+position that might still commit (the snapshot's ``xmin``), and
+:func:`changed_since` replays every row at or above it. A transaction that
+was still open when the client got its version is replayed however late it
+commits, at the cost of re-sending a few rows the client already has. Live
+messages carry a version sampled ``INVENTRO_DELTA_SETTLE`` seconds before
+they go out, for the same reason.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .channel_layer import close_sender
+from .models import Item, ItemDelta
+
+LOGGER = logging.getLogger(__name__)
+
+GROUP = "inventory_deltas"
+FIELDS = ("item_id", "category_id", "in_stock", "is_active")
+# Rows per channel-layer message; bigger batches are split
+MESSAGE_ROWS = 200
+
+
+def delta(item_id, category_id, in_stock, is_active) -> dict:
+    return {
+        "id": item_id,
+        "category": category_id,
+        "in_stock": in_stock,
+        "is_active": is_active,
+    }
+
+
+def item_delta(item: Item) -> dict:
+    return delta(item.pk, item.category_id, item.in_stock, item.is_active)
+
+
+def _table() -> str:
+    return connection.ops.quote_name(ItemDelta._meta.db_table)
+
+
+def record(rows):
+    """Upsert ``rows`` into ``ItemDelta`` at the current transaction's position."""
+    if not rows:
+        return
+    table = _table()
+    if connection.vendor == "postgresql":
+        position = "pg_current_xact_id()::text::bigint"
+    else:
+        position = f"(SELECT COALESCE(MAX(position), 0) + 1 FROM {table})"
+    latest = {row["id"]: row for row in rows}
+    params = []
+    # Sorted, so concurrent writers lock rows in the same order
+    for pk, row in sorted(latest.items()):
+        params += [pk, row["category"], row["in_stock"], row["is_active"]]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (item_id, category_id, in_stock, is_active, position) "
+            f"VALUES {', '.join([f'(%s, %s, %s, %s, {position})'] * len(latest))} "
+            f"ON CONFLICT (item_id) DO UPDATE SET category_id = EXCLUDED.category_id, "
+            f"in_stock = EXCLUDED.in_stock, is_active = EXCLUDED.is_active, position = EXCLUDED.position",
+            params,
+        )
+
+
+def current_version() -> int:
+    """The version to hand a client now: every transaction positioned below it has finished."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        else:
+            cursor.execute(f"SELECT COALESCE(MAX(position), 0) + 1 FROM {_table()}")
+        return cursor.fetchone()[0]
+
+
+def changed_since(version: int, categories=None, item_ids=None, limit: int = 500) -> tuple[list[dict], bool]:
+    """Deltas for items written at or after ``version``, oldest first; the flag is False when more than ``limit`` changed."""
+    qs = ItemDelta.objects.filter(position__gte=version)
+    if categories:
+        qs = qs.filter(category_id__in=categories)
+    if item_ids:
+        qs = qs.filter(item_id__in=item_ids)
+    rows = list(qs.order_by("position", "item_id").values_list(*FIELDS)[:limit + 1])
+    return [delta(*row) for row in rows[:limit]], len(rows) <= limit
+
+
+class DeltaPublisher:
+    def __init__(self, delay: float = 0.1, settle: float = 5.0, group: str = GROUP):
+        self.delay = delay
+        self.settle = settle
+        self.group = group
+        self._lock = threading.Lock()
+        self._pending: dict[int, dict] = {}
+        self._versions: deque[tuple[float, int]] = deque()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def submit(self, deltas):
+        """Queue rows for the next message; returns immediately."""
+        with self._lock:
+            for row in deltas:
+                self._pending[row["id"]] = row
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="inventory-deltas", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait()
+            if not self._stopping.is_set():
+                time.sleep(self.delay)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                LOGGER.exception("Could not publish inventory deltas")
+            finally:
+                close_old_connections()
+        close_sender(get_channel_layer())
+
+    def stop(self, timeout: float = 5.0):
+        """Send what is pending, end the thread and close the layer's sending connection."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        thread.join(timeout)
+        self._stopping.clear()
+
+    def flush(self) -> list[dict]:
+        """Send everything pending now; returns the rows that went out."""
+        with self._lock:
+            rows, self._pending = list(self._pending.values()), {}
+        layer = get_channel_layer()
+        if not rows or layer is None:
+            return []
+        rows.sort(key=lambda row: row["id"])
+        version = self._settled_version()
+        for start in range(0, len(rows), MESSAGE_ROWS):
+            message = {"type": "inventory_delta", "items": rows[start:start + MESSAGE_ROWS]}
+            if version is not None:
+                message["version"] = version
+            async_to_sync(layer.group_send)(self.group, message)
+        return rows
+
+    def _settled_version(self) -> int | None:
+        """
+        The newest version sampled at least ``settle`` seconds ago, if any.
+
+        A version is only safe to hand a client once every transaction below it
+        has not just committed but also been published, by whichever process
+        wrote it; a fresh one could let a client skip a batch still on its way.
+        """
+        now = time.monotonic()
+        self._versions.append((now, current_version()))
+        while len(self._versions) > 1 and now - self._versions[1][0] >= self.settle:
+            self._versions.popleft()
+        sampled_at, version = self._versions[0]
+        return version if now - sampled_at >= self.settle else None
+
+
+publisher = DeltaPublisher(
+    delay=getattr(settings, "INVENTRO_DELTA_DELAY", 0.1),
+    settle=getattr(settings, "INVENTRO_DELTA_SETTLE", 5.0),
+)
+atexit.register(publisher.stop)
+
+
+def submit(deltas):
+    publisher.submit(deltas)
@@ -0,0 +1,108 @@
+"""
+Streaming item export (CSV or JSON Lines, optionally gzipped).
+
+Rows come from ``values_list().iterator()``, which on PostgreSQL reads
+through a server-side cursor ``CURSOR_ROWS`` at a time, and are encoded into
+output blocks of about ``BLOCK_BYTES`` as they arrive. Nothing holds more
+than one cursor batch and one block, so memory stays flat however many items
+are exported; the API streams the blocks and ``manage.py export_items``
+writes them to a file.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+FIELDS = {
+    "id": "id",
+    "sku": "sku",
+    "name": "name",
+    "category": "category__name",
+    "in_stock": "in_stock",
+    "total_amount": "total_amount",
+    "low_stock_bar": "low_stock_bar",
+    "cost": "cost",
+    "location": "location",
+    "updated_at": "updated_at",
+}
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+CURSOR_ROWS = 2000
+BLOCK_BYTES = 64 * 1024
+
+
+def rows(queryset):
+    return queryset.order_by("id").values_list(*FIELDS.values()).iterator(chunk_size=CURSOR_ROWS)
+
+
+def csv_blocks(values):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for row in values:
+        writer.writerow(row)
+        if buffer.tell() >= BLOCK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def jsonl_blocks(values):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    names = list(FIELDS)
+    block, size = [], 0
+    for row in values:
+        line = encoder.encode(dict(zip(names, row)))
+        block.append(line)
+        size += len(line) + 1
+        if size >= BLOCK_BYTES:
+            yield ("\n".join(block) + "\n").encode()
+            block, size = [], 0
+    if block:
+        yield ("\n".join(block) + "\n").encode()
+
+
+def gzipped(blocks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(queryset, fmt: str = "csv", gzip: bool = False):
+    """Iterator of encoded output blocks for ``queryset`` in ``fmt``."""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    blocks = (csv_blocks if fmt == "csv" else jsonl_blocks)(rows(queryset))
+    return gzipped(blocks) if gzip else blocks
+
+
+def filename(fmt: str, gzip: bool = False) -> str:
+    return f"items.{fmt}{'.gz' if gzip else ''}"
+
+
+class StreamRenderer(BaseRenderer):
+    """Lets DRF negotiate ``?format=csv|jsonl``; the export view returns the stream itself."""
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only errors (a 403, say) are rendered here
+        return data if isinstance(data, bytes) else DjangoJSONEncoder().encode(data).encode()
+
+
+class CSVRenderer(StreamRenderer):
+    media_type = FORMATS["csv"]
+    format = "csv"
+
+
+class JSONLinesRenderer(StreamRenderer):
+    media_type = FORMATS["jsonl"]
+    format = "jsonl"
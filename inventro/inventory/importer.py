@@ -0,0 +1,362 @@
+"""
+Bulk item import behind ``manage.py import_items``.
+
+The CSV is read with the ``csv`` module one chunk at a time; valid rows are
+streamed into a temporary staging table with psycopg's ``COPY`` and merged
+into ``inventory_item`` with one statement per chunk:
+
+* missing categories are created set-wise (``INSERT ... ON CONFLICT``),
+* items whose SKU already exists are updated, but only when something
+  actually changed, and the rest are inserted.
+
+``sku`` isn't unique in the schema (older databases hold duplicates), so the
+merge is an ``UPDATE ... FROM`` plus an ``INSERT`` of the SKUs it didn't touch
+rather than ``ON CONFLICT``; importers take an advisory lock so two of them
+can't insert the same SKU. Within a chunk the last row for a SKU wins.
+
+Updates keep what is checked out: without an ``in_stock`` column, stock moves
+by the change in ``total_amount``. Either way stock never drops below what
+carts are holding (``reserved``), and an update that moves it bumps
+``Item.version``. Every row written gets an ``import`` line in the stock
+ledger from the same statement, which also returns the rows it wrote, so
+their search indexing, low-stock alerts and live deltas are recorded in the
+chunk's transaction like any other write's. Each chunk commits on its own,
+so memory stays at one chunk and an interrupted import can simply be rerun.
+"""
+from __future__ import annotations
+
+import csv
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+
+from .models import Item, ItemCategory, StockMovement
+from .signals import ItemChange, enqueue_side_effects
+
+REQUIRED = ("name", "sku", "total_amount", "cost", "category")
+OPTIONAL = ("location", "in_stock", "low_stock_bar", "description")
+
+STAGE = "import_items_stage"
+# Arbitrary key for pg_advisory_xact_lock, shared by all importers
+LOCK_KEY = 0x1A7E_0001
+
+COST_LIMIT = Decimal("1e13")
+
+# What an update writes for each column, from the staged row ``s`` and the current row ``i``
+MERGED = {
+    "name": "s.name",
+    "total_amount": "s.total_amount",
+    # Held stock stays (reserved is never negative, so item_in_stock_nonnegative holds too)
+    "in_stock": "GREATEST(COALESCE(s.in_stock, i.in_stock + s.total_amount - i.total_amount), i.reserved)",
+    "low_stock_bar": "COALESCE(s.low_stock_bar, i.low_stock_bar)",
+    "cost": "s.cost",
+    "category_id": "s.category_id",
+    "location": "COALESCE(s.location, i.location)",
+    "description": "COALESCE(s.description, i.description)",
+}
+MERGED_COLUMNS = ", ".join(MERGED)
+MERGED_CURRENT = ", ".join(f"i.{column}" for column in MERGED)
+MERGED_VALUES = ", ".join(MERGED.values())
+
+
+class RowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportRow:
+    line: int
+    name: str
+    sku: str
+    total_amount: int
+    cost: Decimal
+    category: str
+    location: str | None = None
+    in_stock: int | None = None
+    low_stock_bar: int | None = None
+    description: str | None = None
+
+    def values(self):
+        return (self.line, self.name, self.sku, self.total_amount, self.cost, self.category, self.location,
+                self.in_stock, self.low_stock_bar, self.description)
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    rejected: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    categories: int = 0
+    seconds: float = 0.0
+    # First few rejects and (on dry runs) changes, for display
+    rejects: list[tuple[int, str, str]] = field(default_factory=list)
+    diff: list[str] = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return (self.rows + self.rejected) / self.seconds if self.seconds else 0.0
+
+
+def _text(row, name, limit=None, required=False):
+    value = (row.get(name) or "").strip()
+    if required and not value:
+        raise RowError(f"{name} is required")
+    if limit and len(value) > limit:
+        raise RowError(f"{name} is longer than {limit} characters")
+    return value or None
+
+
+def _int(row, name, required=False):
+    value = (row.get(name) or "").strip().replace(",", "")
+    if not value:
+        if required:
+            raise RowError(f"{name} is required")
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise RowError(f"{name} is not a whole number: {value!r}")
+    if not -2**31 <= number < 2**31:
+        raise RowError(f"{name} is out of range: {value!r}")
+    return number
+
+
+def _cost(row):
+    value = (row.get("cost") or "").strip().replace("$", "").replace(",", "")
+    try:
+        cost = Decimal(value).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise RowError(f"cost is not a number: {row.get('cost')!r}")
+    if not cost.is_finite() or abs(cost) >= COST_LIMIT:
+        raise RowError(f"cost is out of range: {row.get('cost')!r}")
+    return cost
+
+
+def parse_row(line: int, row: dict) -> ImportRow:
+    """Validate one CSV record; raises :class:`RowError` with the reason."""
+    if None in row:
+        raise RowError("too many columns")
+    total_amount = _int(row, "total_amount", required=True)
+    if total_amount < 0:
+        raise RowError("total_amount is negative")
+    in_stock = _int(row, "in_stock")
+    if in_stock is not None and in_stock < 0:
+        raise RowError("in_stock is negative")
+    return ImportRow(
+        line=line,
+        name=_text(row, "name", Item._meta.get_field("name").max_length, required=True),
+        sku=_text(row, "sku", Item._meta.get_field("sku").max_length, required=True),
+        total_amount=total_amount,
+        cost=_cost(row),
+        category=_text(row, "category", ItemCategory._meta.get_field("name").max_length, required=True),
+        location=_text(row, "location", 255),
+        in_stock=in_stock,
+        low_stock_bar=_int(row, "low_stock_bar"),
+        description=_text(row, "description"),
+    )
+
+
+def read_chunks(file, chunk_size: int, on_reject):
+    """Yield lists of up to ``chunk_size`` valid rows; ``on_reject(line, sku, reason)`` gets the others."""
+    reader = csv.DictReader(file)
+    missing = [name for name in REQUIRED if name not in (reader.fieldnames or ())]
+    if missing:
+        raise RowError(f"CSV header is missing {', '.join(missing)}")
+    chunk = []
+    for record in reader:
+        try:
+            chunk.append(parse_row(reader.line_num, record))
+        except RowError as e:
+            on_reject(reader.line_num, (record.get("sku") or "").strip(), str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ItemImporter:
+    """Runs an import on the default (PostgreSQL) connection."""
+
+    def __init__(self, chunk_size: int = 5000, dry_run: bool = False, diff_limit: int = 50,
+                 reject_limit: int = 20, reject_writer=None):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.diff_limit = diff_limit
+        self.reject_limit = reject_limit
+        self.reject_writer = reject_writer
+        self.report = ImportReport()
+        self.item_table = Item._meta.db_table
+        self.category_table = ItemCategory._meta.db_table
+        self.movement_table = StockMovement._meta.db_table
+
+    def reject(self, line, sku, reason):
+        self.report.rejected += 1
+        if len(self.report.rejects) < self.reject_limit:
+            self.report.rejects.append((line, sku, reason))
+        if self.reject_writer is not None:
+            self.reject_writer.writerow((line, sku, reason))
+
+    def run(self, file, progress=None) -> ImportReport:
+        if connection.vendor != "postgresql":
+            raise RuntimeError("import_items needs PostgreSQL (it loads rows with COPY).")
+        started = time.perf_counter()
+        chunks = read_chunks(file, self.chunk_size, self.reject)
+        if self.dry_run:
+            # Everything in one transaction that is rolled back; the diff is computed against the real table
+            with transaction.atomic():
+                self._create_stage()
+                for chunk in chunks:
+                    self._load_chunk(chunk)
+                    self._diff_chunk()
+                    self._progress(progress, started)
+                transaction.set_rollback(True)
+        else:
+            with transaction.atomic():
+                self._create_stage()
+            for chunk in chunks:
+                with transaction.atomic():
+                    self._load_chunk(chunk)
+                    self._merge_chunk(chunk)
+                self._progress(progress, started)
+        self.report.seconds = time.perf_counter() - started
+        return self.report
+
+    def _progress(self, progress, started):
+        self.report.seconds = time.perf_counter() - started
+        if progress:
+            progress(self.report)
+
+    def _create_stage(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TEMPORARY TABLE IF NOT EXISTS {STAGE} (
+                    line integer, name text, sku text, total_amount integer, cost numeric(15, 2),
+                    category text, location text, in_stock integer, low_stock_bar integer, description text
+                )
+            """)
+
+    def _load_chunk(self, chunk: list[ImportRow]):
+        self.report.rows += len(chunk)
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {STAGE}")
+            with cursor.copy(
+                f"COPY {STAGE} (line, name, sku, total_amount, cost, category, location, in_stock, "
+                f"low_stock_bar, description) FROM STDIN"
+            ) as copy:
+                for row in chunk:
+                    copy.write_row(row.values())
+
+    def _source(self):
+        # The last staged row per SKU, with its category resolved
+        return f"""
+            source AS (
+                SELECT DISTINCT ON (s.sku) s.*, c.id AS category_id
+                FROM {STAGE} s JOIN {self.category_table} c ON c.name = s.category
+                ORDER BY s.sku, s.line DESC
+            )
+        """
+
+    def _merge_categories(self, cursor):
+        cursor.execute(f"""
+            INSERT INTO {self.category_table} (name)
+            SELECT DISTINCT category FROM {STAGE}
+            ON CONFLICT (name) DO NOTHING
+        """)
+        self.report.categories += cursor.rowcount
+
+    def _merge_chunk(self, chunk: list[ImportRow]):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [LOCK_KEY])
+            self._merge_categories(cursor)
+            cursor.execute(f"""
+                WITH {self._source()},
+                updated AS (
+                    UPDATE {self.item_table} i SET ({MERGED_COLUMNS}, updated_at) = ({MERGED_VALUES}, now()),
+                        version = i.version + CASE WHEN {MERGED["in_stock"]} <> i.in_stock THEN 1 ELSE 0 END
+                    FROM source s, {self.item_table} old
+                    WHERE i.sku = s.sku AND old.id = i.id
+                      AND ({MERGED_CURRENT}) IS DISTINCT FROM ({MERGED_VALUES})
+                    RETURNING i.id, i.sku, i.name, i.category_id, i.in_stock, i.total_amount, i.is_active,
+                              old.in_stock AS previous_in_stock, old.total_amount AS previous_total_amount
+                ),
+                inserted AS (
+                    INSERT INTO {self.item_table} (
+                        name, sku, in_stock, reserved, version, total_amount, low_stock_bar, cost, category_id,
+                        location, description, is_active, created_at, updated_at
+                    )
+                    SELECT s.name, s.sku, COALESCE(s.in_stock, s.total_amount), 0, 0, s.total_amount,
+                           COALESCE(s.low_stock_bar, GREATEST(s.total_amount / 2, 1)), s.cost, s.category_id,
+                           s.location, s.description, true, now(), now()
+                    FROM source s
+                    WHERE NOT EXISTS (SELECT 1 FROM {self.item_table} i WHERE i.sku = s.sku)
+                    RETURNING id, sku, name, category_id, in_stock, total_amount, is_active
+                ),
+                moved AS (
+                    INSERT INTO {self.movement_table} (item_id, reason, delta, created_at)
+                    SELECT id, '{StockMovement.REASON_IMPORT}', in_stock - previous_in_stock, now() FROM updated
+                    UNION ALL
+                    SELECT id, '{StockMovement.REASON_IMPORT}', in_stock, now() FROM inserted
+                )
+                SELECT * FROM updated
+                UNION ALL
+                SELECT *, NULL, NULL FROM inserted
+            """)
+            rows = cursor.fetchall()
+        changes = []
+        for pk, sku, name, category_id, in_stock, total_amount, is_active, previous_stock, previous_total in rows:
+            item = Item(pk=pk, sku=sku, name=name, category_id=category_id, in_stock=in_stock,
+                        total_amount=total_amount, is_active=is_active)
+            if previous_stock is None:
+                changes.append(ItemChange(item, created=True))
+            else:
+                changes.append(ItemChange(item, {"in_stock": previous_stock, "total_amount": previous_total}))
+        enqueue_side_effects(changes)
+        updated = len({change.item.sku for change in changes if not change.created})
+        inserted = sum(change.created for change in changes)
+        self.report.updated += updated
+        self.report.inserted += inserted
+        self.report.unchanged += len({row.sku for row in chunk}) - updated - inserted
+
+    def _diff_chunk(self):
+        # Same values the merge would write, compared in Python so the diff can say what changes.
+        # New categories are really inserted; the dry run's transaction is rolled back at the end.
+        current = ", ".join(f"i.{column}::text" for column in MERGED)
+        merged = ", ".join(f"({value})::text" for value in MERGED.values())
+        with connection.cursor() as cursor:
+            self._merge_categories(cursor)
+            cursor.execute(f"""
+                WITH {self._source()}
+                SELECT s.sku, s.name, i.id IS NULL, ARRAY[{current}], ARRAY[{merged}], oc.name, s.category
+                FROM source s
+                LEFT JOIN LATERAL (
+                    SELECT * FROM {self.item_table} i WHERE i.sku = s.sku ORDER BY i.id LIMIT 1
+                ) i ON true
+                LEFT JOIN {self.category_table} oc ON oc.id = i.category_id
+                ORDER BY s.line
+            """)
+            for sku, name, new, current, merged, old_category, category in cursor:
+                if new:
+                    self.report.inserted += 1
+                    self._diff_line(f"+ {sku} {name}")
+                    continue
+                changes = [
+                    f"{column}: {old} -> {value}"
+                    if column != "category_id" else f"category: {old_category} -> {category}"
+                    for column, old, value in zip(MERGED, current, merged)
+                    if old != value
+                ]
+                if changes:
+                    self.report.updated += 1
+                    self._diff_line(f"~ {sku} " + ", ".join(changes))
+                else:
+                    self.report.unchanged += 1
+
+    def _diff_line(self, line):
+        if len(self.report.diff) < self.diff_limit:
+            self.report.diff.append(line)
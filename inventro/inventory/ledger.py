@@ -0,0 +1,125 @@
+"""
+Stock movement ledger.
+
+Every write to an item appends a ``StockMovement`` line in the writing
+transaction: edits, soft deletes and creations through the item receivers in
+``inventory.signals``, checkouts, returns and stock adjustments through
+``inventory.stock`` and imports inside the merge statement itself. A line
+has the actor, the reason and the change in ``in_stock``, so an item's stock
+at any time is the sum of its lines up to then.
+
+Summing from the first line gets slow for busy items, so
+``manage.py snapshot_stock`` periodically folds the new lines into
+``StockSnapshot`` rows, one per item that moved, and compacts away older
+snapshots the newest one supersedes. :func:`stock_at` then reads the last
+snapshot before the time asked for and replays only the lines after it.
+"""
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.db import connection, models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Item, StockMovement, StockSnapshot
+
+# Lines newer than this are left for the next snapshot; their transactions may still be committing
+SNAPSHOT_GRACE = timedelta(minutes=1)
+SNAPSHOT_BATCH = 5000
+
+
+def _reason(change) -> str:
+    if change.created:
+        return StockMovement.REASON_CREATE
+    was_active = change.previous.get("is_active")
+    if was_active and not change.item.is_active:
+        return StockMovement.REASON_DELETE
+    if was_active is False and change.item.is_active:
+        return StockMovement.REASON_RESTORE
+    return StockMovement.REASON_EDIT
+
+
+def _delta(change) -> int:
+    if change.created:
+        return change.item.in_stock
+    before = change.previous.get("in_stock")
+    return 0 if before is None else change.item.in_stock - before
+
+
+def record(changes, actor=None, reason: str | None = None) -> None:
+    """
+    Append a line per ``ItemChange``. Without ``actor`` the item's
+    ``updated_by`` (``created_by`` for new items) is used, and without
+    ``reason`` it is worked out from the change. Saves that changed nothing
+    but ``updated_at`` leave no line.
+    """
+    now = timezone.now()
+    lines = []
+    for change in changes:
+        if not change.created and not change.previous.keys() - {"updated_at"}:
+            continue
+        item = change.item
+        if actor is not None:
+            actor_id = actor.pk
+        else:
+            actor_id = item.created_by_id if change.created else item.updated_by_id
+        lines.append(StockMovement(item_id=item.pk, actor_id=actor_id, reason=reason or _reason(change),
+                                   delta=_delta(change), created_at=now))
+    if lines:
+        StockMovement.objects.bulk_create(lines)
+
+
+def open_balances(when=None) -> int:
+    """
+    Give every item without ledger lines an opening line for its current
+    stock, dated ``when`` (the item's ``created_at`` by default). For rows
+    written behind the ledger's back, like migrations and generated data.
+    """
+    movements = StockMovement._meta.db_table
+    items = Item._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {movements} (item_id, reason, delta, created_at) "
+            f"SELECT i.id, %s, i.in_stock, COALESCE(%s, i.created_at) FROM {items} i "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {movements} m WHERE m.item_id = i.id)",
+            [StockMovement.REASON_OPENING, connection.ops.adapt_datetimefield_value(when)],
+        )
+        return cursor.rowcount
+
+
+def stock_at(item_id: int, when) -> int:
+    """``in_stock`` of the item at ``when``: its last snapshot by then plus the ledger lines since."""
+    snapshot = (StockSnapshot.objects.filter(item_id=item_id, taken_at__lte=when)
+                .order_by("-through").values_list("in_stock", "through").first())
+    base, through = snapshot or (0, 0)
+    moved = (StockMovement.objects.filter(item_id=item_id, id__gt=through, created_at__lte=when)
+             .aggregate(total=models.Sum("delta"))["total"])
+    return base + (moved or 0)
+
+
+def snapshot(now=None) -> int:
+    """Fold the lines since the last snapshot into a new one per item that moved; returns how many."""
+    taken_at = (now or timezone.now()) - SNAPSHOT_GRACE
+    start = StockSnapshot.objects.aggregate(last=models.Max("through"))["last"] or 0
+    through = (StockMovement.objects.filter(id__gt=start, created_at__lte=taken_at)
+               .aggregate(last=models.Max("id"))["last"])
+    if through is None:
+        return 0
+    previous = StockSnapshot.objects.filter(item=models.OuterRef("item")).order_by("-through").values("in_stock")[:1]
+    moved = (StockMovement.objects.filter(id__gt=start, id__lte=through).order_by().values("item")
+             .annotate(moved=models.Sum("delta"), base=Coalesce(models.Subquery(previous), 0)))
+    rows = (StockSnapshot(item_id=row["item"], taken_at=taken_at, through=through, in_stock=row["base"] + row["moved"])
+            for row in moved.iterator())
+    created = StockSnapshot.objects.bulk_create(rows, batch_size=SNAPSHOT_BATCH)
+    return len(created)
+
+
+def compact(keep_days: int, now=None) -> int:
+    """Drop snapshots older than ``keep_days`` that a later one, still that old, supersedes; returns how many."""
+    cutoff = (now or timezone.now()) - timedelta(days=keep_days)
+    superseded = StockSnapshot.objects.filter(
+        item=models.OuterRef("item"), through__gt=models.OuterRef("through"), taken_at__lte=cutoff,
+    )
+    deleted, _ = StockSnapshot.objects.filter(taken_at__lte=cutoff).filter(models.Exists(superseded)).delete()
+    return deleted
@@ -0,0 +1,301 @@
+"""
+HTTP load-test harness behind ``manage.py loadtest``.
+
+Seeds the configured database with a synthetic catalogue, starts the project
+(gunicorn, as in production, or runserver) unless a URL is given, and drives a
+weighted mix of the hot endpoints from concurrent authenticated clients. Each
+client is a thread with its own session; latencies are recorded per endpoint
+and summarised as throughput and p50/p95/p99.
+"""
+from __future__ import annotations
+
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from . import cube, ledger, stats
+from .models import Item, ItemCategory
+
+SKU_PREFIX = "LT-"
+USER_PREFIX = "loadtest-"
+CATEGORIES = ("Audio", "Lighting", "Video", "Backstage", "Sets/Props", "Costume/Wardrobe",
+              "Special Effects", "Storage/Transport", "Miscellaneous")
+LOCATIONS = ("Shelf A", "Shelf B", "Shelf C", "Cage 1", "Cage 2", "Truck")
+
+DEFAULT_MIX = {"inventory": 35, "items": 20, "cart": 15, "checkout": 5, "stats": 15, "metrics": 10}
+
+
+# --- Seeding ---
+
+def seed(items: int, users: int, rng: random.Random, batch_size: int = 2000, log=print) -> dict:
+    """Top the database up to ``items`` load-test items and ``users`` load-test users."""
+    categories = [ItemCategory.objects.get_or_create(name=name)[0] for name in CATEGORIES]
+    existing = Item.objects.filter(sku__startswith=SKU_PREFIX).count()
+    now = timezone.now()
+    for start in range(existing, items, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, items)):
+            total = rng.randint(500, 5000)
+            batch.append(Item(
+                name=f"Load test item {i:07d}",
+                sku=f"{SKU_PREFIX}{i:07d}",
+                in_stock=total,
+                total_amount=total,
+                low_stock_bar=max(total // 10, 1),
+                cost=round(max(rng.gauss(900, 400), 50), 2),
+                category=rng.choice(categories),
+                location=rng.choice(LOCATIONS),
+            ))
+        with transaction.atomic():
+            created = Item.objects.bulk_create(batch)
+            # created_at is auto_now_add; spread it afterwards so the charts have history
+            for item in created:
+                item.created_at = item.updated_at = now - timedelta(days=rng.expovariate(1 / 120))
+            Item.objects.bulk_update(created, ["created_at", "updated_at"], batch_size=500)
+        log(f"Seeded {min(start + batch_size, items)}/{items} items")
+    # bulk_create skips the signals: give the new items their opening ledger lines and bring the rollups up to date
+    ledger.open_balances()
+    stats.rebuild()
+    cube.refresh()
+
+    User = get_user_model()
+    names = [f"{USER_PREFIX}{i:04d}" for i in range(users)]
+    have = set(User.objects.filter(username__in=names).values_list("username", flat=True))
+    User.objects.bulk_create(
+        User(username=name, is_staff=True, password="!") for name in names if name not in have
+    )
+    return {
+        "items": Item.objects.filter(sku__startswith=SKU_PREFIX).count(),
+        "users": users,
+        "categories": len(categories),
+    }
+
+
+def login_cookies(usernames) -> list[dict]:
+    """Session and CSRF cookies for each user, without going through the login form."""
+    User = get_user_model()
+    backend = settings.AUTHENTICATION_BACKENDS[0] if getattr(settings, "AUTHENTICATION_BACKENDS", None) \
+        else "django.contrib.auth.backends.ModelBackend"
+    cookies = []
+    for user in User.objects.filter(username__in=usernames).order_by("username"):
+        session = SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = backend
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        cookies.append({
+            settings.SESSION_COOKIE_NAME: session.session_key,
+            settings.CSRF_COOKIE_NAME: get_random_string(32),
+        })
+    return cookies
+
+
+# --- Server ---
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind: str, port: int, workers: int) -> subprocess.Popen:
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+    if kind == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "inventro.wsgi:application",
+               "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"]
+    return subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def wait_ready(base_url: str, process: subprocess.Popen | None, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited: {process.stderr.read().decode(errors='replace')[-2000:]}")
+        try:
+            requests.get(f"{base_url}/api/stats/", timeout=2)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not come up within {timeout:.0f}s")
+
+
+# --- Clients ---
+
+@dataclass
+class Sample:
+    endpoint: str
+    seconds: float
+    ok: bool
+
+
+class Client:
+    """One simulated user: a session that picks endpoints from the mix in a closed loop."""
+
+    def __init__(self, base_url, cookies, item_ids, mix, rng):
+        self.base_url = base_url
+        self.item_ids = item_ids
+        self.endpoints, self.weights = zip(*mix.items())
+        self.rng = rng
+        self.session = requests.Session()
+        self.session.cookies.update(cookies)
+        self.session.headers.update({
+            "X-CSRFToken": cookies[settings.CSRF_COOKIE_NAME],
+            "Referer": base_url + "/",
+        })
+        self.samples: list[Sample] = []
+
+    def timed(self, endpoint, method, path, **kwargs):
+        kwargs.setdefault("allow_redirects", False)
+        kwargs.setdefault("timeout", 30)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        self.samples.append(Sample(endpoint, time.perf_counter() - start, ok))
+        return response
+
+    def add_to_cart(self):
+        return self.timed("cart", "POST", "/api/cart/",
+                          json={"item_id": self.rng.choice(self.item_ids), "quantity": self.rng.randint(1, 3)})
+
+    # One method per entry in the mix
+
+    def inventory(self):
+        params = {"per_page": self.rng.choice((10, 20, 50))}
+        roll = self.rng.random()
+        if roll < 0.2:
+            params["q"] = f"{self.rng.randint(0, 999):03d}"
+        elif roll < 0.3:
+            params["status"] = self.rng.choice(("in", "low", "out"))
+        elif roll < 0.4:
+            params["category"] = self.rng.choice(CATEGORIES)
+        self.timed("inventory", "GET", "/inventory/inventory/", params=params, headers={"HX-Request": "true"})
+
+    def items(self):
+        response = self.timed("items", "GET", "/api/items/", params={"page_size": 50, "count": "none"})
+        if response is not None and response.ok and self.rng.random() < 0.3:
+            next_url = response.json().get("next")
+            if next_url:
+                parts = urlsplit(next_url)
+                self.timed("items", "GET", f"{parts.path}?{parts.query}")
+
+    def cart(self):
+        self.add_to_cart()
+
+    def checkout(self):
+        for _ in range(self.rng.randint(1, 4)):
+            self.add_to_cart()
+        self.timed("checkout", "POST", "/inventory/add_inventory/")
+
+    def stats(self):
+        self.timed("stats", "GET", "/api/stats/")
+
+    def metrics(self):
+        self.timed("metrics", "GET", "/api/metrics/", params={"bucket": self.rng.choice(("day", "week"))})
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            getattr(self, self.rng.choices(self.endpoints, self.weights)[0])()
+
+
+def drive(base_url, cookies, item_ids, mix, duration, warmup, seed_value) -> tuple[list[Sample], float]:
+    """Run one client thread per cookie set; returns the samples after warm-up and the measured seconds."""
+    clients = [Client(base_url, c, item_ids, mix, random.Random(seed_value + i)) for i, c in enumerate(cookies)]
+    stop = threading.Event()
+    threads = [threading.Thread(target=client.run, args=(stop,), daemon=True) for client in clients]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    marks = [len(client.samples) for client in clients]
+    started = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    for thread in threads:
+        thread.join(timeout=60)
+    samples = [s for client, mark in zip(clients, marks) for s in client.samples[mark:]]
+    return samples, elapsed
+
+
+# --- Reporting ---
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict:
+    groups: dict[str, list[Sample]] = {}
+    for sample in samples:
+        groups.setdefault(sample.endpoint, []).append(sample)
+    groups["all"] = samples
+
+    out = {}
+    for name, group in groups.items():
+        times = sorted(s.seconds * 1000 for s in group)
+        errors = sum(not s.ok for s in group)
+        out[name] = {
+            "requests": len(group),
+            "errors": errors,
+            "rps": round(len(group) / elapsed, 2) if elapsed else 0,
+            "mean_ms": round(sum(times) / len(times), 2) if times else None,
+            **{f"p{p}_ms": round(percentile(times, p), 2) if times else None for p in (50, 95, 99)},
+            "max_ms": round(times[-1], 2) if times else None,
+        }
+    return out
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "database": settings.DATABASES["default"]["ENGINE"].rsplit(".", 1)[-1],
+        "debug": bool(settings.DEBUG),
+    }
+
+
+def compare(current: dict, previous: dict) -> list[tuple]:
+    """``(endpoint, metric, before, after, change %)`` for rps and latency percentiles."""
+    rows = []
+    for endpoint, now in current["endpoints"].items():
+        before = previous.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            old, new = before.get(metric), now.get(metric)
+            if old and new is not None:
+                rows.append((endpoint, metric, old, new, round((new - old) / old * 100, 1)))
+    return rows
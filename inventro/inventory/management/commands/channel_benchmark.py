@@ -0,0 +1,127 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.loadtest import percentile
+
+GROUP = "channel_benchmark"
+
+
+async def _subscribe(layer, consumers, messages, timeout, ready):
+    channels = [await layer.new_channel() for _ in range(consumers)]
+    for channel in channels:
+        await layer.group_add(GROUP, channel)
+    ready.set()
+
+    latencies = []
+    last = 0.0
+
+    async def consume(channel):
+        nonlocal last
+        for _ in range(messages):
+            message = await layer.receive(channel)
+            last = time.time()
+            latencies.append(last - message["sent"])
+
+    try:
+        await asyncio.wait_for(asyncio.gather(*(consume(c) for c in channels)), timeout)
+    except asyncio.TimeoutError:
+        pass
+    for channel in channels:
+        await layer.group_discard(GROUP, channel)
+    return {"latencies": latencies, "expected": consumers * messages, "last": last}
+
+
+def subscriber(settings_module, consumers, messages, timeout, ready, results):
+    """Entry point of one subscriber process."""
+    os.environ["DJANGO_SETTINGS_MODULE"] = settings_module
+    import django
+    django.setup()
+    from channels.layers import get_channel_layer
+
+    results.put(asyncio.run(_subscribe(get_channel_layer(), consumers, messages, timeout, ready)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure channel layer fan-out: subscriber processes join a group with many consumers each, "
+        "this process group_sends, and delivery throughput and latency percentiles are reported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4, help="Subscriber processes (stand-ins for workers/pods).")
+        parser.add_argument("--consumers", type=int, default=25, help="Group members per process.")
+        parser.add_argument("--messages", type=int, default=500, help="group_send calls.")
+        parser.add_argument("--size", type=int, default=200,
+                            help="Payload padding in bytes; above ~5.9kB messages spill to the table.")
+        parser.add_argument("--rate", type=float, default=0, help="Sends per second (0 = as fast as possible).")
+        parser.add_argument("--timeout", type=float, default=60, help="Seconds subscribers wait for all messages.")
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **opts):
+        backend = settings.CHANNEL_LAYERS["default"]["BACKEND"]
+        if backend.endswith("InMemoryChannelLayer"):
+            raise CommandError("The in-memory channel layer can't deliver across processes; nothing to measure.")
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        readies = [ctx.Event() for _ in range(opts["processes"])]
+        procs = [
+            ctx.Process(target=subscriber, args=(settings.SETTINGS_MODULE, opts["consumers"], opts["messages"],
+                                                 opts["timeout"], ready, results))
+            for ready in readies
+        ]
+        for proc in procs:
+            proc.start()
+        for ready in readies:
+            if not ready.wait(60):
+                for proc in procs:
+                    proc.terminate()
+                raise CommandError("Subscribers did not become ready within 60s.")
+
+        self.stdout.write(f"{opts['processes']} processes x {opts['consumers']} consumers ready; "
+                          f"sending {opts['messages']} messages...")
+        started, finished = asyncio.run(self.publish(opts))
+        outcomes = [results.get(timeout=opts["timeout"] + 30) for _ in procs]
+        for proc in procs:
+            proc.join()
+
+        latencies = sorted(ms * 1000 for outcome in outcomes for ms in outcome["latencies"])
+        expected = sum(outcome["expected"] for outcome in outcomes)
+        last = max((outcome["last"] for outcome in outcomes), default=finished)
+        elapsed = max(last, finished) - started
+        result = {
+            "backend": backend,
+            "config": {key: opts[key] for key in ("processes", "consumers", "messages", "size", "rate")},
+            "publish_rate": round(opts["messages"] / (finished - started), 1),
+            "deliveries": len(latencies),
+            "lost": expected - len(latencies),
+            "deliveries_per_sec": round(len(latencies) / elapsed, 1) if elapsed else None,
+            **{f"p{p}_ms": round(percentile(latencies, p), 2) if latencies else None for p in (50, 95, 99)},
+            "max_ms": round(latencies[-1], 2) if latencies else None,
+        }
+        for key, value in result.items():
+            if key != "config":
+                self.stdout.write(f"{key:>20}: {value}")
+        if opts["output"]:
+            with open(opts["output"], "w") as f:
+                json.dump(result, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {opts['output']}"))
+
+    async def publish(self, opts):
+        from channels.layers import get_channel_layer
+
+        layer = get_channel_layer()
+        pad = "x" * opts["size"]
+        interval = 1 / opts["rate"] if opts["rate"] else 0
+        started = time.time()
+        for seq in range(opts["messages"]):
+            await layer.group_send(GROUP, {"type": "benchmark", "seq": seq, "sent": time.time(), "pad": pad})
+            if interval:
+                await asyncio.sleep(max(0.0, started + (seq + 1) * interval - time.time()))
+        return started, time.time()
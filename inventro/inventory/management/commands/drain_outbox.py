@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver pending outbox events (search indexing, low-stock alerts). Runs until stopped unless --once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int, default=outbox.MAX_ATTEMPTS)
+        parser.add_argument("--interval", type=float, default=1.0,
+                            help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument("--once", action="store_true",
+                            help="Drain everything that is currently due, then exit.")
+
+    def handle(self, *args, **opts):
+        total_delivered = total_failed = 0
+        while True:
+            delivered, retried, failed = outbox.drain(opts["batch_size"], opts["max_attempts"])
+            total_delivered += delivered
+            total_failed += failed
+            if delivered or retried or failed:
+                self.stdout.write(f"Delivered {delivered}, will retry {retried}, gave up on {failed}.")
+            if delivered + retried + failed < opts["batch_size"]:
+                # Nothing more is due right now
+                if opts["once"]:
+                    break
+                time.sleep(opts["interval"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Outbox drained: {total_delivered} delivered, {total_failed} failed."))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory import reservations
+
+
+class Command(BaseCommand):
+    help = "Release cart holds that have expired, in batches. Runs until stopped unless --once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--interval", type=float, default=30.0,
+                            help="Seconds to sleep when nothing has expired.")
+        parser.add_argument("--once", action="store_true",
+                            help="Release everything that has expired by now, then exit.")
+        parser.add_argument("--rebuild", action="store_true",
+                            help="First recompute every item's reserved count from the cart lines.")
+
+    def handle(self, *args, **opts):
+        if opts["rebuild"]:
+            fixed = reservations.rebuild()
+            self.stdout.write(f"Corrected the reserved count of {fixed} item(s).")
+
+        total = 0
+        while True:
+            released = reservations.expire(opts["batch_size"])
+            total += released
+            if released:
+                self.stdout.write(f"Released {released} expired cart line(s).")
+            if released < opts["batch_size"]:
+                # Nothing more has lapsed right now
+                if opts["once"]:
+                    break
+                time.sleep(opts["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Expired holds released: {total} cart line(s)."))
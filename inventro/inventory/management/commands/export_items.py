@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from inventory import export
+from inventory.models import Item
+from inventory.views import apply_item_filters
+
+
+class Command(BaseCommand):
+    help = "Stream active items to CSV or JSON Lines with the inventory list's q/status/category filters."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=tuple(export.FORMATS), default="csv")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output.")
+        parser.add_argument("--output", "-o", default="-", help="File to write (default standard output).")
+        parser.add_argument("--q", help="Name/SKU search, as on the inventory page.")
+        parser.add_argument("--status", choices=("in", "low", "out"))
+        parser.add_argument("--category", help="Category name.")
+
+    def handle(self, *args, **opts):
+        items = apply_item_filters(Item.objects.filter(is_active=True),
+                                   q=opts["q"], status=opts["status"], category=opts["category"])
+        out = sys.stdout.buffer if opts["output"] == "-" else open(opts["output"], "wb")
+        size = 0
+        try:
+            for block in export.export(items, opts["format"], opts["gzip"]):
+                out.write(block)
+                size += len(block)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+            else:
+                out.flush()
+        if opts["output"] != "-":
+            self.stdout.write(self.style.SUCCESS(f"Wrote {size:,} bytes to {opts['output']}"))
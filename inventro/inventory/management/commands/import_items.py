@@ -0,0 +1,70 @@
+import csv
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import cube, stats
+from inventory.importer import ItemImporter, RowError
+
+
+class Command(BaseCommand):
+    help = (
+        "Import items from a CSV (name, sku, total_amount, cost, category[, location, in_stock, low_stock_bar, "
+        "description]), updating items that already have the SKU. Rows are streamed through COPY in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file, or - for standard input.")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per COPY and merge statement.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Report what would be inserted and changed, then roll everything back.")
+        parser.add_argument("--diff-limit", type=int, default=50, help="Dry-run changes to print.")
+        parser.add_argument("--rejects", help="Write every rejected row (line, sku, reason) to this CSV.")
+        parser.add_argument("--encoding", default="utf-8-sig")
+
+    def handle(self, *args, **opts):
+        if opts["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        rejects_file = open(opts["rejects"], "w", newline="") if opts["rejects"] else None
+        source = (io.TextIOWrapper(sys.stdin.buffer, encoding=opts["encoding"], newline="")
+                  if opts["path"] == "-" else open(opts["path"], encoding=opts["encoding"], newline=""))
+        try:
+            writer = csv.writer(rejects_file) if rejects_file else None
+            if writer:
+                writer.writerow(("line", "sku", "reason"))
+            importer = ItemImporter(chunk_size=opts["chunk_size"], dry_run=opts["dry_run"],
+                                    diff_limit=opts["diff_limit"], reject_writer=writer)
+            report = importer.run(source, progress=self.progress)
+        except (RowError, RuntimeError) as e:
+            raise CommandError(str(e))
+        except OSError as e:
+            raise CommandError(f"Could not read {opts['path']}: {e}")
+        finally:
+            source.close()
+            if rejects_file:
+                rejects_file.close()
+
+        if not opts["dry_run"] and (report.inserted or report.updated):
+            stats.rebuild()
+            # Updated rows can sit on any day, so every cell is recomputed
+            cube.refresh()
+
+        for line in report.diff:
+            self.stdout.write(line)
+        changed = report.inserted + report.updated
+        if len(report.diff) < changed:
+            self.stdout.write(f"... and {changed - len(report.diff)} more")
+        for line, sku, reason in report.rejects:
+            self.stderr.write(self.style.WARNING(f"line {line} ({sku or 'no sku'}): {reason}"))
+
+        verb = "Would import" if opts["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report.rows} rows in {report.seconds:.1f}s ({report.rows_per_sec:,.0f} rows/s): "
+            f"{report.inserted} new, {report.updated} updated, {report.unchanged} unchanged, "
+            f"{report.categories} new categories, {report.rejected} rejected."
+        ))
+
+    def progress(self, report):
+        self.stdout.write(f"{report.rows} rows ({report.rows_per_sec:,.0f} rows/s)")
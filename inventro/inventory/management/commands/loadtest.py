@@ -0,0 +1,112 @@
+import json
+import random
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import loadtest
+from inventory.models import Item
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in loadtest.DEFAULT_MIX:
+            raise CommandError(f"Unknown endpoint {name!r} in --mix; choose from {', '.join(loadtest.DEFAULT_MIX)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f"Bad weight for {name!r} in --mix: {weight!r}")
+    if not any(mix.values()):
+        raise CommandError("--mix needs at least one positive weight")
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the database, start the app and measure throughput and p50/p95/p99 latency per endpoint "
+        "under a concurrent mix of authenticated clients. Results are written as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=20000, help="Load-test items to seed (topped up, never removed).")
+        parser.add_argument("--clients", type=int, default=16, help="Concurrent clients, each its own user.")
+        parser.add_argument("--duration", type=float, default=30, help="Measured seconds.")
+        parser.add_argument("--warmup", type=float, default=5, help="Seconds to run before measuring.")
+        parser.add_argument("--mix", type=parse_mix,
+                            default=",".join(f"{k}={v}" for k, v in loadtest.DEFAULT_MIX.items()),
+                            help="Weighted endpoint mix, e.g. inventory=35,items=20,cart=15,checkout=5,stats=15,metrics=10")
+        parser.add_argument("--url", help="Load an already running server instead of starting one.")
+        parser.add_argument("--server", choices=("gunicorn", "runserver"), default="gunicorn")
+        parser.add_argument("--workers", type=int, default=3, help="gunicorn workers (entrypoint.sh uses 3).")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed for data and request mix.")
+        parser.add_argument("--output", help="Result file (default loadtest-<commit>-<time>.json).")
+        parser.add_argument("--compare", help="Earlier result file to print changes against.")
+
+    def handle(self, *args, **opts):
+        if settings.DEBUG:
+            self.stderr.write(self.style.WARNING("DEBUG is on; per-request query logging will skew the numbers."))
+
+        rng = random.Random(opts["seed"])
+        dataset = loadtest.seed(opts["items"], opts["clients"], rng, log=self.stdout.write)
+        usernames = [f"{loadtest.USER_PREFIX}{i:04d}" for i in range(opts["clients"])]
+        cookies = loadtest.login_cookies(usernames)
+        item_ids = list(Item.objects.filter(sku__startswith=loadtest.SKU_PREFIX, is_active=True)
+                        .values_list("id", flat=True)[:50000])
+        if not item_ids:
+            raise CommandError("No load-test items to use; pass --items > 0.")
+
+        process = None
+        base_url = (opts["url"] or "").rstrip("/")
+        if not base_url:
+            port = loadtest.free_port()
+            base_url = f"http://localhost:{port}"
+            process = loadtest.start_server(opts["server"], port, opts["workers"])
+        try:
+            try:
+                loadtest.wait_ready(base_url, process)
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"Driving {base_url} with {len(cookies)} clients for {opts['duration']:g}s "
+                              f"(+{opts['warmup']:g}s warm-up)...")
+            samples, elapsed = loadtest.drive(base_url, cookies, item_ids, opts["mix"],
+                                              opts["duration"], opts["warmup"], opts["seed"])
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+
+        commit = loadtest.git_commit()
+        result = {
+            "commit": commit,
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": {key: opts[key] for key in ("clients", "duration", "warmup", "mix", "server", "workers", "seed")},
+            "target": opts["url"] or opts["server"],
+            "dataset": dataset,
+            "environment": loadtest.environment(),
+            "elapsed": round(elapsed, 3),
+            "endpoints": loadtest.summarize(samples, elapsed),
+        }
+        output = opts["output"] or f"loadtest-{commit or 'nogit'}-{datetime.now():%Y%m%d%H%M%S}.json"
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+
+        self.report(result)
+        if opts["compare"]:
+            with open(opts["compare"]) as f:
+                previous = json.load(f)
+            self.stdout.write(f"\nChange vs {opts['compare']} ({previous.get('commit')}):")
+            for endpoint, metric, old, new, pct in loadtest.compare(result, previous):
+                self.stdout.write(f"  {endpoint:<10} {metric:<7} {old:>10} -> {new:<10} {pct:+.1f}%")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output}"))
+
+    def report(self, result):
+        self.stdout.write(f"{'endpoint':<10} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+        for name, row in result["endpoints"].items():
+            self.stdout.write(
+                f"{name:<10} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8} "
+                f"{row['p50_ms'] or '-':>8} {row['p95_ms'] or '-':>8} {row['p99_ms'] or '-':>8}"
+            )
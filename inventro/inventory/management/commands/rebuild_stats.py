@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory import stats
+from inventory.models import InventoryStats
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard stats rollup from the item table and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true",
+                            help="Only report drift (exit with an error if there is any); don't write.")
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            # Every shard, in pk order, as writers lock them
+            list(InventoryStats.objects.select_for_update().order_by("pk"))
+            current = stats.current()
+            expected = stats.compute()
+            drifted = stats.drift(current, expected) if current else {}
+
+            if current is None:
+                self.stdout.write(self.style.WARNING("No stats row yet."))
+            for field, (stored, value) in drifted.items():
+                self.stdout.write(self.style.WARNING(f"{field}: stored {stored}, actual {value}"))
+
+            if opts["check"]:
+                if drifted or current is None:
+                    raise CommandError("Stats rollup has drifted; run rebuild_stats to fix it.")
+                self.stdout.write(self.style.SUCCESS("Stats rollup matches the item table."))
+                return
+
+            stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats rollup ({len(drifted)} drifted field(s) corrected)."))
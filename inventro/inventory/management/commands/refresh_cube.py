@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventory import cube
+
+
+class Command(BaseCommand):
+    help = "Recompute the analytics cube from the item table, for every day or a range, and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", help="First creation day to refresh (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="end", help="Last creation day to refresh (YYYY-MM-DD).")
+        parser.add_argument("--check", action="store_true",
+                            help="Only report drift (exit with an error if there is any); don't write.")
+
+    def handle(self, *args, **opts):
+        bounds = {}
+        for name in ("start", "end"):
+            if opts[name]:
+                bounds[name] = parse_date(opts[name])
+                if bounds[name] is None:
+                    raise CommandError(f"{opts[name]!r} is not a date (YYYY-MM-DD).")
+
+        if opts["check"]:
+            drifted = cube.drift(**bounds)
+            for category_id, location, day in drifted:
+                self.stdout.write(self.style.WARNING(f"Cell drifted: category {category_id}, {location!r}, {day}"))
+            drifted_costs = cube.cost_drift(**bounds)
+            for category_id, day, cost in drifted_costs:
+                self.stdout.write(self.style.WARNING(f"Cost cell drifted: category {category_id}, {day}, {cost}"))
+            if drifted or drifted_costs:
+                raise CommandError("Analytics cube has drifted; run refresh_cube to fix it.")
+            self.stdout.write(self.style.SUCCESS("Analytics cube matches the item table."))
+            return
+
+        fixed = cube.refresh(**bounds)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed analytics cube ({fixed} drifted cell(s) corrected)."))
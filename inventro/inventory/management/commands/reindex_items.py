@@ -1,53 +1,135 @@
-from django.core.management.base import BaseCommand
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 from django.conf import settings
-from products.models import Item
-import requests, json
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory import opensearch
+from inventory.models import Item
+
 
 class Command(BaseCommand):
-    help = "Create OpenSearch index (if needed) and reindex all Items."
+    help = (
+        "Rebuild the OpenSearch item index without downtime: stream every Item into a new "
+        "versioned index through _bulk, then atomically point the alias at it. "
+        "Progress is checkpointed so an interrupted run can be resumed with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Documents per _bulk request.")
+        parser.add_argument("--workers", type=int, default=4, help="Parallel _bulk senders.")
+        parser.add_argument("--checkpoint", default="reindex_items.checkpoint.json",
+                            help="File used to record progress.")
+        parser.add_argument("--resume", action="store_true",
+                            help="Continue the run recorded in --checkpoint instead of starting over.")
+        parser.add_argument("--delete-old", action="store_true",
+                            help="Delete the indices the alias pointed at before the swap.")
 
-    def handle(self, *args, **kwargs):
-        base = getattr(settings, "OPENSEARCH_URL", "").rstrip("/")
-        if not base:
+    def handle(self, *args, **opts):
+        chunk_size, workers = opts["chunk_size"], opts["workers"]
+        if chunk_size < 1 or workers < 1:
+            raise CommandError("--chunk-size and --workers must be positive.")
+        client = opensearch.get_client(pool_size=workers)
+        if client is None:
             self.stdout.write(self.style.WARNING("OPENSEARCH_URL not set; skipping."))
             return
-        index = getattr(settings, "OPENSEARCH_INDEX", "items")
-        auth = None
-        if settings.OPENSEARCH_USER or settings.OPENSEARCH_PASSWORD:
-            auth = (settings.OPENSEARCH_USER, settings.OPENSEARCH_PASSWORD)
-
-        # Create index (ignore errors if exists)
-        mapping = {
-            "mappings": {
-                "properties": {
-                    "sku": {"type": "keyword"},
-                    "name": {"type": "text"},
-                    "in_stock": {"type": "integer"},
-                    "total_amount": {"type": "integer"},
-                    "category": {"type": "keyword"},
-                }
-            }
-        }
+        alias = getattr(settings, "OPENSEARCH_INDEX", "items")
+
+        state = self._load_checkpoint(opts["checkpoint"]) if opts["resume"] else None
+        if state and state["alias"] == alias:
+            index = state["index"]
+            self.stdout.write(f"Resuming '{index}' after item {state['last_id']}.")
+        else:
+            index = f"{alias}_v{timezone.now():%Y%m%d%H%M%S}"
+            body = dict(opensearch.ITEM_MAPPING)
+            # No refreshes or replicas while bulk loading; restored before the swap
+            body["settings"] = {"index": {"refresh_interval": "-1", "number_of_replicas": 0}}
+            client.create_index(index, body)
+            state = {"alias": alias, "index": index, "last_id": 0, "indexed": 0}
+            self._save_checkpoint(opts["checkpoint"], state)
+
+        started = time.monotonic()
+        sent = self._stream(client, index, state, chunk_size, workers, opts["checkpoint"])
+        elapsed = time.monotonic() - started
+
+        client.put_settings(index, {"index": {"refresh_interval": None, "number_of_replicas": None}})
+        client.refresh(index)
+        previous = client.swap_alias(alias, index)
+        for name in previous if opts["delete_old"] else []:
+            client.request("DELETE", name).raise_for_status()
+        if os.path.exists(opts["checkpoint"]):
+            os.remove(opts["checkpoint"])
+
+        rate = sent / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Reindexed {state['indexed']} items into '{index}' ({sent} this run, {rate:,.0f} docs/sec); "
+            f"alias '{alias}' now points at it."
+        ))
+
+    def _stream(self, client, index, state, chunk_size, workers, checkpoint) -> int:
+        """Send every item after ``state['last_id']``; return how many were sent."""
+        rows = (
+            Item.objects.filter(pk__gt=state["last_id"])
+            .order_by("pk")
+            .values_list(*opensearch.ITEM_DOC_FIELDS)
+            .iterator(chunk_size=chunk_size)  # server-side cursor on PostgreSQL
+        )
+        # Chunks finish out of order; only advance the checkpoint past a prefix that is fully done
+        pending, done = [], set()
+        in_flight = set()
+        sent = 0
+
+        def advance():
+            nonlocal pending
+            while pending and pending[0][0] in done:
+                seq, last_id, size = pending.pop(0)
+                done.discard(seq)
+                state["last_id"] = last_id
+                state["indexed"] += size
+            self._save_checkpoint(checkpoint, state)
+
+        def collect(futures):
+            nonlocal sent
+            for future in futures:
+                seq, size = future.result()  # re-raises a failed chunk and aborts the run
+                done.add(seq)
+                sent += size
+            in_flight.difference_update(futures)
+            advance()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            seq, docs = 0, []
+            for row in rows:
+                docs.append(opensearch.item_doc(row))
+                if len(docs) == chunk_size:
+                    seq = self._submit(pool, client, index, docs, seq, pending, in_flight)
+                    docs = []
+                    if len(in_flight) >= workers * 2:
+                        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(finished)
+            if docs:
+                self._submit(pool, client, index, docs, seq, pending, in_flight)
+            collect(list(in_flight))
+        return sent
+
+    def _submit(self, pool, client, index, docs, seq, pending, in_flight) -> int:
+        pending.append((seq, docs[-1]["id"], len(docs)))
+        lines = client.index_lines(index, docs)
+        in_flight.add(pool.submit(lambda: (client.bulk(lines), (seq, len(docs)))[1]))
+        return seq + 1
+
+    def _load_checkpoint(self, path):
         try:
-            requests.put(f"{base}/{index}", json=mapping, auth=auth, timeout=5)
-        except Exception:
-            pass
-
-        # Index all items
-        count = 0
-        for it in Item.objects.all().select_related("category"):
-            doc = {
-                "id": it.id,
-                "sku": it.SKU,
-                "name": it.name,
-                "in_stock": it.in_stock,
-                "total_amount": it.total_amount,
-                "category": it.category.name if it.category_id else None,
-            }
-            try:
-                requests.put(f"{base}/{index}/_doc/{it.id}", json=doc, auth=auth, timeout=5)
-                count += 1
-            except Exception:
-                continue
-
-        self.stdout.write(self.style.SUCCESS(f"Reindexed {count} items into '{index}'."))
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise CommandError(f"No checkpoint at '{path}' to resume from.")
+
+    def _save_checkpoint(self, path, state):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from inventory.models import Item, ItemCategory
+from inventory.renderers import UJSONRenderer
+from inventory.serializers import ItemRowSerializer, ItemSerializer
+
+STAGES = ("fetch", "serialize", "render")
+
+
+def model_path(queryset):
+    """The generic path: model instances, ItemSerializer, DRF's JSONRenderer."""
+    started = time.perf_counter()
+    items = list(queryset.select_related("category"))
+    fetched = time.perf_counter()
+    data = ItemSerializer(items, many=True).data
+    serialized = time.perf_counter()
+    JSONRenderer().render(data)
+    return fetched - started, serialized - fetched, time.perf_counter() - serialized
+
+
+def row_path(queryset):
+    """The item list's path: values() rows, ItemRowSerializer, UJSONRenderer."""
+    started = time.perf_counter()
+    rows = ItemRowSerializer()
+    values = list(rows.values(queryset))
+    fetched = time.perf_counter()
+    data = rows.to_representation(values)
+    serialized = time.perf_counter()
+    UJSONRenderer().render(data)
+    return fetched - started, serialized - fetched, time.perf_counter() - serialized
+
+
+class Command(BaseCommand):
+    help = (
+        "Time listing N items through ItemSerializer + JSONRenderer and through the values() rows + ujson "
+        "read path, and report objects/sec per stage. Benchmark items are created and rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per path; the fastest is reported.")
+
+    def handle(self, *args, **opts):
+        if opts["rows"] < 1 or opts["repeat"] < 1:
+            raise CommandError("--rows and --repeat must be positive")
+        with transaction.atomic():
+            queryset = self.seed(opts["rows"])
+            results = {
+                name: min((path(queryset) for _ in range(opts["repeat"])), key=sum)
+                for name, path in (("model", model_path), ("rows", row_path))
+            }
+            transaction.set_rollback(True)
+
+        rows = opts["rows"]
+        self.stdout.write(f"{rows:,} items, best of {opts['repeat']} (objects/sec)")
+        self.stdout.write(f"{'path':<8}" + "".join(f"{stage:>12}" for stage in (*STAGES, "total")))
+        for name, times in results.items():
+            self.stdout.write(f"{name:<8}" + "".join(f"{rows / t:>12,.0f}" for t in (*times, sum(times))))
+        self.stdout.write(self.style.SUCCESS(
+            f"rows path is {sum(results['model']) / sum(results['rows']):.1f}x the model path end to end"
+        ))
+
+    def seed(self, count):
+        categories = [ItemCategory.objects.get_or_create(name=f"Benchmark {i}")[0] for i in range(8)]
+        Item.objects.bulk_create(
+            Item(name=f"Benchmark item {i:06d}", sku=f"BENCH-{i:06d}", in_stock=i % 40, low_stock_bar=5,
+                 total_amount=40, location=f"Shelf {i % 12}", cost=f"{i % 500}.{i % 100:02d}",
+                 description="Benchmark row", category=categories[i % len(categories)])
+            for i in range(count)
+        )
+        return Item.objects.filter(sku__startswith="BENCH-").order_by("name", "id")
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory import ledger
+
+
+class Command(BaseCommand):
+    help = "Fold new stock ledger lines into per-item snapshots and compact old ones. Runs until stopped unless --once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=3600.0,
+                            help="Seconds between snapshots.")
+        parser.add_argument("--keep-days", type=int, default=30,
+                            help="Keep every snapshot this recent; older ones are dropped once a later one covers them.")
+        parser.add_argument("--once", action="store_true",
+                            help="Take one snapshot, compact, then exit.")
+
+    def handle(self, *args, **opts):
+        while True:
+            taken = ledger.snapshot()
+            dropped = ledger.compact(opts["keep_days"])
+            self.stdout.write(f"Snapshot of {taken} item(s); compacted away {dropped} older row(s).")
+            if opts["once"]:
+                break
+            time.sleep(opts["interval"])
+
+        self.stdout.write(self.style.SUCCESS("Stock snapshot done."))
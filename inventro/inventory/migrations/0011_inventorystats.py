@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:43
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_stats(apps, schema_editor):
+    Item = apps.get_model("inventory", "Item")
+    ItemCategory = apps.get_model("inventory", "ItemCategory")
+    InventoryStats = apps.get_model("inventory", "InventoryStats")
+    money = models.DecimalField(max_digits=20, decimal_places=2)
+    zero = models.Value(Decimal(0), output_field=money)
+    totals = Item.objects.filter(is_active=True).aggregate(
+        total_items=models.Count("id"),
+        low_stock=models.Count("id", filter=models.Q(in_stock__gt=0, in_stock__lte=models.F("low_stock_bar"))),
+        out_of_stock=models.Count("id", filter=models.Q(in_stock__lte=0)),
+        total_quantity=Coalesce(models.Sum("in_stock"), 0),
+        inventory_value=Coalesce(models.Sum(models.ExpressionWrapper(models.F("in_stock") * models.F("cost"), output_field=money)), zero),
+        total_cost=Coalesce(models.Sum("cost"), zero),
+    )
+    InventoryStats.objects.create(pk=1, categories=ItemCategory.objects.count(), **totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_outboxevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_items', models.IntegerField(default=0)),
+                ('low_stock', models.IntegerField(default=0)),
+                ('out_of_stock', models.IntegerField(default=0)),
+                ('total_quantity', models.BigIntegerField(default=0)),
+                ('inventory_value', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('categories', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'inventory stats',
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
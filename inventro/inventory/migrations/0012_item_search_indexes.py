@@ -0,0 +1,43 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models.functions import Cast, Upper
+
+
+def search_indexes():
+    # Expressions must match what inventory.search.PostgresSearchBackend queries with
+    return [
+        GinIndex(SearchVector("name", "sku", config="simple"), name="item_search_vector_gin"),
+        GinIndex(OpClass(Upper(Cast("name", models.TextField())), name="gin_trgm_ops"), name="item_name_trgm_gin"),
+        models.Index(OpClass(Upper(Cast("sku", models.TextField())), name="text_pattern_ops"), name="item_sku_prefix_idx"),
+    ]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Item = apps.get_model("inventory", "Item")
+    for index in search_indexes():
+        schema_editor.add_index(Item, index)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Item = apps.get_model("inventory", "Item")
+    for index in search_indexes():
+        schema_editor.remove_index(Item, index)
+
+
+class Migration(migrations.Migration):
+    """PostgreSQL-only search indexes; a no-op on other databases (SQLite falls back to icontains)."""
+
+    dependencies = [
+        ('inventory', '0011_inventorystats'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
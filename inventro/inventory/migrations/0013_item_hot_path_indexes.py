@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_item_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['name', 'id'], name='item_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'name', 'id'], name='item_active_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('in_stock__lt', models.F('total_amount')), ('is_active', True)), fields=['name', 'id'], name='item_active_low_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('in_stock__lte', 0), ('is_active', True)), fields=['name', 'id'], name='item_active_out_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at'], name='item_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['-updated_at'], name='item_updated_idx'),
+        ),
+    ]
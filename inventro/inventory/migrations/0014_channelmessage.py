@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_item_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.BinaryField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_channelmessage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['sku'], name='item_sku_idx'),
+        ),
+    ]
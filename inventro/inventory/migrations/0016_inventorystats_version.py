@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_item_sku_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorystats',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
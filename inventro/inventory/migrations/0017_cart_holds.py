@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:28
+
+import inventory.models
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def reserve_existing_lines(apps, schema_editor):
+    # Carts already in the database become holds that start now
+    Item = apps.get_model("inventory", "Item")
+    CartItem = apps.get_model("inventory", "CartItem")
+    held = (
+        CartItem.objects.filter(item=models.OuterRef("pk"))
+        .values("item").annotate(total=models.Sum("quantity")).values("total")
+    )
+    Item.objects.filter(pk__in=CartItem.objects.values("item")).update(reserved=Coalesce(models.Subquery(held), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_inventorystats_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='expires_at',
+            field=models.DateTimeField(default=inventory.models.hold_expiry),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['expires_at', 'id'], name='cartitem_expires_idx'),
+        ),
+        migrations.RunPython(reserve_existing_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:35
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def clamp_negative_stock(apps, schema_editor):
+    # Stock that went negative before the constraint existed reads as none left
+    Item = apps.get_model("inventory", "Item")
+    Item.objects.filter(in_stock__lt=0).update(in_stock=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_cart_holds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='in_stock',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.RunPython(clamp_negative_stock, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='item',
+            constraint=models.CheckConstraint(condition=models.Q(('in_stock__gte', 0)), name='item_in_stock_nonnegative'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_balances(apps, schema_editor):
+    # The ledger starts from each existing item's current stock
+    Item = apps.get_model("inventory", "Item")
+    StockMovement = apps.get_model("inventory", "StockMovement")
+    lines = (StockMovement(item_id=pk, reason="opening", delta=in_stock)
+             for pk, in_stock in Item.objects.values_list("pk", "in_stock").iterator())
+    StockMovement.objects.bulk_create(lines, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_item_stock_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('opening', 'Opening balance'), ('create', 'New item added'), ('edit', 'Details updated'), ('delete', 'Removed from inventory'), ('restore', 'Restored to inventory'), ('checkout', 'Checked out'), ('return', 'Returned'), ('import', 'Imported'), ('adjust', 'Stock adjusted')], max_length=10)),
+                ('delta', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to=settings.AUTH_USER_MODEL)),
+                ('item', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'id'], name='movement_item_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('through', models.BigIntegerField(db_index=True)),
+                ('in_stock', models.IntegerField()),
+                ('item', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'through'], name='snapshot_item_idx')],
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
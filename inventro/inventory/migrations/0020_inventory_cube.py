@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:50
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def fill_cube(apps, schema_editor):
+    # Same cells as inventory.cube.compute(), against the historical models
+    Item = apps.get_model("inventory", "Item")
+    InventoryCube = apps.get_model("inventory", "InventoryCube")
+    money = models.DecimalField(max_digits=20, decimal_places=2)
+    zero = models.Value(Decimal(0), output_field=money)
+    rows = (
+        Item.objects.filter(is_active=True)
+        .annotate(day=TruncDate("created_at"), place=Coalesce("location", models.Value("")))
+        .order_by().values("category_id", "place", "day")
+        .annotate(
+            total_items=models.Count("id"),
+            low_stock=models.Count("id", filter=models.Q(in_stock__gt=0, in_stock__lte=models.F("low_stock_bar"))),
+            out_of_stock=models.Count("id", filter=models.Q(in_stock__lte=0)),
+            total_quantity=Coalesce(models.Sum("in_stock"), 0),
+            inventory_value=Coalesce(models.Sum(models.ExpressionWrapper(
+                models.F("in_stock") * models.F("cost"), output_field=money)), zero),
+            total_cost=Coalesce(models.Sum("cost"), zero),
+        )
+    )
+    InventoryCube.objects.bulk_create(
+        (InventoryCube(location=row.pop("place"), **row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCube',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(blank=True, default='', max_length=255)),
+                ('day', models.DateField()),
+                ('total_items', models.IntegerField(default=0)),
+                ('low_stock', models.IntegerField(default=0)),
+                ('out_of_stock', models.IntegerField(default=0)),
+                ('total_quantity', models.BigIntegerField(default=0)),
+                ('inventory_value', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('category', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.itemcategory')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['location', 'day'], name='cube_location_idx'), models.Index(fields=['day'], name='cube_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'location', 'day'), name='cube_cell_unique')],
+            },
+        ),
+        migrations.RunPython(fill_cube, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    # Lines for the same item in one cart become a single line; reserved already counts all of them
+    CartItem = apps.get_model("inventory", "CartItem")
+    duplicates = (CartItem.objects.values("cart", "item").order_by()
+                  .annotate(lines=models.Count("id"), total=models.Sum("quantity"), keep=models.Min("id"),
+                            expires=models.Max("expires_at"))
+                  .filter(lines__gt=1))
+    for row in duplicates.iterator():
+        CartItem.objects.filter(pk=row["keep"]).update(quantity=row["total"], expires_at=row["expires"])
+        CartItem.objects.filter(cart=row["cart"], item=row["item"]).exclude(pk=row["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_inventory_cube'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HoldCounter',
+            fields=[
+                ('slot', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'item'), name='cartitem_cart_item_unique'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:50
+
+from collections import Counter
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def cost_bucket(cost):
+    # Same rounding as inventory.cube.cost_bucket()
+    cost = Decimal(cost or 0)
+    if cost <= 0:
+        return Decimal("0.00")
+    step = Decimal(1).scaleb(cost.adjusted() - 1)
+    return ((cost // step) * step).quantize(Decimal("0.01"))
+
+
+def fill_cost_cube(apps, schema_editor):
+    Item = apps.get_model("inventory", "Item")
+    InventoryCostCube = apps.get_model("inventory", "InventoryCostCube")
+    rows = Item.objects.filter(is_active=True).order_by().values_list("category_id", "created_at", "cost")
+    cells = Counter((category_id, timezone.localdate(created_at), cost_bucket(cost))
+                    for category_id, created_at, cost in rows.iterator(chunk_size=10000))
+    InventoryCostCube.objects.bulk_create(
+        (InventoryCostCube(category_id=category_id, day=day, cost=cost, items=items)
+         for (category_id, day, cost), items in cells.items()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_cart_hold_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCostCube',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('items', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.itemcategory')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='cost_cube_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'day', 'cost'), name='cost_cube_cell_unique')],
+            },
+        ),
+        migrations.RunPython(fill_cost_cube, migrations.RunPython.noop),
+    ]
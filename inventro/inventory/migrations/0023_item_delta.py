@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:06
+
+from django.db import migrations, models
+
+
+def fill_item_deltas(apps, schema_editor):
+    # Existing items start at position 0, before any client's version
+    Item = apps.get_model("inventory", "Item")
+    ItemDelta = apps.get_model("inventory", "ItemDelta")
+    rows = Item.objects.order_by().values_list("id", "category_id", "in_stock", "is_active")
+    ItemDelta.objects.bulk_create(
+        (ItemDelta(item_id=pk, category_id=category_id, in_stock=in_stock, is_active=is_active, position=0)
+         for pk, category_id, in_stock, is_active in rows.iterator(chunk_size=10000)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0022_inventory_cost_cube'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemDelta',
+            fields=[
+                ('item_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('category_id', models.BigIntegerField(null=True)),
+                ('in_stock', models.IntegerField()),
+                ('is_active', models.BooleanField()),
+                ('position', models.BigIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['position', 'item_id'], name='item_delta_position_idx')],
+            },
+        ),
+        migrations.RunPython(fill_item_deltas, migrations.RunPython.noop),
+    ]
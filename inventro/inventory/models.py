@@ -1,12 +1,97 @@
+from datetime import timedelta
+
 from django.conf import settings
-from django.db import models
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.utils import timezone
 from authentication.models import User
 
 
+class ChangeTrackingMixin:
+    """
+    Remembers the field values an instance was loaded with, so callers can
+    ask what changed (``changed_fields`` / ``previous_value()``) without
+    re-reading the row, and so ``save()`` only writes the modified columns.
+
+    Inside ``post_save`` receivers ``previous_value()`` still returns the
+    value from before the save; the snapshot is refreshed afterwards.
+    """
+
+    _loaded_values = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._current_values()
+        return instance
+
+    def _current_values(self, attnames=None) -> dict:
+        # Deferred fields are not in __dict__ and are never reported as changed
+        return {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__ and (attnames is None or field.attname in attnames)
+        }
+
+    @property
+    def changed_fields(self) -> set[str]:
+        """Names of the fields modified since the instance was loaded or last saved."""
+        if self._loaded_values is None:
+            return {field.name for field in self._meta.concrete_fields}
+        return {
+            field.name
+            for field in self._meta.concrete_fields
+            if field.attname in self._loaded_values
+            and self.__dict__.get(field.attname) != self._loaded_values[field.attname]
+        }
+
+    def previous_value(self, name: str):
+        """The value ``name`` had when loaded (a pk for foreign keys), or None if unknown."""
+        if self._loaded_values is None:
+            return None
+        return self._loaded_values.get(self._meta.get_field(name).attname)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if (update_fields is None and self._loaded_values is not None and not self._state.adding
+                and not kwargs.get("force_insert")):
+            auto_now = [f.name for f in self._meta.concrete_fields if getattr(f, "auto_now", False)]
+            kwargs["update_fields"] = update_fields = self.changed_fields | set(auto_now)
+        super().save(*args, **kwargs)
+        if update_fields is None:
+            self._loaded_values = self._current_values()
+        elif self._loaded_values is not None:
+            saved = {self._meta.get_field(name).attname for name in update_fields}
+            self._loaded_values.update(self._current_values(saved))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        if self._loaded_values is not None:
+            attnames = None if fields is None else {self._meta.get_field(f).attname for f in fields}
+            self._loaded_values.update(self._current_values(attnames))
+
+
 class ItemCategory(models.Model):
     name = models.CharField(max_length=50, unique=True)
 
-class Item(models.Model):
+    def save(self, *args, **kwargs):
+        # Keeps the stats rollup's category count in the same transaction
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+class ItemManager(models.Manager):
+    def adjust_stock(self, changes, all_or_nothing=False, **ledger):
+        """
+        Apply stock deltas without a read-modify-write; see ``inventory.stock``.
+        ``changes`` are ``StockChange``s or ``(item_id, delta[, release[, expected_version]])``
+        tuples, and the result is a ``StockResult`` per change. ``actor`` and
+        ``reason`` are recorded in the stock ledger.
+        """
+        from .stock import adjust
+        return adjust(changes, all_or_nothing=all_or_nothing, **ledger)
+
+
+class Item(ChangeTrackingMixin, models.Model):
     """
     Core inventory item model.
 
@@ -22,7 +107,11 @@ class Item(models.Model):
     name = models.CharField(max_length=255)
     
     sku = models.CharField(max_length=50)
-    in_stock = models.IntegerField()
+    in_stock = models.IntegerField(validators=[MinValueValidator(0)])
+    # Sum of the live cart holds on this item, kept by inventory.reservations
+    reserved = models.PositiveIntegerField(default=0)
+    # Bumped by every write to in_stock, here and in inventory.stock, for compare-and-set writes
+    version = models.BigIntegerField(default=0)
     low_stock_bar = models.IntegerField()
     total_amount = models.IntegerField()
     location = models.TextField()
@@ -56,8 +145,50 @@ class Item(models.Model):
         related_name="inventory_items_updated",
     )
 
+    objects = ItemManager()
+
     class Meta:
         ordering = ["name"]
+        # Lists, searches and dashboards only ever look at active items, so
+        # the hot indexes are partial on is_active. (name, id) is the keyset
+        # pagination order; the low/out-of-stock ones cover the status filters.
+        indexes = [
+            models.Index(fields=["name", "id"], condition=models.Q(is_active=True), name="item_active_name_idx"),
+            models.Index(fields=["category", "name", "id"], condition=models.Q(is_active=True),
+                         name="item_active_category_idx"),
+            models.Index(fields=["name", "id"], condition=models.Q(is_active=True, in_stock__lt=models.F("total_amount")),
+                         name="item_active_low_idx"),
+            models.Index(fields=["name", "id"], condition=models.Q(is_active=True, in_stock__lte=0),
+                         name="item_active_out_idx"),
+            models.Index(fields=["created_at"], condition=models.Q(is_active=True), name="item_active_created_idx"),
+            models.Index(fields=["-updated_at"], name="item_updated_idx"),
+            # Imports match rows by SKU
+            models.Index(fields=["sku"], name="item_sku_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(in_stock__gte=0), name="item_in_stock_nonnegative"),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        # Stock written through save() is a new version too, or expected_version checks would miss it
+        bump = not self._state.adding and (
+            "in_stock" in update_fields if update_fields is not None else "in_stock" in self.changed_fields
+        )
+        if bump:
+            self.version = models.F("version") + 1
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "version"}
+        # post_save receivers write outbox rows and stats deltas; keep them in the same transaction as the row
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+            if bump:
+                self.refresh_from_db(using=kwargs.get("using"), fields=["version"])
+
+    @property
+    def available(self) -> int:
+        """Stock nobody is holding in a cart."""
+        return self.in_stock - self.reserved
 
     def __str__(self) -> str:
         # Avoid referencing non-existent fields; include location when present
@@ -81,11 +212,28 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart<{self.pk}> for {self.user.first_name}"
 
+def hold_expiry():
+    return timezone.now() + timedelta(seconds=getattr(settings, "INVENTRO_CART_HOLD_SECONDS", 1800))
+
+
 class CartItem(models.Model):
+    """A cart line, which holds ``quantity`` of the item until ``expires_at`` (see ``inventory.reservations``)."""
+
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="cart_items")
     item = models.ForeignKey(Item, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     added_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=hold_expiry)
+
+    class Meta:
+        indexes = [
+            # The sweeper takes the oldest lapsed holds first
+            models.Index(fields=["expires_at", "id"], name="cartitem_expires_idx"),
+        ]
+        constraints = [
+            # One line per item and cart; concurrent first adds meet here instead of both holding stock
+            models.UniqueConstraint(fields=["cart", "item"], name="cartitem_cart_item_unique"),
+        ]
 
     def __str__(self):
         return f"{self.item.name} x{self.quantity}"
@@ -97,4 +245,249 @@ class InventoryItem(models.Model):
         related_name="inventory",
     )
     item = models.ForeignKey(Item, on_delete=models.RESTRICT)
-    quantity = models.IntegerField(default=1)
\ No newline at end of file
+    quantity = models.IntegerField(default=1)
+
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger of item writes: who did what to an item and by how
+    much it moved ``in_stock``. Lines are written in the same transaction as
+    the write itself (see ``inventory.ledger``) and never changed afterwards.
+    """
+
+    REASON_OPENING = "opening"
+    REASON_CREATE = "create"
+    REASON_EDIT = "edit"
+    REASON_DELETE = "delete"
+    REASON_RESTORE = "restore"
+    REASON_CHECKOUT = "checkout"
+    REASON_RETURN = "return"
+    REASON_IMPORT = "import"
+    REASON_ADJUST = "adjust"
+    REASON_CHOICES = [
+        (REASON_OPENING, "Opening balance"),
+        (REASON_CREATE, "New item added"),
+        (REASON_EDIT, "Details updated"),
+        (REASON_DELETE, "Removed from inventory"),
+        (REASON_RESTORE, "Restored to inventory"),
+        (REASON_CHECKOUT, "Checked out"),
+        (REASON_RETURN, "Returned"),
+        (REASON_IMPORT, "Imported"),
+        (REASON_ADJUST, "Stock adjusted"),
+    ]
+
+    # (item, id) below serves the item's lookups
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="movements", db_index=False)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="stock_movements",
+    )
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+    # Change in in_stock; 0 for writes that left the stock alone
+    delta = models.IntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["item", "id"], name="movement_item_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.reason} {self.delta:+d} on item {self.item_id}"
+
+
+class StockSnapshot(models.Model):
+    """
+    An item's ``in_stock`` with every ledger line up to ``through`` folded
+    in, so its stock at a past time is a snapshot plus the lines after it.
+    Written and compacted by ``manage.py snapshot_stock``.
+    """
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="+", db_index=False)
+    taken_at = models.DateTimeField()
+    # Id of the last StockMovement included
+    through = models.BigIntegerField(db_index=True)
+    in_stock = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["item", "through"], name="snapshot_item_idx"),
+        ]
+
+
+class InventoryStats(models.Model):
+    """
+    One shard of the rollup of the dashboard totals over active items, kept
+    current by applying per-write deltas (see ``inventory.stats``); the
+    totals are the sums over every row. Rebuild or check for drift with
+    ``manage.py rebuild_stats``.
+    """
+
+    total_items = models.IntegerField(default=0)
+    # 0 < in_stock <= low_stock_bar
+    low_stock = models.IntegerField(default=0)
+    # in_stock <= 0
+    out_of_stock = models.IntegerField(default=0)
+    total_quantity = models.BigIntegerField(default=0)
+    # sum of in_stock * cost
+    inventory_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    # sum of cost
+    total_cost = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    categories = models.IntegerField(default=0)
+    # Goes up with every write applied here; HTTP ETags are derived from it
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "inventory stats"
+
+    def __str__(self):
+        return f"InventoryStats({self.total_items} items)"
+
+
+class HoldCounter(models.Model):
+    """
+    Write counters for cart holds, spread over a few rows so carts don't all
+    update the same one. Their sum goes up with every change to
+    ``Item.reserved`` and versions the item lists, which show it (see
+    ``inventory.reservations`` and ``inventory.conditional``).
+    """
+
+    slot = models.PositiveSmallIntegerField(primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"HoldCounter({self.slot}: {self.version})"
+
+
+class InventoryCube(models.Model):
+    """
+    The stats rollup's totals per category, location and the day the items
+    were created, so analytics can slice and roll them up without reading
+    the item table. Kept current by ``inventory.cube``.
+    """
+
+    category = models.ForeignKey(ItemCategory, on_delete=models.CASCADE, related_name="+", db_index=False)
+    # "" for items without a location
+    location = models.CharField(max_length=255, blank=True, default="")
+    day = models.DateField()
+
+    total_items = models.IntegerField(default=0)
+    low_stock = models.IntegerField(default=0)
+    out_of_stock = models.IntegerField(default=0)
+    total_quantity = models.BigIntegerField(default=0)
+    inventory_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    total_cost = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        # The unique index serves category slices; the others location and date-range ones
+        constraints = [
+            models.UniqueConstraint(fields=["category", "location", "day"], name="cube_cell_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["location", "day"], name="cube_location_idx"),
+            models.Index(fields=["day"], name="cube_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"InventoryCube({self.category_id}, {self.location!r}, {self.day})"
+
+
+class InventoryCostCube(models.Model):
+    """
+    How many active items of a category, created on a day, cost about
+    ``cost`` (their cost rounded down to two significant figures), so the
+    dashboard can draw each category's cost spread without reading the item
+    table. Kept current by ``inventory.cube`` alongside ``InventoryCube``.
+    """
+
+    category = models.ForeignKey(ItemCategory, on_delete=models.CASCADE, related_name="+", db_index=False)
+    day = models.DateField()
+    cost = models.DecimalField(max_digits=15, decimal_places=2)
+    items = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["category", "day", "cost"], name="cost_cube_cell_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="cost_cube_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"InventoryCostCube({self.category_id}, {self.day}, {self.cost})"
+
+
+class ItemDelta(models.Model):
+    """
+    Last published state of every item that has been written, hard-deleted
+    ones included, stamped with the position of the transaction that wrote
+    it. Upserted in the writing transaction; reconnecting live screens replay
+    it from the version they last saw (see ``inventory.deltas``).
+    """
+
+    # Not a foreign key, so the row outlives an item that is deleted outright
+    item_id = models.BigIntegerField(primary_key=True)
+    category_id = models.BigIntegerField(null=True)
+    in_stock = models.IntegerField()
+    is_active = models.BooleanField()
+    position = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["position", "item_id"], name="item_delta_position_idx"),
+        ]
+
+    def __str__(self):
+        return f"ItemDelta({self.item_id} @ {self.position})"
+
+
+class OutboxEvent(models.Model):
+    """
+    Side effect (search indexing, alert email, webhook) recorded in the same
+    transaction as the write that caused it, and delivered later by
+    ``manage.py drain_outbox``.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Not delivered before this time; pushed back on every failed attempt
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["available_at", "id"],
+                condition=models.Q(status="pending"),
+                name="outbox_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic}<{self.pk}> ({self.status})"
+
+
+class ChannelMessage(models.Model):
+    """
+    Channel layer message too large for a NOTIFY payload. The notification
+    carries this row's id; rows are purged once ``expires_at`` has passed.
+    See ``inventory.channel_layer``.
+    """
+
+    payload = models.BinaryField()
+    expires_at = models.DateTimeField(db_index=True)
@@ -0,0 +1,124 @@
+"""
+Small OpenSearch REST client shared by the outbox handlers and ``reindex_items``.
+
+Connections are pooled per client through a ``requests.Session``; :func:`get_client`
+returns ``None`` when ``OPENSEARCH_URL`` is not configured.
+"""
+from __future__ import annotations
+
+import json
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+ITEM_MAPPING = {
+    "mappings": {
+        "properties": {
+            "sku": {"type": "keyword"},
+            "name": {"type": "text"},
+            "in_stock": {"type": "integer"},
+            "total_amount": {"type": "integer"},
+            "category": {"type": "keyword"},
+        }
+    }
+}
+
+# Columns read for each indexed document, in the order item_doc() expects
+ITEM_DOC_FIELDS = ("id", "sku", "name", "in_stock", "total_amount", "category__name")
+
+
+class OpenSearchError(Exception):
+    pass
+
+
+def item_doc(row) -> dict:
+    """Build the search document from a ``values_list(*ITEM_DOC_FIELDS)`` row."""
+    pk, sku, name, in_stock, total_amount, category = row
+    return {
+        "id": pk,
+        "sku": sku,
+        "name": name,
+        "in_stock": in_stock,
+        "total_amount": total_amount,
+        "category": category,
+    }
+
+
+class OpenSearch:
+    def __init__(self, base: str, auth=None, pool_size: int = 10, timeout: float = 10):
+        self.base = base.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.auth = auth
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, f"{self.base}/{path.lstrip('/')}", **kwargs)
+
+    def bulk(self, lines: list[str]) -> dict:
+        """Send NDJSON action/document lines to ``_bulk``; raise if any action failed."""
+        resp = self.request("POST", "_bulk", data="\n".join(lines) + "\n",
+                            headers={"Content-Type": "application/x-ndjson"})
+        resp.raise_for_status()
+        body = resp.json()
+        if body.get("errors"):
+            failed = next((i for i in body.get("items", []) if next(iter(i.values())).get("error")), {})
+            raise OpenSearchError(f"Bulk request partially rejected: {json.dumps(failed)[:500]}")
+        return body
+
+    def index_lines(self, index: str, docs) -> list[str]:
+        lines = []
+        for doc in docs:
+            lines.append(json.dumps({"index": {"_index": index, "_id": doc["id"]}}))
+            lines.append(json.dumps(doc))
+        return lines
+
+    def create_index(self, index: str, body: dict):
+        self.request("PUT", index, json=body).raise_for_status()
+
+    def put_settings(self, index: str, body: dict):
+        self.request("PUT", f"{index}/_settings", json=body).raise_for_status()
+
+    def refresh(self, index: str):
+        self.request("POST", f"{index}/_refresh").raise_for_status()
+
+    def alias_targets(self, alias: str) -> list[str]:
+        """Indices ``alias`` currently points at (empty if it is not an alias)."""
+        resp = self.request("GET", f"_alias/{alias}")
+        if resp.status_code == 404:
+            return []
+        resp.raise_for_status()
+        return sorted(resp.json())
+
+    def index_exists(self, index: str) -> bool:
+        return self.request("HEAD", index).status_code == 200
+
+    def swap_alias(self, alias: str, index: str):
+        """Atomically point ``alias`` at ``index`` only.
+
+        A concrete index squatting on the alias name (the pre-alias layout) is
+        dropped in the same request.
+        """
+        old = self.alias_targets(alias)
+        actions = [{"add": {"index": index, "alias": alias}}]
+        actions += [{"remove": {"index": name, "alias": alias}} for name in old if name != index]
+        if not old and self.index_exists(alias):
+            actions.append({"remove_index": {"index": alias}})
+        self.request("POST", "_aliases", json={"actions": actions}).raise_for_status()
+        return [name for name in old if name != index]
+
+
+def get_client(**kwargs) -> OpenSearch | None:
+    base = getattr(settings, "OPENSEARCH_URL", "")
+    if not base:
+        return None
+    auth = None
+    user = getattr(settings, "OPENSEARCH_USER", "")
+    password = getattr(settings, "OPENSEARCH_PASSWORD", "")
+    if user or password:
+        auth = (user, password)
+    return OpenSearch(base, auth, **kwargs)
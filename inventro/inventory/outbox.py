@@ -0,0 +1,91 @@
+"""
+Transactional outbox.
+
+Writes call :func:`enqueue` inside their transaction; ``manage.py drain_outbox``
+picks the rows up later and hands them to the handler registered for their
+topic. Events of the same topic are delivered together, so handlers always
+receive a list of payloads. A handler signals failure by raising: the whole
+group is retried with exponential backoff and marked failed once
+``max_attempts`` is reached. Delivered events are deleted.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Callable
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+LOGGER = logging.getLogger(__name__)
+
+BACKOFF_BASE_SECONDS = 2
+BACKOFF_MAX_SECONDS = 3600
+MAX_ATTEMPTS = 8
+
+_handlers: dict[str, Callable[[list[dict]], None]] = {}
+
+
+def handler(topic: str):
+    """Register ``func(payloads)`` as the delivery function for ``topic``."""
+    def register(func):
+        _handlers[topic] = func
+        return func
+    return register
+
+
+def enqueue(topic: str, payload: dict) -> OutboxEvent:
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def enqueue_many(topic: str, payloads: list[dict]) -> list[OutboxEvent]:
+    """One event per payload, written in a single INSERT."""
+    return OutboxEvent.objects.bulk_create(OutboxEvent(topic=topic, payload=payload) for payload in payloads)
+
+
+def backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def drain(batch_size: int = 100, max_attempts: int = MAX_ATTEMPTS) -> tuple[int, int, int]:
+    """Deliver one batch of due events. Returns ``(delivered, retried, failed)``."""
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked lets several workers drain the table side by side
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEvent.STATUS_PENDING, available_at__lte=now)
+            .order_by("available_at", "id")[:batch_size]
+        )
+        by_topic: dict[str, list[OutboxEvent]] = {}
+        for event in events:
+            by_topic.setdefault(event.topic, []).append(event)
+
+        delivered, retry = [], []
+        for topic, group in by_topic.items():
+            try:
+                func = _handlers.get(topic)
+                if func is None:
+                    raise LookupError(f"No outbox handler registered for '{topic}'")
+                func([event.payload for event in group])
+            except Exception as e:
+                LOGGER.warning("Outbox delivery of %d '%s' event(s) failed: %s", len(group), topic, e)
+                for event in group:
+                    event.attempts += 1
+                    event.last_error = f"{type(e).__name__}: {e}"
+                    if event.attempts >= max_attempts:
+                        event.status = OutboxEvent.STATUS_FAILED
+                    else:
+                        event.available_at = now + backoff(event.attempts)
+                retry.extend(group)
+            else:
+                delivered.extend(group)
+
+        if delivered:
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in delivered]).delete()
+        if retry:
+            OutboxEvent.objects.bulk_update(retry, ["attempts", "last_error", "status", "available_at"])
+    failed = sum(1 for event in retry if event.status == OutboxEvent.STATUS_FAILED)
+    return len(delivered), len(retry) - failed, failed
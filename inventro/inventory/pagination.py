@@ -0,0 +1,243 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are addressed by the sort key of the row at their edge instead of an
+offset, so fetching any page is one index range scan of ``per_page + 1`` rows
+no matter how deep it is. The total is optional: ``"exact"`` runs a
+``COUNT(*)``, ``"estimate"`` asks the PostgreSQL planner how many rows it
+expects (falling back to an exact count when that guess is small, or on other
+databases), and ``None`` skips it.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+COUNT_MODES = ("exact", "estimate")
+
+# Below this many estimated rows an exact count is cheap enough to run instead
+EXACT_COUNT_BELOW = 10_000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(position, reverse=False) -> str:
+    payload = json.dumps({"p": list(position), "r": reverse}, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int):
+    """``(position, reverse)`` from a cursor string; raises :class:`InvalidCursor`."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        position, reverse = data["p"], bool(data["r"])
+    except (binascii.Error, ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(cursor) from e
+    if not isinstance(position, list) or len(position) != size:
+        raise InvalidCursor(cursor)
+    return position, reverse
+
+
+def estimated_count(qs) -> tuple[int, bool]:
+    """``(rows, is_estimate)`` for ``qs``: the planner's estimate, or an exact count where that isn't worth it."""
+    connection = connections[qs.db]
+    if connection.vendor != "postgresql":
+        return qs.count(), False
+    sql, params = qs.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+    if estimate < EXACT_COUNT_BELOW:
+        return qs.count(), False
+    return estimate, True
+
+
+def _after(ordering, position, reverse):
+    """Q for rows strictly after ``position`` in ``ordering`` (before it when ``reverse``)."""
+    clauses = []
+    for i, field in enumerate(ordering):
+        equal = {name.lstrip("-"): value for name, value in zip(ordering[:i], position[:i])}
+        lookup = "lt" if reverse != field.startswith("-") else "gt"
+        clauses.append(models.Q(**equal, **{f"{field.lstrip('-')}__{lookup}": position[i]}))
+    return reduce(or_, clauses)
+
+
+def _flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _position(obj, ordering):
+    ordering = [field.lstrip("-") for field in ordering]
+    if isinstance(obj, dict):
+        # values() rows
+        return [obj[field] for field in ordering]
+    values = []
+    for field in ordering:
+        value = obj
+        for part in field.split("__"):
+            value = getattr(value, part)
+        values.append(value)
+    return values
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor, count=None, count_is_estimate=False):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.count_is_estimate = count_is_estimate
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginates ``queryset`` by ``ordering``, which must end in a unique field
+    so every row has a distinct position. ``-field`` sorts descending.
+    """
+
+    def __init__(self, queryset, per_page, ordering=("name", "id"), count=None):
+        if count not in (None, *COUNT_MODES):
+            raise ValueError(f"count must be one of {COUNT_MODES} or None")
+        self.queryset = queryset
+        self.per_page = max(1, int(per_page))
+        self.ordering = tuple(ordering)
+        self.count_mode = count
+
+    def count(self) -> tuple[int | None, bool]:
+        if self.count_mode == "exact":
+            return self.queryset.count(), False
+        if self.count_mode == "estimate":
+            return estimated_count(self.queryset)
+        return None, False
+
+    def page(self, cursor: str | None = None) -> KeysetPage:
+        position, reverse = decode_cursor(cursor, len(self.ordering)) if cursor else (None, False)
+
+        qs = self.queryset.order_by(*(_flip(f) if reverse else f for f in self.ordering))
+        if position is not None:
+            qs = qs.filter(_after(self.ordering, position, reverse))
+        rows = list(qs[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        first = _position(rows[0], self.ordering) if rows else position
+        last = _position(rows[-1], self.ordering) if rows else position
+        if reverse:
+            has_previous, has_next = more, position is not None
+        else:
+            has_previous, has_next = position is not None, more
+
+        count, is_estimate = self.count()
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(last) if has_next and last is not None else None,
+            previous_cursor=encode_cursor(first, reverse=True) if has_previous and first is not None else None,
+            count=count,
+            count_is_estimate=is_estimate,
+        )
+
+
+def count_mode(value, default=None):
+    """A count mode from a request parameter or setting: ``exact``, ``estimate`` or ``none``."""
+    if value not in (*COUNT_MODES, "none"):
+        value = default
+    return None if value in (None, "none") else value
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF pagination on top of :class:`KeysetPaginator`. Responses look like
+    ``{"next", "previous", "count", "count_is_estimate", "results"}``; the
+    ``count`` query parameter picks the count mode.
+    """
+
+    ordering = ("name", "id")
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+
+    def default_count(self):
+        return getattr(settings, "INVENTRO_PAGINATION_COUNT", "estimate")
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(
+            queryset,
+            self.get_page_size(request),
+            ordering=self.ordering,
+            count=count_mode(request.query_params.get(self.count_query_param), self.default_count()),
+        )
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound("Invalid cursor.")
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self._link(self.page.next_cursor),
+            "previous": self._link(self.page.previous_cursor),
+            "count": self.page.count,
+            "count_is_estimate": self.page.count_is_estimate,
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "count": {"type": "integer", "nullable": True},
+                "count_is_estimate": {"type": "boolean"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,31 @@
+"""
+JSON rendering with ujson.
+
+``UJSONRenderer`` is a drop-in for DRF's ``JSONRenderer`` (same media type,
+``indent`` and ``UNICODE_JSON`` handling) that encodes with ujson, several
+times faster on the large lists the item API returns. Values ujson has no
+native encoding for (datetimes, UUIDs, lazy strings) go through DRF's
+encoder, so output matches what ``JSONRenderer`` would produce for
+serializer data.
+"""
+from __future__ import annotations
+
+import ujson
+from rest_framework.renderers import JSONRenderer
+
+
+class UJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        ret = ujson.dumps(
+            data,
+            ensure_ascii=self.ensure_ascii,
+            escape_forward_slashes=False,
+            indent=indent or 0,
+            allow_nan=not self.strict,
+            default=self.encoder_class().default,
+        )
+        # Same JavaScript-safety escaping as JSONRenderer
+        return ret.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
@@ -0,0 +1,146 @@
+"""
+Stock reservations (holds) for carts.
+
+A cart line is a hold: putting ``n`` of an item in a cart reserves ``n`` of it
+until ``CartItem.expires_at``, and ``Item.reserved`` keeps the sum of the
+item's live holds, so ``Item.available`` (``in_stock - reserved``) is a column
+read however many carts there are. Stock is reserved with one conditional
+UPDATE (``in_stock - reserved >= n``), which is what stops two carts from
+taking the same units; no item lock is held while a cart is being edited.
+
+Any change to a cart pushes the expiry of all its lines out again, so a cart
+in use keeps its stock. :func:`expire` releases lapsed lines in batches and
+``manage.py expire_holds`` runs it in a loop; checkout turns a cart's holds
+into borrowed stock (see ``inventory.checkout``).
+
+Holds show in the item lists, so they need a new list ETag, but they leave
+the stats totals alone and don't go through the stats shards every other
+write locks. Each change bumps one of ``HOLD_SLOTS`` ``HoldCounter`` rows
+instead, picked by cart, and :func:`version` sums them.
+"""
+from __future__ import annotations
+
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import CartItem, HoldCounter, Item, hold_expiry
+
+HOLD_SLOTS = 16
+
+
+class ReservationError(Exception):
+    pass
+
+
+def _reserve(item_id: int, quantity: int) -> bool:
+    """Move ``quantity`` (negative to release) into the item's reserved count; False if too little is available."""
+    items = Item.objects.filter(pk=item_id)
+    if quantity > 0:
+        return bool(items.filter(is_active=True, in_stock__gte=models.F("reserved") + quantity)
+                    .update(reserved=models.F("reserved") + quantity))
+    if quantity < 0:
+        # Never below zero, even if the count has drifted; rebuild() puts it right
+        items.update(reserved=Greatest(models.F("reserved") + quantity, 0))
+    return True
+
+
+def _touch(key: int) -> None:
+    """Bump the hold counter for ``key`` (a cart id, say), creating its row if need be."""
+    table = connection.ops.quote_name(HoldCounter._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (slot, version, updated_at) VALUES (%s, 1, %s) "
+            f"ON CONFLICT (slot) DO UPDATE SET version = {table}.version + 1, updated_at = EXCLUDED.updated_at",
+            [key % HOLD_SLOTS, connection.ops.adapt_datetimefield_value(timezone.now())],
+        )
+
+
+def version() -> tuple[int, object]:
+    """``(version, updated_at)`` of the holds: a sum that every change raises, and when the last one was."""
+    counters = HoldCounter.objects.aggregate(version=models.Sum("version"), updated_at=models.Max("updated_at"))
+    return counters["version"] or 0, counters["updated_at"]
+
+
+def hold(cart, item_id: int, quantity: int, add: bool = False) -> CartItem | None:
+    """
+    Make ``cart`` hold ``quantity`` of the item (``add`` on top of what it
+    holds already); 0 removes the line. Raises :class:`ReservationError` if
+    the stock isn't there and ``Item.DoesNotExist`` for an unknown item.
+    """
+    with transaction.atomic():
+        lines = CartItem.objects.select_for_update()
+        if quantity > 0:
+            # (cart, item) is unique: of two first adds, one creates the line and the other waits and locks it
+            line, created = lines.get_or_create(cart=cart, item_id=item_id, defaults={"quantity": quantity})
+            held = 0 if created else line.quantity
+        else:
+            line, created = lines.filter(cart=cart, item_id=item_id).first(), False
+            held = line.quantity if line else 0
+        if add:
+            quantity += held
+        if quantity < 0:
+            raise ReservationError("Quantity cannot be negative.")
+        if not _reserve(item_id, quantity - held):
+            if not Item.objects.filter(pk=item_id, is_active=True).exists():
+                raise Item.DoesNotExist(item_id)
+            raise ReservationError("Not enough stock available.")
+
+        if quantity == 0:
+            if line:
+                line.delete()
+            line = None
+        elif not created and quantity != held:
+            line.quantity = quantity
+            line.save(update_fields=["quantity"])
+        # The cart is in use; keep all of it
+        cart.cart_items.update(expires_at=hold_expiry())
+        if quantity != held:
+            # Availability shows in the item lists
+            _touch(cart.pk)
+    return line
+
+
+def _release(lines) -> None:
+    """Give back the stock held by ``(item_id, quantity)`` pairs, one UPDATE for all items."""
+    totals: dict[int, int] = {}
+    for item_id, quantity in lines:
+        totals[item_id] = totals.get(item_id, 0) + quantity
+    if not totals:
+        return
+    held = models.Case(*(models.When(pk=pk, then=models.Value(total)) for pk, total in totals.items()),
+                       output_field=models.IntegerField())
+    Item.objects.filter(pk__in=totals).update(reserved=Greatest(models.F("reserved") - held, 0))
+
+
+def expire(batch_size: int = 500, now=None) -> int:
+    """Release one batch of lapsed holds, oldest first. Returns how many cart lines were removed."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        lines = CartItem.objects.filter(expires_at__lte=now).order_by("expires_at", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            # Several sweepers can run side by side, and carts being edited are left alone
+            lines = lines.select_for_update(skip_locked=True)
+        lines = list(lines.values_list("pk", "item_id", "quantity")[:batch_size])
+        if not lines:
+            return 0
+        CartItem.objects.filter(pk__in=[pk for pk, _, _ in lines]).delete()
+        _release((item_id, quantity) for _, item_id, quantity in lines)
+        _touch(lines[0][0])
+    return len(lines)
+
+
+def rebuild() -> int:
+    """Recompute every ``Item.reserved`` from the cart lines; returns how many items were off."""
+    held = Coalesce(
+        models.Subquery(
+            CartItem.objects.filter(item=models.OuterRef("pk"))
+            .values("item").annotate(total=models.Sum("quantity")).values("total")
+        ),
+        0,
+    )
+    items = Item.objects.annotate(held=held).exclude(reserved=models.F("held"))
+    fixed = items.update(reserved=held)
+    if fixed:
+        _touch(0)
+    return fixed
@@ -0,0 +1,106 @@
+"""
+Item search backends.
+
+``get_search_backend()`` returns the backend named by the
+``INVENTRO_SEARCH_BACKEND`` setting (a dotted path), or picks one from the
+database vendor: PostgreSQL gets :class:`PostgresSearchBackend`, which is
+served by the GIN indexes created in migration 0012; anything else falls
+back to the plain ``icontains`` search the item list has always used.
+
+Backends provide ``filter(qs, q)``, which narrows a queryset and leaves its
+ordering alone, and ``rank(qs, q)``, which also orders by relevance.
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection, models
+from django.utils.module_loading import import_string
+
+
+class SearchBackend:
+    def filter(self, qs, q: str):
+        raise NotImplementedError
+
+    def rank(self, qs, q: str):
+        raise NotImplementedError
+
+
+class SimpleSearchBackend(SearchBackend):
+    """Substring match on name or SKU. Needs no database support but scans the table."""
+
+    def filter(self, qs, q):
+        return qs.filter(models.Q(name__icontains=q) | models.Q(sku__icontains=q))
+
+    def rank(self, qs, q):
+        relevance = models.Case(
+            models.When(sku__iexact=q, then=models.Value(3)),
+            models.When(sku__istartswith=q, then=models.Value(2)),
+            models.When(name__istartswith=q, then=models.Value(1)),
+            default=models.Value(0),
+            output_field=models.IntegerField(),
+        )
+        return self.filter(qs, q).alias(relevance=relevance).order_by("-relevance", "name", "id")
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Full-text word-prefix match on name and SKU, substring match on name and
+    prefix match on SKU, combined with OR so the planner can answer each
+    part from its own index (tsvector GIN, trigram GIN on UPPER(name),
+    pattern btree on UPPER(sku)). Ranking mixes ts_rank with trigram
+    similarity and boosts SKU hits.
+    """
+
+    CONFIG = "simple"
+
+    def vector(self):
+        # Must stay identical to the indexed expression in migration 0012
+        return SearchVector("name", "sku", config=self.CONFIG)
+
+    def query(self, q):
+        terms = re.findall(r"\w+", q)
+        if not terms:
+            return None
+        return SearchQuery(" & ".join(f"{term}:*" for term in terms), search_type="raw", config=self.CONFIG)
+
+    def _matching(self, qs, q):
+        condition = models.Q(name__icontains=q) | models.Q(sku__istartswith=q)
+        query = self.query(q)
+        if query is not None:
+            qs = qs.alias(search_document=self.vector())
+            condition |= models.Q(search_document=query)
+        return qs.filter(condition), query
+
+    def filter(self, qs, q):
+        return self._matching(qs, q)[0]
+
+    def rank(self, qs, q):
+        qs, query = self._matching(qs, q)
+        relevance = TrigramSimilarity("name", q) + models.Case(
+            models.When(sku__iexact=q, then=models.Value(2.0)),
+            models.When(sku__istartswith=q, then=models.Value(1.0)),
+            default=models.Value(0.0),
+            output_field=models.FloatField(),
+        )
+        if query is not None:
+            relevance = relevance + SearchRank(self.vector(), query)
+        return qs.alias(relevance=relevance).order_by("-relevance", "name", "id")
+
+
+@lru_cache(maxsize=None)
+def _load(path: str) -> SearchBackend:
+    return import_string(path)()
+
+
+def get_search_backend() -> SearchBackend:
+    path = getattr(settings, "INVENTRO_SEARCH_BACKEND", "")
+    if not path:
+        if connection.vendor == "postgresql":
+            path = "inventory.search.PostgresSearchBackend"
+        else:
+            path = "inventory.search.SimpleSearchBackend"
+    return _load(path)
@@ -21,11 +21,82 @@ class ItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = Item
         fields = [
-            'id', 'sku', 'name', 'in_stock', 'low_stock_bar', 'total_amount', 
+            'id', 'sku', 'name', 'in_stock', 'reserved', 'low_stock_bar', 'total_amount', 
             'category', 'category_id', 'location', 'cost', 
             'description', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        # reserved moves only through cart holds
+        read_only_fields = ['reserved', 'created_at', 'updated_at']
+
+    def validate_in_stock(self, value):
+        # Stock held in carts can't be written away; the holds have to be released first
+        if self.instance is not None and value < self.instance.reserved:
+            raise serializers.ValidationError(
+                f"{self.instance.reserved} unit(s) are held in carts; in_stock cannot go below that."
+            )
+        return value
+
+
+class ItemRowSerializer:
+    """
+    Read-only twin of :class:`ItemSerializer` for list endpoints.
+
+    ``values(queryset)`` selects just the listed columns (category joined in
+    the same query) as plain dicts, and ``to_representation`` turns those rows
+    into exactly what ``ItemSerializer(many=True).data`` would, reusing DRF's
+    fields only for the decimal and datetime formatting. No model
+    instances are built and no per-field machinery runs for the plain columns.
+    """
+
+    columns = ['id', 'sku', 'name', 'in_stock', 'reserved', 'low_stock_bar', 'total_amount', 'category_id',
+               'category__name', 'location', 'cost', 'description', 'created_at', 'updated_at']
+
+    def __init__(self):
+        self.decimal = ItemSerializer().fields['cost'].to_representation
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def to_representation(self, rows):
+        decimal = self.decimal
+        # Look the active timezone up once, not per value as a plain DateTimeField does
+        field = serializers.DateTimeField()
+        datetime = serializers.DateTimeField(default_timezone=field.default_timezone()).to_representation
+        return [
+            {
+                'id': row['id'],
+                'sku': row['sku'],
+                'name': row['name'],
+                'in_stock': row['in_stock'],
+                'reserved': row['reserved'],
+                'low_stock_bar': row['low_stock_bar'],
+                'total_amount': row['total_amount'],
+                'category': (None if row['category_id'] is None
+                             else {'id': row['category_id'], 'name': row['category__name']}),
+                'location': row['location'],
+                'cost': decimal(row['cost']),
+                'description': row['description'],
+                'created_at': datetime(row['created_at']),
+                'updated_at': datetime(row['updated_at']),
+            }
+            for row in rows
+        ]
+
+
+class CategoryIdField(serializers.IntegerField):
+    """``category_id`` resolved from ``context["categories"]`` (id -> category) instead of one query per row."""
+
+    def to_internal_value(self, data):
+        pk = super().to_internal_value(data)
+        category = self.context["categories"].get(pk)
+        if category is None:
+            raise serializers.ValidationError(f'Invalid pk "{pk}" - object does not exist.')
+        return category
+
+
+class BulkItemSerializer(ItemSerializer):
+    """One row of a bulk request; see ``inventory.bulk``."""
+    category_id = CategoryIdField(source='category', write_only=True, required=False)
         
         
         
@@ -1,21 +1,19 @@
 from __future__ import annotations
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-
-from inventory.models import Item
-
+from dataclasses import dataclass, field
+from functools import partial
 
 from django.conf import settings
 from django.core.mail import send_mail
 from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from .models import Item
-import logging, os, json
+from django.db import transaction
+from django.dispatch import Signal, receiver
+from .models import Item, ItemCategory
+from . import alerts, cube, deltas, ledger, opensearch, outbox, stats
+import json
+import logging
 
-import requests  # used for optional serverless/webhook + OpenSearch REST
+import requests  # used for the optional serverless webhook
 
 LOGGER = logging.getLogger(__name__)
 
@@ -29,130 +27,171 @@ OPENSEARCH_INDEX = getattr(settings, "OPENSEARCH_INDEX", "items")
 NOTIFY_LOW_STOCK_WEBHOOK = getattr(settings, "NOTIFY_LOW_STOCK_WEBHOOK", "")  # optional serverless endpoint
 
 
+@dataclass
+class ItemChange:
+    """An item that was written, with the previous values of the fields that changed."""
+    item: Item
+    previous: dict = field(default_factory=dict)
+    created: bool = False
 
-def _build_payload(item: Item) -> dict:
-    return {
-        "id": item.pk,
-        "name": item.name,
-        "sku": getattr(item, "sku", None) or getattr(item, "SKU", ""),
-        "in_stock": item.in_stock,
-        "min_qty": item.total_amount,
-        "category": getattr(item.category, "name", ""),
-    }
-
-
-@receiver(post_save, sender=Item)
-def notify_low_stock(sender, instance: Item, **kwargs):
-    if instance is None:
-        return
-    try:
-        current = int(instance.in_stock)
-        minimum = int(instance.total_amount)
-    except (TypeError, ValueError):
-        return
-
-    if current >= minimum:
-        return
 
-    channel_layer = get_channel_layer()
-    if channel_layer is None:
-        return
+# Sent once per bulk write (checkout, imports, ...) instead of one post_save per row.
+# Receivers get ``changes``: a list of ItemChange, and optionally the ``actor`` and
+# ledger ``reason`` when the items' own updated_by and the change don't tell.
+items_changed = Signal()
 
-    async_to_sync(channel_layer.group_send)(
-        "low_stock",
-        {"type": "low_stock_alert", "item": _build_payload(instance)},
-    )
 
 def _alert_recipients() -> list[str]:
-    if settings.ALERT_EMAILS:
-        return [e.strip() for e in settings.ALERT_EMAILS.split(",") if e.strip()]
+    alert_emails = getattr(settings, "ALERT_EMAILS", "")
+    if alert_emails:
+        return [e.strip() for e in alert_emails.split(",") if e.strip()]
     User = get_user_model()
     return list(User.objects.filter(is_superuser=True, email__isnull=False)
                 .exclude(email="").values_list("email", flat=True))
 
-def _send_low_stock_email(item: Item):
+def _low_stock_snapshot(item: Item) -> dict:
+    return {"sku": item.sku, "name": item.name, "in_stock": item.in_stock}
+
+_search_client = None
+
+def _search():
+    # One pooled client per worker process
+    global _search_client
+    if _search_client is None:
+        _search_client = opensearch.get_client()
+    return _search_client
+
+def _enqueue_index(item_ids):
+    if OPENSEARCH_URL and item_ids:
+        outbox.enqueue("search.index", {"ids": sorted(set(item_ids))})
+
+def _enqueue_low_stock(items: list[Item]):
+    snapshots = [_low_stock_snapshot(item) for item in items]
+    outbox.enqueue_many("low_stock.email", snapshots)
+    if NOTIFY_LOW_STOCK_WEBHOOK:
+        outbox.enqueue_many("low_stock.webhook", snapshots)
+
+# --- Outbox delivery (runs in `manage.py drain_outbox`, never in a request) ---
+
+@outbox.handler("search.index")
+def deliver_search_index(payloads: list[dict]):
+    client = _search()
+    ids = {pk for payload in payloads for pk in payload["ids"]}
+    if not client or not ids:
+        return
+    rows = Item.objects.filter(pk__in=ids).values_list(*opensearch.ITEM_DOC_FIELDS)
+    lines = client.index_lines(OPENSEARCH_INDEX, map(opensearch.item_doc, rows))
+    if lines:
+        client.bulk(lines)
+
+@outbox.handler("search.delete")
+def deliver_search_delete(payloads: list[dict]):
+    client = _search()
+    ids = {pk for payload in payloads for pk in payload["ids"]}
+    if client and ids:
+        client.bulk([json.dumps({"delete": {"_index": OPENSEARCH_INDEX, "_id": pk}}) for pk in sorted(ids)])
+
+@outbox.handler("low_stock.email")
+def deliver_low_stock_email(payloads: list[dict]):
+    # One message for the whole group: a failed send leaves nothing delivered, so the retry can't repeat any
     recipients = _alert_recipients()
     if not recipients:
         return
-    subject = f"[Inventro] Low stock: {item.name} (SKU {item.SKU})"
-    body = f"""Item has low stock.
-
-Name: {item.name}
-SKU: {item.SKU}
-In stock: {item.in_stock}
-Threshold: {LOW_STOCK_THRESHOLD}
-"""
-    try:
-        send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, recipients, fail_silently=True)
-    except Exception as e:
-        LOGGER.warning("Email send failed: %s", e)
-
-def _call_serverless(item: Item):
+    if len(payloads) == 1:
+        subject = f"[Inventro] Low stock: {payloads[0]['name']} (SKU {payloads[0]['sku']})"
+    else:
+        subject = f"[Inventro] Low stock: {len(payloads)} items"
+    lines = ["Item has low stock." if len(payloads) == 1 else "These items have low stock."]
+    for item in payloads:
+        lines += ["", f"Name: {item['name']}", f"SKU: {item['sku']}", f"In stock: {item['in_stock']}"]
+    lines += ["", f"Threshold: {LOW_STOCK_THRESHOLD}", ""]
+    send_mail(subject, "\n".join(lines), settings.DEFAULT_FROM_EMAIL, recipients)
+
+@outbox.handler("low_stock.webhook")
+def deliver_low_stock_webhook(payloads: list[dict]):
     if not NOTIFY_LOW_STOCK_WEBHOOK:
         return
-    try:
-        requests.post(NOTIFY_LOW_STOCK_WEBHOOK, json={
-            "sku": item.SKU,
-            "name": item.name,
-            "in_stock": item.in_stock
-        }, timeout=3)
-    except Exception as e:
-        LOGGER.warning("Serverless notify failed: %s", e)
-
-def _os_auth():
-    if not OPENSEARCH_URL:
-        return None
-    auth = None
-    if OPENSEARCH_USER or OPENSEARCH_PASSWORD:
-        auth = (OPENSEARCH_USER, OPENSEARCH_PASSWORD)
-    return {"base": OPENSEARCH_URL.rstrip("/"), "auth": auth}
-
-def _os_index_item(item: Item):
-    osconf = _os_auth()
-    if not osconf:
-        return
-    doc = {
-        "id": item.id,
-        "sku": item.SKU,
-        "name": item.name,
-        "in_stock": item.in_stock,
-        "total_amount": item.total_amount,
-        "category": item.category.name if item.category_id else None,
-    }
-    try:
-        url = f"{osconf['base']}/{OPENSEARCH_INDEX}/_doc/{item.id}"
-        requests.put(url, json=doc, auth=osconf["auth"], timeout=3)
-    except Exception as e:
-        LOGGER.warning("OpenSearch index failed: %s", e)
-
-def _os_delete_item(item_id: int):
-    osconf = _os_auth()
-    if not osconf:
-        return
-    try:
-        url = f"{osconf['base']}/{OPENSEARCH_INDEX}/_doc/{item_id}"
-        requests.delete(url, auth=osconf["auth"], timeout=3)
-    except Exception as e:
-        LOGGER.warning("OpenSearch delete failed: %s", e)
+    for item in payloads:
+        requests.post(NOTIFY_LOW_STOCK_WEBHOOK, json=item, timeout=3).raise_for_status()
+
+# --- Receivers: record side effects in the writing transaction ---
+
+def _instance_change(instance: Item, created: bool) -> ItemChange:
+    """Describe a single save using the values the instance was loaded with."""
+    if created:
+        return ItemChange(instance, created=True)
+    return ItemChange(instance, {name: instance.previous_value(name) for name in instance.changed_fields})
+
+def _crossed_low_stock(change: ItemChange) -> bool:
+    current = change.item.in_stock
+    if change.created:
+        return current <= LOW_STOCK_THRESHOLD
+    prev = change.previous.get("in_stock")
+    return prev is not None and prev > LOW_STOCK_THRESHOLD and current <= LOW_STOCK_THRESHOLD
+
+def _entered_low_stock(change: ItemChange) -> bool:
+    """True when the item just went below ``total_amount`` (the dashboard's notion of low)."""
+    item = change.item
+    if item.in_stock >= item.total_amount:
+        return False
+    if change.created:
+        return True
+    before_stock = change.previous.get("in_stock", item.in_stock)
+    before_total = change.previous.get("total_amount", item.total_amount)
+    if before_stock is None or before_total is None:
+        # Unknown starting point; the alert window absorbs a repeat
+        return True
+    return before_stock >= before_total
+
+def enqueue_side_effects(changes: list[ItemChange]):
+    """Search indexing, low-stock alerts and live deltas for ``changes``; the importer calls it directly."""
+    _enqueue_index([change.item.pk for change in changes])
+    # Low-stock alert only when the threshold is crossed
+    crossed = [change.item for change in changes if _crossed_low_stock(change)]
+    if crossed:
+        _enqueue_low_stock(crossed)
+    entered = [change.item.pk for change in changes if _entered_low_stock(change)]
+    if entered:
+        # Coalesced and sent from a background thread, after commit
+        transaction.on_commit(partial(alerts.submit, entered), robust=True)
+    rows = [deltas.item_delta(change.item) for change in changes]
+    deltas.record(rows)
+    transaction.on_commit(partial(deltas.submit, rows), robust=True)
 
 @receiver(post_save, sender=Item)
 def on_item_save(sender, instance: Item, created: bool, **kwargs):
-    # OpenSearch upsert
-    _os_index_item(instance)
-
-    # Low-stock alert only when at/below threshold
-    try:
-        prev = None
-        if not created and instance.pk:
-            prev = Item.objects.filter(pk=instance.pk).values_list("in_stock", flat=True).first()
-        crossed = (created and instance.in_stock <= LOW_STOCK_THRESHOLD) or \
-                  (prev is not None and prev > LOW_STOCK_THRESHOLD and instance.in_stock <= LOW_STOCK_THRESHOLD)
-        if crossed:
-            _send_low_stock_email(instance)
-            _call_serverless(instance)
-    except Exception as e:
-        LOGGER.warning("low-stock check failed: %s", e)
+    changes = [_instance_change(instance, created)]
+    stats.record_changes(changes)
+    cube.record_changes(changes)
+    ledger.record(changes)
+    enqueue_side_effects(changes)
 
 @receiver(post_delete, sender=Item)
 def on_item_delete(sender, instance: Item, **kwargs):
-    _os_delete_item(instance.id)
+    stats.record_removal(instance)
+    cube.record_removal(instance)
+    gone = deltas.delta(instance.pk, instance.category_id, instance.in_stock, False)
+    deltas.record([gone])
+    transaction.on_commit(partial(deltas.submit, [gone]), robust=True)
+    if OPENSEARCH_URL:
+        outbox.enqueue("search.delete", {"ids": [instance.id]})
+
+@receiver(items_changed)
+def on_items_changed(sender, changes: list[ItemChange], actor=None, reason=None, **kwargs):
+    """Batched counterpart of the post_save receivers above."""
+    stats.record_changes(changes)
+    cube.record_changes(changes)
+    ledger.record(changes, actor, reason)
+    enqueue_side_effects(changes)
+
+@receiver(post_save, sender=ItemCategory)
+def on_category_save(sender, instance: ItemCategory, created: bool, **kwargs):
+    if created:
+        stats.apply({"categories": 1})
+    else:
+        # A rename shows up in every item of the category
+        stats.bump()
+
+@receiver(post_delete, sender=ItemCategory)
+def on_category_delete(sender, instance: ItemCategory, **kwargs):
+    stats.apply({"categories": -1})
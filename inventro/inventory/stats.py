@@ -0,0 +1,175 @@
+"""
+Dashboard stats rollup.
+
+``InventoryStats`` holds the totals the dashboard shows. Every Item write adds
+the difference between the item's contribution before and after the write, in
+the same transaction. The totals are spread over ``STATS_SHARDS`` rows so
+writers don't all queue on one row lock: each thread keeps to one shard, so a
+transaction only ever locks one, and :func:`get` sums them in one query.
+The same UPDATE bumps the shard's ``version``; the sum, which HTTP validators
+are built from (see ``inventory.conditional``), goes up with every write.
+:func:`compute` derives the same numbers from scratch and is what
+``manage.py rebuild_stats`` compares against.
+"""
+from __future__ import annotations
+
+import random
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import InventoryStats, Item, ItemCategory
+
+FIELDS = ("total_items", "low_stock", "out_of_stock", "total_quantity", "inventory_value", "total_cost")
+
+CENT = Decimal("0.01")
+
+STATS_SHARDS = 16
+
+_local = threading.local()
+
+
+def _shard() -> int:
+    """This thread's shard (a row pk), picked once so its transactions never lock two."""
+    if not hasattr(_local, "shard"):
+        _local.shard = random.randrange(STATS_SHARDS) + 1
+    return _local.shard
+
+
+def contribution(values: dict) -> dict:
+    """What one item with these field values adds to each total."""
+    if not values.get("is_active"):
+        return dict.fromkeys(FIELDS, 0)
+    in_stock = values.get("in_stock") or 0
+    cost = Decimal(values.get("cost") or 0)
+    return {
+        "total_items": 1,
+        "low_stock": int(0 < in_stock <= (values.get("low_stock_bar") or 0)),
+        "out_of_stock": int(in_stock <= 0),
+        "total_quantity": in_stock,
+        "inventory_value": in_stock * cost,
+        "total_cost": cost,
+    }
+
+
+def _values(item: Item) -> dict:
+    return {
+        "is_active": item.is_active,
+        "in_stock": item.in_stock,
+        "low_stock_bar": item.low_stock_bar,
+        "cost": item.cost,
+    }
+
+
+def change_delta(changes) -> dict:
+    """Sum of after-minus-before contributions for a list of ``ItemChange``."""
+    delta = dict.fromkeys(FIELDS, 0)
+    for change in changes:
+        after = _values(change.item)
+        after_part = contribution(after)
+        before_part = contribution({} if change.created else {**after, **change.previous})
+        for field in FIELDS:
+            delta[field] += after_part[field] - before_part[field]
+    return delta
+
+
+def apply(delta: dict):
+    """Add ``delta`` to this thread's shard and bump its version with a single UPDATE."""
+    updates = {field: models.F(field) + value for field, value in delta.items() if value}
+    updates["version"] = models.F("version") + 1
+    updates["updated_at"] = timezone.now()
+    if not InventoryStats.objects.filter(pk=_shard()).update(**updates):
+        # No shard rows yet (fresh database): the rebuild already includes this write
+        rebuild()
+
+
+def bump():
+    """New version for a write that doesn't move any total (a rename, say)."""
+    apply({})
+
+
+def record_changes(changes):
+    apply(change_delta(changes))
+
+
+def record_removal(item: Item):
+    apply({field: -value for field, value in contribution(_values(item)).items()})
+
+
+def aggregates() -> dict:
+    """The totals as aggregate expressions over active items (also grouped, by ``inventory.cube``)."""
+    value = models.ExpressionWrapper(
+        models.F("in_stock") * models.F("cost"),
+        output_field=models.DecimalField(max_digits=20, decimal_places=2),
+    )
+    zero = models.Value(Decimal(0), output_field=models.DecimalField(max_digits=20, decimal_places=2))
+    return {
+        "total_items": models.Count("id"),
+        "low_stock": models.Count("id", filter=models.Q(in_stock__gt=0, in_stock__lte=models.F("low_stock_bar"))),
+        "out_of_stock": models.Count("id", filter=models.Q(in_stock__lte=0)),
+        "total_quantity": Coalesce(models.Sum("in_stock"), 0),
+        "inventory_value": Coalesce(models.Sum(value), zero),
+        "total_cost": Coalesce(models.Sum("cost"), zero),
+    }
+
+
+def compute() -> dict:
+    """The totals, computed from the item table in one aggregate query."""
+    totals = Item.objects.filter(is_active=True).aggregate(**aggregates())
+    totals["categories"] = ItemCategory.objects.count()
+    for field in ("inventory_value", "total_cost"):
+        totals[field] = Decimal(totals[field]).quantize(CENT)
+    return totals
+
+
+def rebuild() -> InventoryStats:
+    """Store freshly computed totals in the first shard and zero the others; their versions only go up."""
+    with transaction.atomic():
+        shards = {row.pk: row for row in InventoryStats.objects.select_for_update().order_by("pk")}
+        InventoryStats.objects.bulk_create(
+            [InventoryStats(pk=pk) for pk in range(1, STATS_SHARDS + 1) if pk not in shards],
+            ignore_conflicts=True,
+        )
+        totals = compute()
+        now = timezone.now()
+        # Rebuilds follow writes that bypassed the signals (imports, generated data), so they are a new version too
+        InventoryStats.objects.filter(pk=1).update(**totals, version=models.F("version") + 1, updated_at=now)
+        InventoryStats.objects.exclude(pk=1).update(**dict.fromkeys(totals, 0), updated_at=now)
+    return get()
+
+
+def drift(stats: InventoryStats, expected: dict) -> dict:
+    """Fields whose stored value differs from ``expected``, as ``{field: (stored, expected)}``."""
+    out = {}
+    for field, value in expected.items():
+        stored = getattr(stats, field)
+        if isinstance(value, Decimal):
+            stored = Decimal(stored).quantize(CENT)
+        if stored != value:
+            out[field] = (stored, value)
+    return out
+
+
+def current() -> InventoryStats | None:
+    """The shards summed into one unsaved ``InventoryStats``; None before the first rebuild."""
+    sums = InventoryStats.objects.aggregate(
+        **{field: models.Sum(field) for field in (*FIELDS, "categories", "version")},
+        updated_at=models.Max("updated_at"),
+    )
+    if sums["version"] is None:
+        return None
+    return InventoryStats(**sums)
+
+
+def get() -> InventoryStats:
+    return current() or rebuild()
+
+
+def new_items_since(days: int = 7) -> int:
+    # A sliding window can't be kept as a running total; this is an indexed count on created_at
+    since = timezone.now() - timedelta(days=days)
+    return Item.objects.filter(is_active=True, created_at__gte=since).count()
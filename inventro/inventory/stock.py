@@ -0,0 +1,131 @@
+"""
+Conditional stock mutations.
+
+``Item.objects.adjust_stock()`` applies signed deltas to ``Item.in_stock``
+without reading or locking the rows first. A batch is one
+``UPDATE ... SET in_stock = in_stock + delta ... WHERE <enough stock>
+RETURNING id``, so the check and the write are the same statement and two
+writers can never both spend the same units. Taking stock only succeeds if
+what is left still covers the item's live cart holds (less the units the
+line ``release``s); adding stock always succeeds. Every applied line bumps
+``Item.version``, so a caller that has read an item can make its write
+conditional on nobody having changed the stock since (``expected_version``),
+and the ``item_in_stock_nonnegative`` constraint backs the check in the
+database.
+
+Every line gets a :class:`StockResult`. Lines that fail leave their item
+alone and the others are applied, unless ``all_or_nothing`` is set, in
+which case any failure rolls the batch back and raises :class:`StockError`.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Item, StockMovement
+from .signals import ItemChange, items_changed
+
+INSUFFICIENT = "insufficient"
+CONFLICT = "conflict"
+MISSING = "missing"
+
+
+@dataclass(frozen=True)
+class StockChange:
+    """Add ``delta`` (negative to take) to an item's stock and drop ``release`` units from its holds."""
+    item_id: int
+    delta: int
+    release: int = 0
+    # Only apply if Item.version still has this value
+    expected_version: int | None = None
+
+
+@dataclass
+class StockResult:
+    change: StockChange
+    ok: bool
+    # The item after the change, or as it was found when the line failed; None if there is no such item
+    item: Item | None = None
+    # INSUFFICIENT, CONFLICT or MISSING when not ok
+    reason: str = ""
+
+
+class StockError(Exception):
+    """Raised by an ``all_or_nothing`` batch with a line that failed. Nothing has been written."""
+
+    def __init__(self, results: list[StockResult]):
+        super().__init__([result.reason for result in results if not result.ok])
+        self.results = results
+
+
+def _update_sql(lines: int) -> str:
+    table = connection.ops.quote_name(Item._meta.db_table)
+    row = "(CAST(%s AS bigint), CAST(%s AS integer), CAST(%s AS integer), CAST(%s AS bigint))"
+    held = f"CASE WHEN {table}.reserved > batch.release THEN {table}.reserved - batch.release ELSE 0 END"
+    # UPDATE ... FROM and RETURNING work the same on PostgreSQL and SQLite (3.35+)
+    return (
+        f"WITH batch (item_id, delta, release, expected) AS (VALUES {', '.join([row] * lines)}) "
+        f"UPDATE {table} SET in_stock = {table}.in_stock + batch.delta, reserved = {held}, "
+        f"version = {table}.version + 1, updated_at = %s "
+        f"FROM batch WHERE {table}.id = batch.item_id "
+        f"AND (batch.expected IS NULL OR {table}.version = batch.expected) "
+        f"AND (batch.delta >= 0 OR {table}.in_stock + batch.delta >= {held}) "
+        f"RETURNING {table}.id"
+    )
+
+
+def adjust(changes, all_or_nothing: bool = False, actor=None, reason: str = StockMovement.REASON_ADJUST
+           ) -> list[StockResult]:
+    """
+    Apply ``changes`` (StockChange, at most one per item); returns one
+    StockResult per change, in order. ``actor`` and ``reason`` go on the
+    ledger lines.
+    """
+    changes = [change if isinstance(change, StockChange) else StockChange(*change) for change in changes]
+    if len({change.item_id for change in changes}) != len(changes):
+        raise ValueError("An item appears more than once in the batch.")
+    if any(change.release < 0 for change in changes):
+        raise ValueError("release cannot be negative.")
+    if not changes:
+        return []
+
+    ordered = sorted(changes, key=lambda change: change.item_id)
+    params = [value for change in ordered
+              for value in (change.item_id, change.delta, change.release, change.expected_version)]
+    params.append(connection.ops.adapt_datetimefield_value(timezone.now()))
+
+    # Only a batch that may have to undo its own UPDATE needs a savepoint
+    with transaction.atomic(savepoint=all_or_nothing):
+        if len(ordered) > 1 and connection.features.has_select_for_update:
+            # The UPDATE locks rows in whatever order the planner reads the table in; take the locks in
+            # primary-key order first, so two overlapping batches queue up instead of deadlocking
+            list(Item.objects.select_for_update().filter(pk__in=[change.item_id for change in ordered])
+                 .order_by("pk").values_list("pk", flat=True))
+        with connection.cursor() as cursor:
+            cursor.execute(_update_sql(len(ordered)), params)
+            applied = {row[0] for row in cursor.fetchall()}
+        # Rows this batch changed stay locked until commit, so these are the values it wrote
+        items = Item.objects.in_bulk([change.item_id for change in changes])
+
+        results = []
+        for change in changes:
+            item = items.get(change.item_id)
+            if change.item_id in applied:
+                results.append(StockResult(change, True, item))
+            elif item is None:
+                results.append(StockResult(change, False, None, MISSING))
+            elif change.expected_version is not None and item.version != change.expected_version:
+                results.append(StockResult(change, False, item, CONFLICT))
+            else:
+                results.append(StockResult(change, False, item, INSUFFICIENT))
+
+        if all_or_nothing and not all(result.ok for result in results):
+            raise StockError(results)
+        changed = [ItemChange(result.item, {"in_stock": result.item.in_stock - result.change.delta})
+                   for result in results if result.ok and result.change.delta]
+        if changed:
+            # A raw UPDATE skips post_save; announce the batch like the other bulk writes
+            items_changed.send(sender=Item, changes=changed, actor=actor, reason=reason)
+    return results
@@ -0,0 +1,1632 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from django.utils import timezone
+
+from dashboard.metrics import active_items
+
+from . import alerts, cube, datagen, deltas, export, ledger, loadtest, outbox, reservations, signals, stats
+from .channel_layer import PostgresChannelLayer
+from .checkout import CheckoutError, checkout_cart
+from .importer import RowError, read_chunks
+from .pagination import KeysetPaginator
+from .renderers import UJSONRenderer
+from .search import get_search_backend
+from .serializers import ItemRowSerializer, ItemSerializer
+from .stock import CONFLICT, INSUFFICIENT, MISSING, StockChange, StockError
+from .views import filter_items
+from .models import (
+    Cart, CartItem, InventoryCostCube, InventoryCube, InventoryItem, InventoryStats, Item, ItemCategory, OutboxEvent,
+    StockMovement, StockSnapshot,
+)
+
+
+def make_items(count, category=None, **fields):
+    category = category or ItemCategory.objects.get_or_create(name="Audio")[0]
+    defaults = {"in_stock": 20, "low_stock_bar": 5, "total_amount": 20, "cost": 10}
+    defaults.update(fields)
+    return Item.objects.bulk_create(
+        Item(name=f"Item {i:05d}", sku=f"SKU-{i:05d}", location="Shelf A", category=category, **defaults)
+        for i in range(count)
+    )
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("staff", password="pw")
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill_cart(self, items, quantity=2):
+        CartItem.objects.bulk_create(CartItem(cart=self.cart, item=item, quantity=quantity) for item in items)
+
+    def test_checkout_moves_cart_into_inventory(self):
+        first, second = make_items(2)
+        InventoryItem.objects.create(borrower=self.user, item=first, quantity=1)
+        self.fill_cart([first, second], quantity=3)
+
+        checkout_cart(self.user, self.cart)
+
+        self.assertEqual(
+            dict(InventoryItem.objects.filter(borrower=self.user).values_list("item_id", "quantity")),
+            {first.pk: 4, second.pk: 3},
+        )
+        self.assertEqual(list(Item.objects.order_by("pk").values_list("in_stock", flat=True)), [17, 17])
+        self.assertFalse(self.cart.cart_items.exists())
+
+    def test_short_line_aborts_whole_checkout(self):
+        plenty, scarce = make_items(2)
+        Item.objects.filter(pk=scarce.pk).update(in_stock=1)
+        self.fill_cart([plenty, scarce])
+
+        with self.assertRaises(CheckoutError):
+            checkout_cart(self.user, self.cart)
+
+        self.assertEqual(Item.objects.get(pk=plenty.pk).in_stock, 20)
+        self.assertFalse(InventoryItem.objects.exists())
+        self.assertEqual(self.cart.cart_items.count(), 2)
+
+    def test_view_reports_short_stock(self):
+        item, = make_items(1, in_stock=1)
+        self.fill_cart([item])
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse("inventory_add_cart"))
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_is_independent_of_cart_size(self):
+        counts = []
+        items = make_items(100)
+        # From two lines up, so every size takes the ordered row lock on PostgreSQL
+        for size in (2, 10, 50):
+            CartItem.objects.all().delete()
+            InventoryItem.objects.all().delete()
+            self.fill_cart(items[:size])
+            with CaptureQueriesContext(connection) as ctx:
+                checkout_cart(self.user, self.cart)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.delivered = []
+        outbox.handler("test.topic")(self.delivered.extend)
+        self.addCleanup(outbox._handlers.pop, "test.topic", None)
+
+    def test_events_are_written_with_the_item(self):
+        item, = make_items(1)
+        with mock.patch.object(signals, "OPENSEARCH_URL", "http://search.invalid"):
+            item.name = "Renamed"
+            item.save()
+        self.assertEqual(OutboxEvent.objects.filter(topic="search.index").count(), 1)
+
+    def test_drain_groups_by_topic_and_deletes_delivered(self):
+        outbox.enqueue("test.topic", {"n": 1})
+        outbox.enqueue("test.topic", {"n": 2})
+
+        self.assertEqual(outbox.drain(), (2, 0, 0))
+
+        self.assertEqual(self.delivered, [{"n": 1}, {"n": 2}])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    @override_settings(ALERT_EMAILS="ops@example.com")
+    def test_low_stock_email_retries_without_resending(self):
+        outbox.enqueue_many("low_stock.email", [{"sku": "A-1", "name": "Mic", "in_stock": 2},
+                                                {"sku": "A-2", "name": "Cable", "in_stock": 0}])
+
+        with mock.patch.object(signals, "send_mail", side_effect=OSError("SMTP down")):
+            self.assertEqual(outbox.drain(), (0, 2, 0))
+        OutboxEvent.objects.update(available_at=timezone.now())
+        self.assertEqual(outbox.drain(), (2, 0, 0))
+
+        message, = mail.outbox
+        self.assertEqual(message.subject, "[Inventro] Low stock: 2 items")
+        self.assertIn("SKU: A-1", message.body)
+        self.assertIn("SKU: A-2", message.body)
+
+    def test_failures_back_off_then_give_up(self):
+        event = outbox.enqueue("test.unregistered", {})
+
+        self.assertEqual(outbox.drain(max_attempts=2), (0, 1, 0))
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.available_at, event.created_at)
+        self.assertIn("LookupError", event.last_error)
+
+        OutboxEvent.objects.update(available_at=event.created_at)
+        self.assertEqual(outbox.drain(max_attempts=2), (0, 0, 1))
+        event.refresh_from_db()
+        self.assertEqual(event.status, OutboxEvent.STATUS_FAILED)
+
+
+class FakeOpenSearch(ThreadingHTTPServer):
+    """Just enough of the OpenSearch REST API for reindex_items."""
+
+    def __init__(self):
+        self.docs, self.indices, self.aliases, self.requests = {}, set(), {}, []
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body=None):
+                data = json.dumps(body or {}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+
+            def handle_one(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                path = self.path.strip("/")
+                server.requests.append((self.command, path))
+                if path == "_bulk":
+                    lines = body.splitlines()
+                    for action, doc in zip(lines[::2], lines[1::2]):
+                        meta = json.loads(action)["index"]
+                        server.docs.setdefault(meta["_index"], {})[meta["_id"]] = json.loads(doc)
+                    return self.reply(200, {"errors": False, "items": []})
+                if path == "_aliases":
+                    for action in json.loads(body)["actions"]:
+                        if "add" in action:
+                            server.aliases[action["add"]["alias"]] = action["add"]["index"]
+                    return self.reply(200, {"acknowledged": True})
+                if path.startswith("_alias/"):
+                    alias = path.split("/", 1)[1]
+                    if alias in server.aliases:
+                        return self.reply(200, {server.aliases[alias]: {"aliases": {alias: {}}}})
+                    return self.reply(404)
+                if self.command == "PUT" and "/" not in path:
+                    server.indices.add(path)
+                    return self.reply(200, {"acknowledged": True})
+                if self.command == "HEAD":
+                    return self.reply(200 if path in server.indices else 404)
+                return self.reply(200, {"acknowledged": True})
+
+            do_GET = do_PUT = do_POST = do_HEAD = do_DELETE = handle_one
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class ReindexItemsTests(TestCase):
+    def setUp(self):
+        self.search = FakeOpenSearch()
+        self.addCleanup(self.search.shutdown)
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+        self.items = make_items(25)
+
+    def reindex(self, *args):
+        with self.settings(OPENSEARCH_URL=self.search.url, OPENSEARCH_INDEX="items"):
+            call_command("reindex_items", "--chunk-size=10", "--workers=3",
+                         f"--checkpoint={self.checkpoint}", *args, stdout=io.StringIO())
+
+    def test_builds_new_index_and_swaps_alias(self):
+        self.reindex()
+
+        index = self.search.aliases["items"]
+        self.assertTrue(index.startswith("items_v"))
+        self.assertEqual(len(self.search.docs[index]), 25)
+        self.assertEqual(sum(1 for r in self.search.requests if r[1] == "_bulk"), 3)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_skips_checkpointed_items(self):
+        self.search.indices.add("items_v1")
+        with open(self.checkpoint, "w") as f:
+            json.dump({"alias": "items", "index": "items_v1", "last_id": self.items[9].pk, "indexed": 10}, f)
+
+        self.reindex("--resume")
+
+        self.assertEqual(len(self.search.docs["items_v1"]), 15)
+        self.assertEqual(self.search.aliases["items"], "items_v1")
+
+
+class ItemChangeTrackingTests(TestCase):
+    def setUp(self):
+        make_items(1)
+        self.item = Item.objects.get()
+
+    def test_reports_changed_fields_and_previous_values(self):
+        self.assertEqual(self.item.changed_fields, set())
+
+        self.item.in_stock = 3
+        self.item.category = ItemCategory.objects.create(name="Video")
+
+        self.assertEqual(self.item.changed_fields, {"in_stock", "category"})
+        self.assertEqual(self.item.previous_value("in_stock"), 20)
+
+        self.item.save()
+        self.assertEqual(self.item.changed_fields, set())
+        self.assertEqual(self.item.previous_value("in_stock"), 3)
+
+    def test_save_updates_only_modified_columns_without_rereading(self):
+        self.item.description = "Spare"
+        with CaptureQueriesContext(connection) as ctx:
+            self.item.save()
+
+        sql = [q["sql"] for q in ctx.captured_queries]
+        update, = [q for q in sql if q.startswith('UPDATE "inventory_item"')]
+        self.assertIn('"description"', update)
+        self.assertIn('"updated_at"', update)
+        self.assertNotIn('"in_stock"', update)
+        self.assertFalse([q for q in sql if q.startswith("SELECT")])
+
+    def test_receivers_see_the_previous_value(self):
+        self.item.in_stock = signals.LOW_STOCK_THRESHOLD
+        self.item.save()
+
+        self.assertTrue(OutboxEvent.objects.filter(topic="low_stock.email").exists())
+
+
+class LowStockAlertTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("staff", password="pw")
+        self.items = make_items(3)
+
+    def submitted(self, write):
+        with mock.patch.object(alerts.alerts, "submit") as submit, mock.patch.object(deltas.publisher, "submit"), \
+                self.captureOnCommitCallbacks(execute=True):
+            write()
+        return [pk for call in submit.call_args_list for pk in call.args[0]]
+
+    def test_only_threshold_transitions_are_submitted(self):
+        item = Item.objects.get(pk=self.items[0].pk)
+        item.in_stock = 19
+
+        self.assertEqual(self.submitted(item.save), [item.pk])
+
+        item.description = "Unrelated edit"
+        self.assertEqual(self.submitted(item.save), [])
+
+    def test_checkout_submits_its_items_together(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.bulk_create(CartItem(cart=cart, item=item, quantity=1) for item in self.items)
+
+        submitted = self.submitted(lambda: checkout_cart(self.user, cart))
+
+        self.assertEqual(sorted(submitted), sorted(item.pk for item in self.items))
+
+    def test_flush_batches_and_deduplicates_within_the_window(self):
+        Item.objects.filter(pk__in=[self.items[0].pk, self.items[1].pk]).update(in_stock=1)
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        dispatcher = alerts.LowStockAlerts(window=60)
+
+        with mock.patch.object(alerts, "get_channel_layer", return_value=layer):
+            dispatcher._pending.update(item.pk for item in self.items)
+            sent = dispatcher.flush()
+            dispatcher._pending.update(item.pk for item in self.items)
+            resent = dispatcher.flush()
+
+        self.assertEqual([payload["id"] for payload in sent], [self.items[0].pk, self.items[1].pk])
+        self.assertEqual(resent, [])
+        layer.group_send.assert_awaited_once_with("low_stock", {"type": "low_stock_alert", "items": sent})
+
+
+class DeltaPublisherTests(SimpleTestCase):
+    def test_stop_sends_pending_and_closes_the_sender(self):
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        publisher = deltas.DeltaPublisher(delay=60)
+        row = deltas.delta(1, None, 5, True)
+
+        with mock.patch.object(deltas, "get_channel_layer", return_value=layer), \
+                mock.patch.object(deltas, "current_version", return_value=3), \
+                mock.patch.object(deltas, "close_old_connections"):
+            publisher.submit([row])
+            publisher.stop()
+
+        self.assertIsNone(publisher._thread)
+        layer.group_send.assert_awaited_once_with(deltas.GROUP, {"type": "inventory_delta", "items": [row]})
+        layer.close_sender.assert_called_once_with()
+
+    def test_messages_carry_a_version_once_it_has_settled(self):
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        fresh = deltas.DeltaPublisher(settle=5)
+        settled = deltas.DeltaPublisher(settle=5)
+        settled._versions.append((time.monotonic() - 6, 3))
+
+        with mock.patch.object(deltas, "get_channel_layer", return_value=layer), \
+                mock.patch.object(deltas, "current_version", return_value=7):
+            for publisher in (fresh, settled):
+                publisher._pending = {1: deltas.delta(1, None, 5, True)}
+                publisher.flush()
+
+        first, second = (call.args[1] for call in layer.group_send.await_args_list)
+        self.assertNotIn("version", first)
+        # 7 was only just sampled; 3 has been known for longer than settle
+        self.assertEqual(second["version"], 3)
+
+
+@skipUnless(connection.vendor == "postgresql", "Concurrent writers need PostgreSQL")
+class DeltaResumeTests(TransactionTestCase):
+    def setUp(self):
+        for publisher in (alerts.alerts, deltas.publisher):
+            patcher = mock.patch.object(publisher, "submit")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Separate stats shards and cube cells, so neither write waits on the other
+        patcher = mock.patch.object(stats, "_shard", lambda: 1 if threading.current_thread() is threading.main_thread() else 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.slow = make_items(1)[0]
+        self.fast = make_items(1, category=ItemCategory.objects.create(name="Video"))[0]
+        stats.rebuild()
+
+    def test_a_write_that_commits_late_is_still_replayed(self):
+        written, finish = threading.Event(), threading.Event()
+
+        def slow_write():
+            try:
+                with transaction.atomic():
+                    Item.objects.get(pk=self.slow.pk).delete()
+                    written.set()
+                    finish.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=slow_write)
+        thread.start()
+        self.assertTrue(written.wait(10))
+        # Starts after the slow delete and commits before it
+        self.fast.in_stock = 3
+        self.fast.save()
+        version = deltas.current_version()
+        finish.set()
+        thread.join()
+
+        rows, complete = deltas.changed_since(version)
+        self.assertTrue(complete)
+        self.assertIn(deltas.delta(self.slow.pk, self.slow.category_id, self.slow.in_stock, False), rows)
+        self.assertEqual(deltas.changed_since(deltas.current_version()), ([], True))
+
+
+class InventoryAvailabilityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("staff", password="pw")
+        self.items = make_items(40)
+        reservations.hold(Cart.objects.create(user=self.user), self.items[0].pk, 5)
+        self.client.force_login(self.user)
+
+    def get_table(self, per_page):
+        return self.client.get(reverse("dashboard_inventory"), {"per_page": per_page}, HTTP_HX_REQUEST="true")
+
+    def test_rows_show_stock_nobody_holds(self):
+        other = User.objects.create_user("other", password="pw")
+        reservations.hold(Cart.objects.create(user=other), self.items[0].pk, 3)
+
+        rows = {item.pk: item.available for item in self.get_table(10).context["items"]}
+
+        self.assertEqual(rows[self.items[0].pk], 12)
+        self.assertEqual(rows[self.items[1].pk], 20)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        counts = []
+        for per_page in (5, 40):
+            with CaptureQueriesContext(connection) as ctx:
+                self.get_table(per_page)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_query_count_does_not_grow_with_carts(self):
+        def count():
+            with CaptureQueriesContext(connection) as ctx:
+                self.get_table(10)
+            return len(ctx.captured_queries)
+
+        before = count()
+        for i in range(20):
+            cart = Cart.objects.create(user=User.objects.create_user(f"shopper{i}", password="pw"))
+            reservations.hold(cart, self.items[i].pk, 1)
+        self.assertEqual(count(), before)
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.item, self.other = make_items(2, in_stock=5)
+        self.users = [User.objects.create_user(f"user{i}", password="pw") for i in range(2)]
+        self.carts = [Cart.objects.create(user=user) for user in self.users]
+
+    def reserved(self, item=None):
+        return Item.objects.get(pk=(item or self.item).pk).reserved
+
+    def test_holds_cannot_take_more_than_is_available(self):
+        reservations.hold(self.carts[0], self.item.pk, 3)
+        reservations.hold(self.carts[0], self.item.pk, 1, add=True)
+
+        with self.assertRaises(reservations.ReservationError):
+            reservations.hold(self.carts[1], self.item.pk, 2)
+        reservations.hold(self.carts[1], self.item.pk, 1)
+        self.assertEqual(self.reserved(), 5)
+
+        reservations.hold(self.carts[0], self.item.pk, 0)
+        self.assertEqual(self.reserved(), 1)
+        self.assertFalse(CartItem.objects.filter(cart=self.carts[0]).exists())
+        with self.assertRaises(Item.DoesNotExist):
+            reservations.hold(self.carts[0], 999999, 1)
+
+    def test_cart_api_holds_and_releases(self):
+        self.client.force_login(self.users[0])
+        self.client.post("/api/cart/", {"item_id": self.item.pk, "quantity": 4})
+        self.assertEqual(self.reserved(), 4)
+        self.assertEqual(self.client.post("/api/cart/", {"item_id": self.item.pk, "quantity": 2}).status_code, 400)
+
+        patch = {"item_id": self.item.pk, "quantity": 2}
+        self.client.patch("/api/cart/", json.dumps(patch), content_type="application/json")
+        self.assertEqual(self.reserved(), 2)
+        self.client.delete("/api/cart/", json.dumps({"item_id": self.item.pk, "quantity": 1}),
+                           content_type="application/json")
+        self.assertEqual(self.reserved(), 1)
+        self.assertEqual(CartItem.objects.get(cart=self.carts[0]).quantity, 1)
+
+    def test_cart_api_rejects_bad_quantities(self):
+        self.client.force_login(self.users[0])
+        self.client.post("/api/cart/", {"item_id": self.item.pk, "quantity": 2})
+
+        for method, quantity in (("delete", -5), ("delete", 0), ("patch", -1), ("patch", "two"), ("post", None)):
+            body = json.dumps({"item_id": self.item.pk, "quantity": quantity})
+            response = getattr(self.client, method)("/api/cart/", body, content_type="application/json")
+            self.assertEqual(response.status_code, 400, (method, quantity))
+        self.assertEqual(self.reserved(), 2)
+        self.assertEqual(CartItem.objects.get(cart=self.carts[0]).quantity, 2)
+
+    def test_holds_version_the_item_lists_without_the_stats_row(self):
+        stats.rebuild()
+        items, totals = self.client.get("/api/items/"), self.client.get("/api/stats/")
+        version = stats.get().version
+
+        reservations.hold(self.carts[0], self.item.pk, 2)
+
+        self.assertEqual(stats.get().version, version)
+        self.assertEqual(self.client.get("/api/items/", HTTP_IF_NONE_MATCH=items["ETag"]).status_code, 200)
+        self.assertEqual(self.client.get("/api/stats/", HTTP_IF_NONE_MATCH=totals["ETag"]).status_code, 304)
+
+    def test_a_cart_has_one_line_per_item(self):
+        reservations.hold(self.carts[0], self.item.pk, 1)
+        reservations.hold(self.carts[0], self.item.pk, 1, add=True)
+
+        self.assertEqual(CartItem.objects.get(cart=self.carts[0]).quantity, 2)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=self.carts[0], item=self.item, quantity=1)
+
+    def test_touching_a_cart_extends_all_its_holds(self):
+        reservations.hold(self.carts[0], self.item.pk, 1)
+        CartItem.objects.update(expires_at=timezone.now())
+
+        reservations.hold(self.carts[0], self.other.pk, 1)
+
+        self.assertFalse(CartItem.objects.filter(expires_at__lte=timezone.now()).exists())
+
+    def test_expire_releases_lapsed_holds_in_batches(self):
+        for cart in self.carts:
+            reservations.hold(cart, self.item.pk, 2)
+            reservations.hold(cart, self.other.pk, 1)
+        CartItem.objects.filter(cart=self.carts[0]).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(reservations.expire(batch_size=1), 1)
+        out = io.StringIO()
+        call_command("expire_holds", "--once", "--batch-size", "1", stdout=out)
+
+        self.assertIn("1 cart line(s)", out.getvalue())
+        self.assertEqual((self.reserved(), self.reserved(self.other)), (2, 1))
+        self.assertEqual(CartItem.objects.filter(cart=self.carts[1]).count(), 2)
+
+    def test_checkout_turns_holds_into_borrowed_stock(self):
+        reservations.hold(self.carts[0], self.item.pk, 3)
+
+        checkout_cart(self.users[0], self.carts[0])
+
+        item = Item.objects.get(pk=self.item.pk)
+        self.assertEqual((item.in_stock, item.reserved, item.available), (2, 0, 2))
+
+    def test_rebuild_corrects_drift(self):
+        reservations.hold(self.carts[0], self.item.pk, 3)
+        Item.objects.update(reserved=4)
+
+        self.assertEqual(reservations.rebuild(), 2)
+        self.assertEqual((self.reserved(), self.reserved(self.other)), (3, 0))
+
+
+class StockTests(TestCase):
+    def setUp(self):
+        self.item, self.other = make_items(2, in_stock=5)
+        stats.rebuild()
+
+    def stock(self, item=None):
+        return Item.objects.values_list("in_stock", "reserved", "version").get(pk=(item or self.item).pk)
+
+    def test_batch_reports_each_line(self):
+        results = Item.objects.adjust_stock([(self.item.pk, -3), (self.other.pk, -6), (999999, 1)])
+
+        self.assertEqual([(r.ok, r.reason) for r in results], [(True, ""), (False, INSUFFICIENT), (False, MISSING)])
+        self.assertEqual(results[0].item.in_stock, 2)
+        self.assertEqual((self.stock(), self.stock(self.other)), ((2, 0, 1), (5, 0, 0)))
+        self.assertEqual(stats.drift(stats.get(), stats.compute()), {})
+
+    def test_holds_stay_covered(self):
+        cart = Cart.objects.create(user=User.objects.create_user("holder", password="pw"))
+        reservations.hold(cart, self.item.pk, 4)
+
+        self.assertFalse(Item.objects.adjust_stock([(self.item.pk, -2)])[0].ok)
+        self.assertTrue(Item.objects.adjust_stock([StockChange(self.item.pk, -2, release=2)])[0].ok)
+        self.assertEqual(self.stock()[:2], (3, 2))
+
+    def test_expected_version_guards_against_concurrent_writes(self):
+        Item.objects.adjust_stock([(self.item.pk, 1)])
+
+        stale, = Item.objects.adjust_stock([StockChange(self.item.pk, 1, expected_version=0)])
+        fresh, = Item.objects.adjust_stock([StockChange(self.item.pk, 1, expected_version=1)])
+
+        self.assertEqual((stale.ok, stale.reason, fresh.ok), (False, CONFLICT, True))
+        self.assertEqual(self.stock(), (7, 0, 2))
+
+    def test_stock_edits_through_the_api_move_the_version(self):
+        cart = Cart.objects.create(user=User.objects.create_user("holder", password="pw"))
+        reservations.hold(cart, self.item.pk, 3)
+        self.client.force_login(User.objects.create_user("staff", password="pw", is_staff=True))
+        url = f"/api/items/{self.item.pk}/"
+
+        self.assertEqual(self.client.patch(url, {"in_stock": 2}, content_type="application/json").status_code, 400)
+        self.assertEqual(self.client.patch(url, {"in_stock": 4}, content_type="application/json").status_code, 200)
+        self.client.patch(url, {"name": "Renamed"}, content_type="application/json")
+
+        stale, = Item.objects.adjust_stock([StockChange(self.item.pk, -1, expected_version=0)])
+        self.assertEqual((stale.ok, stale.reason), (False, CONFLICT))
+        self.assertEqual(self.stock(), (4, 3, 1))
+
+    def test_all_or_nothing_writes_nothing_on_failure(self):
+        with self.assertRaises(StockError):
+            Item.objects.adjust_stock([(self.item.pk, -1), (self.other.pk, -6)], all_or_nothing=True)
+
+        self.assertEqual((self.stock(), self.stock(self.other)), ((5, 0, 0), (5, 0, 0)))
+        with self.assertRaises(ValueError):
+            Item.objects.adjust_stock([(self.item.pk, -1), (self.item.pk, -1)])
+
+    def test_database_rejects_negative_stock(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Item.objects.filter(pk=self.item.pk).update(in_stock=-1)
+
+    def test_returns_cannot_exceed_what_was_borrowed(self):
+        user = User.objects.create_user("borrower", password="pw")
+        InventoryItem.objects.create(borrower=user, item=self.item, quantity=2)
+        self.client.force_login(user)
+        url = reverse("inventory_return_item")
+
+        self.assertEqual(self.client.post(url, {"item_id": self.item.pk, "quantity": 3}).status_code, 400)
+        self.assertEqual(self.client.post(url, {"item_id": self.item.pk, "quantity": 2}).status_code, 302)
+        self.assertEqual(self.client.post(url, {"item_id": self.item.pk, "quantity": 1}).status_code, 404)
+        self.assertEqual(self.stock()[0], 7)
+        self.assertFalse(InventoryItem.objects.exists())
+
+
+@skipUnless(connection.vendor == "postgresql", "Concurrent writers need PostgreSQL")
+class StockConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    ROUNDS = 50
+
+    def setUp(self):
+        # Commits run their on_commit hooks here; keep the publisher threads off the test database
+        for publisher in (alerts.alerts, deltas.publisher):
+            patcher = mock.patch.object(publisher, "submit")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_threads(self, work):
+        barrier = threading.Barrier(self.THREADS)
+        applied = [[] for _ in range(self.THREADS)]
+        errors = []
+
+        def run(n):
+            try:
+                barrier.wait()
+                for i in range(self.ROUNDS):
+                    applied[n].extend(result.change for result in work(n, i) if result.ok)
+            except Exception as e:
+                # A thread that dies (a deadlock, say) would otherwise just apply fewer changes
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return [change for changes in applied for change in changes]
+
+    def test_contended_takes_never_oversell(self):
+        item, = make_items(1, in_stock=self.THREADS * self.ROUNDS // 2)
+
+        applied = self.run_threads(lambda n, i: Item.objects.adjust_stock([(item.pk, -1)]))
+
+        self.assertEqual(len(applied), item.in_stock)
+        self.assertEqual(Item.objects.get(pk=item.pk).in_stock, 0)
+
+    def test_concurrent_first_adds_share_one_line(self):
+        item, = make_items(1, in_stock=self.THREADS * self.ROUNDS)
+        cart = Cart.objects.create(user=User.objects.create_user("holder", password="pw"))
+
+        def work(n, i):
+            reservations.hold(cart, item.pk, 1, add=True)
+            return []
+
+        self.run_threads(work)
+
+        line, = CartItem.objects.filter(cart=cart)
+        self.assertEqual(line.quantity, self.THREADS * self.ROUNDS)
+        self.assertEqual(Item.objects.get(pk=item.pk).reserved, line.quantity)
+
+    def test_mixed_batches_lose_no_updates(self):
+        items = make_items(3, in_stock=10)
+        ids = [item.pk for item in items]
+
+        def work(n, i):
+            # Half the threads add, half take, over overlapping batches
+            sign = 1 if n % 2 else -1
+            return Item.objects.adjust_stock([(pk, sign * (1 + (n + i + k) % 3)) for k, pk in enumerate(ids)])
+
+        applied = self.run_threads(work)
+
+        for pk, in_stock, version in Item.objects.filter(pk__in=ids).values_list("pk", "in_stock", "version"):
+            mine = [change.delta for change in applied if change.item_id == pk]
+            self.assertEqual(in_stock, 10 + sum(mine))
+            self.assertEqual(version, len(mine))
+            self.assertGreaterEqual(in_stock, 0)
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("staff", password="pw", first_name="Sam", is_staff=True)
+        self.category = ItemCategory.objects.create(name="Audio")
+        self.item = Item.objects.create(name="Mixer", sku="MX-1", in_stock=10, low_stock_bar=2, total_amount=10,
+                                        cost=5, category=self.category, created_by=self.user)
+
+    def lines(self):
+        return list(StockMovement.objects.filter(item=self.item).order_by("id").values_list("reason", "delta", "actor"))
+
+    def test_item_writes_append_lines(self):
+        self.item.in_stock = 8
+        self.item.save()
+        self.item.save()  # nothing changed, no line
+        cart = Cart.objects.create(user=self.user)
+        reservations.hold(cart, self.item.pk, 3)
+        checkout_cart(self.user, cart)
+        self.client.force_login(self.user)
+        self.client.post(reverse("inventory_return_item"), {"item_id": self.item.pk, "quantity": 1})
+        self.client.delete(f"/api/items/{self.item.pk}/")
+        other = User.objects.create_user("other", password="pw")
+        self.client.force_login(other)
+        self.client.patch(f"/api/items/{self.item.pk}/", {"in_stock": 4}, content_type="application/json")
+        created = self.client.post("/api/items/", {
+            "name": "Stand", "sku": "ST-1", "in_stock": 5, "low_stock_bar": 1, "total_amount": 5, "cost": "20.00",
+            "category_id": self.item.category_id, "location": "Shelf A",
+        }, content_type="application/json").json()
+
+        self.assertEqual(self.lines(), [
+            ("create", 10, self.user.pk), ("edit", -2, None), ("checkout", -3, self.user.pk),
+            ("return", 1, self.user.pk), ("delete", 0, self.user.pk), ("edit", -2, other.pk),
+        ])
+        self.assertEqual(list(StockMovement.objects.filter(item_id=created["id"]).values_list("reason", "delta", "actor")),
+                         [("create", 5, other.pk)])
+
+    def test_stock_at_replays_from_the_last_snapshot(self):
+        start = timezone.now()
+        times = [start + timedelta(hours=hour) for hour in range(1, 5)]
+        for delta, when in zip((-4, 2, -1, 3), times):
+            Item.objects.adjust_stock([(self.item.pk, delta)])
+            StockMovement.objects.filter(pk=StockMovement.objects.latest("id").pk).update(created_at=when)
+        StockMovement.objects.filter(reason="create").update(created_at=start)
+
+        self.assertEqual(ledger.snapshot(now=times[1] + ledger.SNAPSHOT_GRACE), 1)
+        self.assertEqual(ledger.snapshot(now=times[3] + ledger.SNAPSHOT_GRACE), 1)
+        self.assertEqual(ledger.snapshot(now=times[3] + ledger.SNAPSHOT_GRACE), 0)
+
+        expected = [10, 6, 8, 7, 10]
+        for when, stock in zip([start, *times], expected):
+            self.assertEqual(ledger.stock_at(self.item.pk, when), stock)
+        self.assertEqual(ledger.compact(keep_days=0, now=times[3] + timedelta(days=1)), 1)
+        self.assertEqual(StockSnapshot.objects.get().in_stock, 10)
+        self.assertEqual([ledger.stock_at(self.item.pk, when) for when in [start, *times]], expected)
+
+    def test_activity_feed_is_a_paginated_ledger_read(self):
+        for delta in (-1, -2, -3):
+            Item.objects.adjust_stock([(self.item.pk, delta)], actor=self.user)
+        self.client.force_login(self.user)
+
+        first = self.client.get("/api/activity/", {"page_size": 2}).json()
+        second = self.client.get(first["next"]).json()
+
+        self.assertEqual([row["delta"] for row in first["results"] + second["results"]], [-3, -2, -1, 10])
+        self.assertEqual(first["results"][0]["user"], "Sam")
+        self.assertEqual(first["results"][0]["summary"], "Stock adjusted (-3)")
+        self.assertEqual(second["results"][-1]["action"], "created")
+        self.assertIsNone(second["next"])
+
+
+class InventoryCubeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.audio = ItemCategory.objects.create(name="Audio")
+        self.video = ItemCategory.objects.create(name="Video")
+        self.today = timezone.localdate()
+
+    def create(self, **fields):
+        values = {"name": "Item", "sku": "SKU", "in_stock": 10, "low_stock_bar": 3, "total_amount": 10, "cost": 5,
+                  "category": self.audio, "location": "Shelf A", **fields}
+        return Item.objects.create(**values)
+
+    def test_writes_keep_the_cube_in_step(self):
+        first = self.create()
+        second = self.create(location=None, category=self.video, in_stock=0)
+        first.location = "Shelf B"
+        first.in_stock = 2
+        first.save()
+        Item.objects.adjust_stock([(second.pk, 4)])
+        self.client.force_login(self.user)
+        self.client.post("/api/items/bulk/", {"create": [
+            {"name": "Bulk", "sku": "B-1", "in_stock": 1, "low_stock_bar": 1, "total_amount": 1, "cost": "2.50",
+             "category_id": self.video.pk, "location": "Shelf B"},
+        ]}, content_type="application/json")
+        self.client.delete(f"/api/items/{second.pk}/")
+        self.create(location="Shelf C").delete()
+        repriced = self.create(cost="153.27")
+        repriced.cost = "9.99"
+        repriced.save()
+
+        self.assertEqual(cube.drift(), [])
+        self.assertEqual(cube.cost_drift(), [])
+        self.assertEqual(cube.cost_distribution(), {
+            "Audio": [(Decimal("5.00"), 1), (Decimal("9.90"), 1)], "Video": [(Decimal("2.50"), 1)],
+        })
+        by_location = {row["location"]: row for row in cube.rollup(("location",))}
+        self.assertEqual(by_location["Shelf B"]["total_items"], 2)
+        self.assertEqual(by_location["Shelf B"]["low_stock"], 2)
+        self.assertEqual(by_location[""]["total_items"], 0)
+
+    def test_rollups_slice_by_category_location_and_days(self):
+        old = self.create(location="Shelf B")
+        Item.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=10))
+        self.create()
+        self.create(category=self.video, in_stock=0)
+        # Moved behind the signals' back: the cell and cost cell it left and the ones it belongs in are all off
+        self.assertEqual(cube.refresh(), 4)
+
+        total, = cube.rollup()
+        self.assertEqual((total["total_items"], total["out_of_stock"], total["total_quantity"]), (3, 1, 20))
+        self.assertEqual(total["inventory_value"], Decimal("100.00"))
+        recent = cube.rollup(("category", "location"), start=self.today - timedelta(days=1))
+        self.assertEqual([(row["category"], row["location"], row["total_items"]) for row in recent],
+                         [("Audio", "Shelf A", 1), ("Video", "Shelf A", 1)])
+        self.assertEqual([row["total_items"] for row in cube.rollup(("date",), locations=["Shelf B"])], [1])
+
+        response = self.client.get("/api/metrics/cube/", {"group_by": "category", "category": self.audio.pk})
+        self.assertEqual(response.json()["results"], [{
+            "category": "Audio", "total_items": 2, "low_stock": 0, "out_of_stock": 0, "total_quantity": 20,
+            "inventory_value": 100.0, "total_cost": 10.0,
+        }])
+        self.assertEqual(self.client.get("/api/metrics/cube/", {"group_by": "sku"}).status_code, 400)
+
+    def test_refresh_command_reports_and_fixes_drift(self):
+        self.create()
+        InventoryCube.objects.update(total_items=5)
+        InventoryCostCube.objects.update(items=3)
+
+        with self.assertRaises(CommandError):
+            call_command("refresh_cube", "--check", stdout=io.StringIO())
+        call_command("refresh_cube", "--from", self.today.isoformat(), stdout=io.StringIO())
+        self.assertEqual(cube.drift(), [])
+        self.assertEqual(cube.cost_drift(), [])
+
+
+class InventoryStatsTests(TestCase):
+    def setUp(self):
+        self.items = make_items(3)
+        stats.rebuild()
+
+    def assertInSync(self):
+        self.assertEqual(stats.drift(stats.get(), stats.compute()), {})
+
+    def test_rollup_follows_saves_checkout_and_soft_delete(self):
+        item = Item.objects.get(pk=self.items[0].pk)
+        item.in_stock = 2
+        item.cost = 99
+        item.save()
+        self.assertInSync()
+
+        user = User.objects.create_user("staff", password="pw")
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, item=self.items[1], quantity=20)
+        checkout_cart(user, cart)
+        self.assertInSync()
+        self.assertEqual(stats.get().out_of_stock, 1)
+
+        item.is_active = False
+        item.save()
+        ItemCategory.objects.create(name="Video")
+        self.assertInSync()
+
+    def test_writes_spread_over_shards_that_sum_to_the_totals(self):
+        version = stats.get().version
+        for shard, item in zip((3, 7), self.items):
+            with mock.patch.object(stats, "_shard", return_value=shard):
+                Item.objects.filter(pk=item.pk).first().delete()
+
+        self.assertInSync()
+        self.assertEqual(stats.get().version, version + 2)
+        self.assertEqual(InventoryStats.objects.get(pk=3).total_items, -1)
+        stats.rebuild()
+        self.assertEqual(stats.get().version, version + 3)
+        self.assertEqual(list(InventoryStats.objects.exclude(total_items=0).values_list("pk", "total_items")), [(1, 1)])
+
+    def test_stats_endpoint_reads_only_the_rollup(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/stats/")
+        self.assertEqual(response.json()["total_items"], 3)
+        item_queries = [q for q in ctx.captured_queries if '"inventory_item"' in q["sql"]]
+        # Only the created_at window for new_items_7d touches the item table
+        self.assertEqual(len(item_queries), 1)
+
+    def test_rebuild_stats_reports_and_fixes_drift(self):
+        InventoryStats.objects.update(total_items=0)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_stats", "--check", stdout=io.StringIO())
+        call_command("rebuild_stats", stdout=io.StringIO())
+
+        self.assertInSync()
+
+
+class ItemSearchTests(TestCase):
+    def setUp(self):
+        category = ItemCategory.objects.create(name="Lighting")
+        Item.objects.bulk_create([
+            Item(name="Blue Microphone", sku="MIC-100", in_stock=3, low_stock_bar=1, total_amount=3, cost=50, category=category),
+            Item(name="Stage Light", sku="LGT-200", in_stock=3, low_stock_bar=1, total_amount=3, cost=50, category=category),
+            Item(name="Mic Stand", sku="STD-300", in_stock=3, low_stock_bar=1, total_amount=3, cost=50, category=category),
+        ])
+
+    def names(self, qs):
+        return sorted(qs.values_list("name", flat=True))
+
+    def test_matches_name_substring_and_sku_prefix(self):
+        backend = get_search_backend()
+        self.assertEqual(self.names(backend.filter(Item.objects.all(), "micro")), ["Blue Microphone"])
+        self.assertEqual(self.names(backend.filter(Item.objects.all(), "lgt")), ["Stage Light"])
+
+    def test_api_search_ranks_sku_hits_first(self):
+        response = self.client.get("/api/search/", {"q": "STD-300"})
+        self.assertEqual([row["name"] for row in response.json()["items"]], ["Mic Stand"])
+
+    def test_api_search_returns_matching_holdings(self):
+        user = User.objects.create_user("staff", password="pw")
+        InventoryItem.objects.create(borrower=user, item=Item.objects.get(sku="LGT-200"), quantity=1)
+
+        inventory = self.client.get("/api/search/", {"q": "light"}).json()["inventory"]
+
+        self.assertEqual([(row["name"], row["category"]) for row in inventory], [("Stage Light", "Lighting")])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.items = make_items(23)
+        # Duplicate names so the id tie-breaker matters
+        Item.objects.filter(pk__in=[item.pk for item in self.items[:6]]).update(name="Same")
+        self.expected = list(Item.objects.order_by("name", "id").values_list("pk", flat=True))
+
+    def pks(self, page):
+        return [item.pk for item in page]
+
+    def test_walks_every_row_once_in_both_directions(self):
+        paginator = KeysetPaginator(Item.objects.all(), 5)
+        pages, page = [], paginator.page()
+        while True:
+            pages.append(self.pks(page))
+            if not page.has_next:
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(sum(pages, []), self.expected)
+
+        backwards = []
+        while page.has_previous:
+            page = paginator.page(page.previous_cursor)
+            backwards.append(self.pks(page))
+        self.assertEqual(backwards, pages[-2::-1])
+
+    def test_deep_page_costs_the_same_queries_as_the_first(self):
+        user = User.objects.create_user("staff", password="pw")
+        self.client.force_login(user)
+        url = reverse("dashboard_inventory")
+        last = KeysetPaginator(Item.objects.all(), 5).page()
+        while last.has_next:
+            last = KeysetPaginator(Item.objects.all(), 5).page(last.next_cursor)
+
+        counts = []
+        for cursor in ("", last.previous_cursor):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, {"per_page": 5, "cursor": cursor}, HTTP_HX_REQUEST="true")
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(response.context["items"].count, 23)
+
+    def test_items_api_is_paginated(self):
+        first = self.client.get("/api/items/", {"page_size": 10, "count": "exact"}).json()
+        second = self.client.get(first["next"]).json()
+
+        self.assertEqual(first["count"], 23)
+        self.assertFalse(first["count_is_estimate"])
+        self.assertIsNone(first["previous"])
+        self.assertEqual([row["id"] for row in first["results"] + second["results"]], self.expected[:20])
+        self.assertEqual(self.client.get("/api/items/", {"cursor": "garbage"}).status_code, 404)
+
+
+class ItemIndexTests(TestCase):
+    """The hot Item queries must be answered from an index, not a table scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        audio = ItemCategory.objects.create(name="Audio")
+        video = ItemCategory.objects.create(name="Video")
+        items = make_items(5000, category=audio)
+        for i, item in enumerate(items):
+            item.category = video if i % 10 == 0 else audio
+            item.in_stock = 0 if i % 50 == 0 else (3 if i % 50 == 1 else 20)
+            item.is_active = i % 20 != 5
+            item.created_at = item.updated_at = now - timedelta(hours=i)
+        Item.objects.bulk_update(items, ["category", "in_stock", "is_active", "created_at", "updated_at"], batch_size=500)
+        # A ledger with a few lines and a snapshot per item, so the planner has something to skip
+        StockMovement.objects.bulk_create(
+            (StockMovement(item=item, reason=StockMovement.REASON_EDIT, delta=-1, created_at=now - timedelta(hours=n))
+             for item in items for n in range(3)),
+            batch_size=2000,
+        )
+        StockSnapshot.objects.bulk_create(
+            (StockSnapshot(item=item, taken_at=now, through=i, in_stock=item.in_stock) for i, item in enumerate(items)),
+            batch_size=2000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cls.user = User.objects.create_user("staff", password="pw")
+
+    def assertUsesIndex(self, qs, *names):
+        plan = qs.explain()
+        self.assertTrue(any(name in plan for name in names), f"expected an index scan on one of {names}:\n{plan}")
+
+    def items_page(self, **params):
+        request = RequestFactory().get("/inventory/", params)
+        request.user = self.user
+        return filter_items(request).order_by("name", "id")[:11]
+
+    def test_filter_items(self):
+        self.assertUsesIndex(self.items_page(), "item_active_name_idx")
+        self.assertUsesIndex(self.items_page(status="low"), "item_active_low_idx", "item_active_name_idx")
+        self.assertUsesIndex(self.items_page(status="out"), "item_active_out_idx")
+        self.assertUsesIndex(
+            Item.objects.filter(is_active=True, category=ItemCategory.objects.get(name="Video")).order_by("name", "id")[:11],
+            "item_active_category_idx",
+        )
+
+    def test_created_at_ranges(self):
+        # dashboard_stats and _metrics_dict both count new_items_since(7); /api/metrics/ filters the same way
+        since = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(Item.objects.filter(is_active=True, created_at__gte=since).order_by(), "item_active_created_idx")
+        self.assertUsesIndex(active_items(since.date()).order_by().values("category"), "item_active_created_idx")
+
+    def test_stock_ledger(self):
+        item, now = Item.objects.first(), timezone.now()
+        self.assertUsesIndex(StockMovement.objects.filter(item=item, id__gt=0, created_at__lte=now), "movement_item_idx")
+        self.assertUsesIndex(StockSnapshot.objects.filter(item=item, taken_at__lte=now).order_by("-through"),
+                             "snapshot_item_idx")
+
+
+@override_settings(INVENTRO_PAGINATION_COUNT="exact")
+class QueryBudgetTestCase(TestCase):
+    """
+    Checks views against a fixed number of SQL queries on a realistic
+    dataset. ``assertQueryBudget`` makes the request, then grows every table
+    with :meth:`grow` and makes it again: the count must stay within the
+    budget and must not change.
+
+    Budgets are PostgreSQL counts. Other databases can come in lower: they
+    skip the row locks a stock batch takes in primary-key order. Totals are
+    pinned to an exact ``COUNT(*)``, because the default estimate runs an
+    ``EXPLAIN`` first on PostgreSQL only, and then still counts exactly on
+    tables this small.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        cls.categories = [ItemCategory.objects.create(name=name) for name in ("Audio", "Video", "Lighting", "Cables", "Stands")]
+        cls.items = []
+        for category in cls.categories:
+            cls.items += make_items(400, category=category)
+        cls.seed_user_rows(cls.items[:8])
+
+    @classmethod
+    def seed_user_rows(cls, items):
+        """Cart lines, holdings and recently edited rows for ``cls.user``."""
+        cart, _ = Cart.objects.get_or_create(user=cls.user)
+        CartItem.objects.bulk_create(CartItem(cart=cart, item=item, quantity=1) for item in items)
+        InventoryItem.objects.bulk_create(InventoryItem(borrower=cls.user, item=item, quantity=2) for item in items)
+        Item.objects.filter(pk__in=[item.pk for item in items]).update(
+            created_by=cls.user, updated_by=cls.user, updated_at=timezone.now())
+
+    def grow(self):
+        category = ItemCategory.objects.create(name=f"Extra {ItemCategory.objects.count()}")
+        items = Item.objects.bulk_create(
+            Item(name=f"Extra {i:05d}", sku=f"EXT-{i:05d}", location="Shelf B", category=category,
+                 in_stock=2, low_stock_bar=5, total_amount=20, cost=15)
+            for i in range(500)
+        )
+        self.seed_user_rows(items[:12])
+
+    def count_queries(self, method, url, data=None, **extra):
+        url = url() if callable(url) else url
+        data = data() if callable(data) else data
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data, **extra)
+        self.assertLess(response.status_code, 500, url)
+        return len(ctx.captured_queries)
+
+    def assertQueryBudget(self, budget, url, method="get", data=None, **extra):
+        if method == "get":
+            # Warm per-process caches (content types, site) so they aren't counted
+            self.count_queries(method, url, data, **extra)
+        before = self.count_queries(method, url, data, **extra)
+        self.assertLessEqual(before, budget, f"{method.upper()} {url}: {before} queries, budget is {budget}")
+        self.grow()
+        after = self.count_queries(method, url, data, **extra)
+        self.assertEqual(before, after, f"{method.upper()} {url}: query count grew with the data")
+
+    def assertFlatInPageSize(self, url, param, sizes=(5, 50), **extra):
+        counts = [self.count_queries("get", url, {param: size}, **extra) for size in sizes]
+        self.assertEqual(len(set(counts)), 1, f"{url}: query counts {counts} for {param}={sizes}")
+
+
+class InventoryQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def first_holding(self):
+        return InventoryItem.objects.filter(borrower=self.user).order_by("-id").first()
+
+    def test_pages(self):
+        self.assertQueryBudget(5, reverse("dashboard_inventory"))
+        # Two of these read the inventory and cart hold versions for the ETag
+        self.assertQueryBudget(6, reverse("dashboard_inventory"), HTTP_HX_REQUEST="true")
+        self.assertQueryBudget(4, reverse("user_inventory_page"))
+        self.assertQueryBudget(4, reverse("dashboard_cart"))
+        self.assertQueryBudget(3, reverse("dashboard_add_item"))
+        self.assertQueryBudget(5, reverse("dashboard_edit_item", args=[self.items[0].pk]))
+        self.assertQueryBudget(3, reverse("inventory_delete", args=[self.items[0].pk]))
+
+    def test_pages_do_not_grow_with_page_size(self):
+        self.assertFlatInPageSize(reverse("dashboard_inventory"), "per_page")
+        self.assertFlatInPageSize(reverse("user_inventory_page"), "per_page")
+        self.assertFlatInPageSize("/api/items/", "page_size")
+
+    def test_checkout_and_return(self):
+        # The stock UPDATE runs in its own savepoint, so an all-or-nothing batch can roll back alone, after
+        # locking the cart's items in primary-key order; both writes append their stock ledger lines and
+        # upsert their analytics cube cells and delta rows
+        self.assertQueryBudget(18, reverse("inventory_add_cart"), method="post")
+        self.assertQueryBudget(
+            12, reverse("inventory_return_item"), method="post",
+            data=lambda: {"item_id": self.first_holding().item_id, "quantity": 1},
+        )
+
+    def test_item_and_category_writes(self):
+        # The soft delete appends its stock ledger line, takes the item out of its analytics cube and cost
+        # cells and upserts its delta row
+        self.assertQueryBudget(
+            11, lambda: reverse("inventory_delete", args=[Item.objects.filter(is_active=True).last().pk]),
+            method="post", data={"force": "1"},
+        )
+        self.assertQueryBudget(
+            7, reverse("add_category"), method="post",
+            data=lambda: {"category-name": f"New {ItemCategory.objects.count()}"},
+        )
+
+    def test_api(self):
+        self.assertQueryBudget(2, "/api/")
+        # The lists read the inventory and cart hold versions and the detail its item's state for the ETag
+        self.assertQueryBudget(6, "/api/items/")
+        self.assertQueryBudget(4, f"/api/items/{self.items[0].pk}/")
+        self.assertQueryBudget(4, "/api/categories/")
+        self.assertQueryBudget(4, f"/api/categories/{self.categories[0].pk}/")
+        self.assertQueryBudget(4, "/api/search/", data={"q": "Item 0001"})
+
+    def test_cart_api(self):
+        def line():
+            # A new line each time, so both runs measure the same path
+            return {"item_id": Item.objects.filter(is_active=True).exclude(carts__user=self.user).last().pk,
+                    "quantity": 1}
+
+        # Holding stock takes the line lock (a new line is created in a savepoint), the conditional reserve,
+        # the expiry refresh and the hold counter bump
+        self.assertQueryBudget(12, "/api/cart/", method="post", data=line)
+        self.assertQueryBudget(
+            8, "/api/cart/", method="patch", content_type="application/json",
+            data=lambda: json.dumps({"item_id": CartItem.objects.order_by("-id").first().item_id, "quantity": 1}),
+        )
+        self.assertQueryBudget(
+            11, "/api/cart/", method="delete", content_type="application/json",
+            data=lambda: json.dumps({"item_id": CartItem.objects.order_by("-id").first().item_id, "quantity": 1}),
+        )
+
+    def test_admin(self):
+        self.assertQueryBudget(3, "/admin/")
+        self.assertQueryBudget(7, "/admin/inventory/item/")
+        self.assertQueryBudget(7, "/admin/inventory/item/", data={"category": self.categories[0].pk, "q": "Item"})
+        self.assertQueryBudget(6, f"/admin/inventory/item/{self.items[0].pk}/change/")
+        self.assertQueryBudget(6, "/admin/inventory/outboxevent/")
+
+
+@skipUnless(connection.vendor == "postgresql", "LISTEN/NOTIFY needs PostgreSQL")
+class PostgresChannelLayerTests(TestCase):
+    """Two layer instances stand in for two worker processes."""
+
+    def run_layers(self, scenario, **config):
+        async def run():
+            layers = [PostgresChannelLayer(**config), PostgresChannelLayer(**config)]
+            try:
+                return await asyncio.wait_for(scenario(*layers), 10)
+            finally:
+                await layers[0].flush()
+                for layer in layers:
+                    await layer.close()
+        return async_to_sync(run)()
+
+    def test_group_send_reaches_members_in_every_process(self):
+        async def scenario(a, b):
+            members = [(a, await a.new_channel()), (b, await b.new_channel()), (b, await b.new_channel())]
+            for layer, channel in members:
+                await layer.group_add("low_stock", channel)
+            await a.group_send("low_stock", {"type": "low_stock_alert", "item": {"sku": "MIC-1"}})
+            return [await layer.receive(channel) for layer, channel in members]
+
+        received = self.run_layers(scenario)
+        self.assertEqual([m["item"]["sku"] for m in received], ["MIC-1"] * 3)
+
+    def test_large_messages_spill_to_the_table(self):
+        async def scenario(a, b):
+            channel = await b.new_channel()
+            await a.send(channel, {"type": "big", "blob": "x" * 20000})
+            return await b.receive(channel)
+
+        self.assertEqual(len(self.run_layers(scenario)["blob"]), 20000)
+
+    def test_spilled_and_inline_messages_keep_send_order(self):
+        async def scenario(a, b):
+            channel = await b.new_channel()
+            for i, blob in enumerate(["x" * 20000, "", "x" * 20000, ""]):
+                await a.send(channel, {"type": "n", "i": i, "blob": blob})
+            return [(await b.receive(channel))["i"] for _ in range(4)]
+
+        self.assertEqual(self.run_layers(scenario), [0, 1, 2, 3])
+
+    def test_full_channels_drop_and_discarded_members_stop_receiving(self):
+        async def scenario(a, b):
+            channel = await b.new_channel()
+            await b.group_add("g", channel)
+            for i in range(3):
+                await a.group_send("g", {"type": "n", "i": i})
+            await asyncio.sleep(1)  # let all three arrive before anything is received
+            received = [(await b.receive(channel))["i"] for _ in range(2)]
+            await b.group_discard("g", channel)
+            await a.group_send("g", {"type": "n", "i": 99})
+            await a.send(channel, {"type": "n", "i": 100})
+            received.append((await b.receive(channel))["i"])
+            return received
+
+        self.assertEqual(self.run_layers(scenario, capacity=2), [0, 1, 100])
+
+
+class ImportItemsTests(TestCase):
+    CSV = (
+        "name,sku,total_amount,cost,category,location\n"
+        "Wireless Mic,A-001,10,$150,Audio,\"Toronto, Canada\"\n"
+        "Broken,A-002,lots,$10,Audio,Shelf\n"
+        "Spotlight,L-001,4,\"$1,200.50\",Lighting,Shelf\n"
+        "No SKU,,4,$1,Lighting,Shelf\n"
+        "Wireless Mic v2,A-001,12,$155,Audio,\n"
+    )
+
+    def test_rows_are_validated_streamed_in_chunks_and_rejects_reported(self):
+        rejects = []
+        chunks = list(read_chunks(io.StringIO(self.CSV), 2, lambda *reject: rejects.append(reject)))
+
+        self.assertEqual([[row.sku for row in chunk] for chunk in chunks], [["A-001", "L-001"], ["A-001"]])
+        self.assertEqual(chunks[0][1].cost, Decimal("1200.50"))
+        self.assertEqual(chunks[0][0].location, "Toronto, Canada")
+        self.assertEqual([(line, sku) for line, sku, _ in rejects], [(3, "A-002"), (5, "")])
+        self.assertIn("total_amount", rejects[0][2])
+
+    def test_missing_columns_fail_the_whole_file(self):
+        with self.assertRaises(RowError):
+            list(read_chunks(io.StringIO("name,sku\nMic,A-1\n"), 10, print))
+
+    @skipUnless(connection.vendor == "postgresql", "COPY needs PostgreSQL")
+    def test_upserts_by_sku_and_dry_run_changes_nothing(self):
+        audio = ItemCategory.objects.create(name="Audio")
+        Item.objects.create(name="Wireless Mic", sku="A-001", in_stock=8, total_amount=10, low_stock_bar=5,
+                            cost=150, category=audio)
+        path = os.path.join(tempfile.mkdtemp(), "items.csv")
+        with open(path, "w") as f:
+            f.write(self.CSV)
+
+        out = io.StringIO()
+        call_command("import_items", path, "--dry-run", stdout=out, stderr=io.StringIO())
+        self.assertIn("~ A-001 name: Wireless Mic -> Wireless Mic v2", out.getvalue())
+        self.assertIn("+ L-001 Spotlight", out.getvalue())
+        self.assertEqual(Item.objects.count(), 1)
+        self.assertFalse(ItemCategory.objects.filter(name="Lighting").exists())
+
+        out = io.StringIO()
+        call_command("import_items", path, stdout=out, stderr=io.StringIO())
+        self.assertIn("1 new, 1 updated", out.getvalue())
+        self.assertIn("2 rejected", out.getvalue())
+        mic = Item.objects.get(sku="A-001")
+        # Two more in total and nothing returned: two more on the shelf
+        self.assertEqual((mic.name, mic.total_amount, mic.in_stock), ("Wireless Mic v2", 12, 10))
+        self.assertEqual(Item.objects.get(sku="L-001").category.name, "Lighting")
+
+        out = io.StringIO()
+        call_command("import_items", path, stdout=out, stderr=io.StringIO())
+        self.assertIn("0 new, 0 updated", out.getvalue())
+
+    @skipUnless(connection.vendor == "postgresql", "COPY needs PostgreSQL")
+    def test_updates_keep_held_stock_and_bump_the_version(self):
+        audio = ItemCategory.objects.create(name="Audio")
+        mic = Item.objects.create(name="Mic", sku="A-001", in_stock=5, total_amount=5, low_stock_bar=1, cost=10,
+                                  category=audio)
+        reservations.hold(Cart.objects.create(user=User.objects.create_user("holder", password="pw")), mic.pk, 4)
+        path = os.path.join(tempfile.mkdtemp(), "items.csv")
+        with open(path, "w") as f:
+            f.write("name,sku,total_amount,cost,category,in_stock\nMic,A-001,5,$10,Audio,1\n")
+
+        call_command("import_items", path, stdout=io.StringIO(), stderr=io.StringIO())
+
+        self.assertEqual(Item.objects.values_list("in_stock", "reserved", "version").get(pk=mic.pk), (4, 4, 1))
+
+    @skipUnless(connection.vendor == "postgresql", "COPY needs PostgreSQL")
+    def test_imported_rows_are_indexed_alerted_and_published(self):
+        audio = ItemCategory.objects.create(name="Audio")
+        mic = Item.objects.create(name="Mic", sku="A-001", in_stock=20, total_amount=20, low_stock_bar=1, cost=10,
+                                  category=audio)
+        version = deltas.current_version()
+        path = os.path.join(tempfile.mkdtemp(), "items.csv")
+        with open(path, "w") as f:
+            f.write("name,sku,total_amount,cost,category,in_stock\nMic,A-001,20,$10,Audio,3\nCable,C-001,50,$2,Audio,40\n")
+
+        with mock.patch.object(signals, "OPENSEARCH_URL", "http://search"), \
+                mock.patch.object(alerts, "submit") as alert, mock.patch.object(deltas, "submit") as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command("import_items", path, stdout=io.StringIO(), stderr=io.StringIO())
+
+        cable = Item.objects.get(sku="C-001")
+        events = OutboxEvent.objects.order_by("id")
+        self.assertEqual([event.payload for event in events.filter(topic="search.index")],
+                         [{"ids": sorted([mic.pk, cable.pk])}])
+        self.assertEqual([event.payload for event in events.filter(topic="low_stock.email")],
+                         [{"sku": "A-001", "name": "Mic", "in_stock": 3}])
+        # Both are now below total_amount: the mic dropped there, the cable arrived there
+        self.assertEqual(sorted(alert.call_args.args[0]), sorted([mic.pk, cable.pk]))
+        rows, _ = deltas.changed_since(version)
+        self.assertEqual(sorted(row["id"] for row in rows), sorted([mic.pk, cable.pk]))
+        self.assertCountEqual(publish.call_args.args[0], rows)
+
+
+class ItemExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("staff", password="pw")
+        self.items = make_items(5)
+        Item.objects.filter(pk=self.items[0].pk).update(in_stock=2)
+        Item.objects.filter(pk=self.items[1].pk).update(is_active=False)
+        self.url = reverse("item-export")
+
+    def test_requires_login(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_streams_filtered_csv(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, {"status": "low"})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([(row["sku"], row["in_stock"], row["category"]) for row in rows], [("SKU-00000", "2", "Audio")])
+
+    def test_gzipped_json_lines_skip_inactive_items(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, {"format": "jsonl", "gzip": "1"})
+
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="items.jsonl.gz"')
+        lines = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], [item.pk for item in self.items if item is not self.items[1]])
+
+    def test_command_writes_blocks_across_cursor_batches(self):
+        make_items(30, category=ItemCategory.objects.create(name="Video"))
+        path = os.path.join(tempfile.mkdtemp(), "items.csv")
+
+        with mock.patch.object(export, "CURSOR_ROWS", 7), mock.patch.object(export, "BLOCK_BYTES", 100):
+            call_command("export_items", "--output", path, "--category", "video", stdout=io.StringIO())
+
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 30)
+        self.assertEqual({row["category"] for row in rows}, {"Video"})
+
+
+class BulkItemTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("staff", password="pw")
+        self.client.force_login(self.user)
+        self.category = ItemCategory.objects.create(name="Audio")
+        self.items = make_items(4, category=self.category)
+        stats.rebuild()
+        self.url = reverse("item-bulk")
+
+    def new_row(self, sku, **fields):
+        row = {"sku": sku, "name": f"New {sku}", "in_stock": 3, "total_amount": 3, "low_stock_bar": 1,
+               "cost": "2.50", "location": "Shelf B", "category_id": self.category.pk}
+        row.update(fields)
+        return row
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.post(self.url, {}, content_type="application/json").status_code, 403)
+
+    def test_creates_updates_and_deletes_in_one_batch(self):
+        first, second, third, _ = self.items
+        payload = {
+            "create": [self.new_row("NEW-1"), self.new_row("NEW-2")],
+            "update": [{"id": first.pk, "in_stock": 2}, {"sku": second.sku, "name": "Renamed"}],
+            "delete": [third.pk],
+        }
+        with mock.patch.object(signals.items_changed, "send", wraps=signals.items_changed.send) as send:
+            response = self.client.post(self.url, payload, content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["created"]), 2)
+        self.assertEqual(response.data["updated"], sorted([first.pk, second.pk]))
+        self.assertEqual(response.data["deleted"], [third.pk])
+        send.assert_called_once()
+        self.assertEqual(len(send.call_args.kwargs["changes"]), 5)
+        first.refresh_from_db()
+        self.assertEqual((first.in_stock, first.updated_by), (2, self.user))
+        self.assertEqual(Item.objects.get(pk=second.pk).name, "Renamed")
+        self.assertFalse(Item.objects.get(pk=third.pk).is_active)
+        self.assertEqual(stats.get().total_items, 5)
+
+    def test_any_invalid_row_writes_nothing(self):
+        payload = {
+            "create": [self.new_row("NEW-1"), self.new_row("NEW-2", category_id=999999)],
+            "update": [{"id": self.items[0].pk, "in_stock": 1}, {"id": 999999, "in_stock": 1}],
+            "delete": [self.items[1].pk, self.items[1].sku],
+        }
+        response = self.client.post(self.url, payload, content_type="application/json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["create"][0], {})
+        self.assertIn("category_id", response.data["create"][1])
+        self.assertEqual(response.data["update"][0], {})
+        self.assertIn("No such item.", response.data["update"][1]["non_field_errors"])
+        self.assertIn("more than once", response.data["delete"][1]["non_field_errors"][0])
+        self.assertFalse(Item.objects.filter(sku__startswith="NEW-").exists())
+        self.assertEqual(Item.objects.filter(is_active=True).count(), 4)
+
+    def test_stock_updates_respect_holds_and_bump_the_version(self):
+        first, second = self.items[:2]
+        reservations.hold(Cart.objects.create(user=self.user), first.pk, 3)
+
+        response = self.client.post(self.url, {"update": [{"id": first.pk, "in_stock": 2}]},
+                                    content_type="application/json")
+        self.assertIn("in_stock", response.data["update"][0])
+        response = self.client.post(self.url, {"update": [{"id": first.pk, "in_stock": 3},
+                                                          {"id": second.pk, "name": "Renamed"}]},
+                                    content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Item.objects.filter(pk__in=[first.pk, second.pk]).order_by("pk")
+                              .values_list("in_stock", "version")), [(3, 1), (second.in_stock, 0)])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def run(skus, rows):
+            payload = {"create": [self.new_row(sku) for sku in skus],
+                       "update": [{"id": item.pk, "in_stock": 1} for item in rows]}
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.post(self.url, payload, content_type="application/json").status_code, 200)
+            return len(queries)
+
+        small = run(["A-1"], self.items[:1])
+        large = run([f"B-{i}" for i in range(40)], make_items(40, category=self.category))
+        self.assertEqual(small, large)
+
+
+class ItemReadPathTests(TestCase):
+    def setUp(self):
+        self.items = make_items(3, cost="7.5", description="Desk\u2028lamp")
+        self.items += make_items(1, category=ItemCategory.objects.create(name="Vidéo"), cost=0)
+
+    def test_rows_match_item_serializer(self):
+        rows = ItemRowSerializer()
+        queryset = Item.objects.order_by("id")
+
+        self.assertEqual(rows.to_representation(rows.values(queryset)),
+                         ItemSerializer(queryset, many=True).data)
+
+    def test_rows_match_item_serializer_for_any_row(self):
+        rows = ItemRowSerializer()
+        page = list(rows.values(Item.objects.order_by("id")))
+        # Rows the table can't hold today but a row source could produce: no category, naive timestamps
+        naive = timezone.make_naive(page[0]["created_at"], timezone.get_default_timezone())
+        page += [{**page[0], "id": 0, "category_id": None, "category__name": None},
+                 {**page[1], "id": -1, "created_at": naive, "updated_at": naive, "location": None}]
+
+        def item(row):
+            item = Item(**{column: value for column, value in row.items() if column != "category__name"})
+            if row["category_id"] is not None:
+                item.category = ItemCategory(pk=row["category_id"], name=row["category__name"])
+            return item
+
+        with timezone.override("America/Toronto"):
+            self.assertEqual(rows.to_representation(page), ItemSerializer(map(item, page), many=True).data)
+
+    def test_ujson_renderer_matches_json_renderer(self):
+        data = {"results": ItemSerializer(Item.objects.order_by("id"), many=True).data, "when": timezone.now()}
+
+        for media_type in ("application/json", "application/json; indent=2"):
+            self.assertEqual(UJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type))
+
+    def test_list_api_uses_rows(self):
+        response = self.client.get("/api/items/", {"count": "exact"})
+
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json()["results"],
+                         json.loads(JSONRenderer().render(ItemSerializer(Item.objects.order_by("name", "id"),
+                                                                         many=True).data)))
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command("serializer_benchmark", "--rows", "50", "--repeat", "1", stdout=out)
+
+        self.assertIn("50 items", out.getvalue())
+        self.assertEqual(len(self.items), Item.objects.count())
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("staff", password="pw")
+        self.items = make_items(3)
+        stats.rebuild()
+
+    def revalidate(self, url, **headers):
+        first = self.client.get(url, **headers)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("no-cache", first["Cache-Control"])
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"], **headers)
+        return first, again, [q["sql"] for q in ctx.captured_queries]
+
+    def test_unchanged_lists_are_not_modified_without_reading_items(self):
+        for url in ("/api/items/", "/api/categories/", "/api/stats/"):
+            with self.subTest(url=url):
+                first, again, sql = self.revalidate(url)
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again["ETag"], first["ETag"])
+                self.assertFalse([q for q in sql if '"inventory_item"' in q])
+
+    def test_writes_change_the_version(self):
+        first, _, _ = self.revalidate("/api/items/")
+
+        item = self.items[0]
+        item.name = "Renamed"
+        item.save()
+        changed = self.client.get("/api/items/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+
+        ItemCategory.objects.filter(pk=item.category_id).get().save()
+        self.assertEqual(self.client.get("/api/items/", HTTP_IF_NONE_MATCH=changed["ETag"]).status_code, 200)
+
+    def test_item_detail_uses_its_updated_at(self):
+        url = f"/api/items/{self.items[0].pk}/"
+        first, again, _ = self.revalidate(url)
+        self.assertEqual(again.status_code, 304)
+        self.assertTrue(first.has_header("Last-Modified"))
+
+        self.items[1].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+        Item.objects.filter(pk=self.items[0].pk).update(updated_at=timezone.now() + timedelta(seconds=5))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+        self.assertEqual(self.client.get("/api/items/999999/", HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 404)
+
+    def test_item_detail_changes_with_cart_holds(self):
+        url = f"/api/items/{self.items[0].pk}/"
+        first, _, _ = self.revalidate(url)
+
+        reservations.hold(Cart.objects.create(user=self.user), self.items[0].pk, 2)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()["reserved"], 2)
+
+    def test_inventory_table_is_per_user(self):
+        self.client.force_login(self.user)
+        first, again, _ = self.revalidate(reverse("dashboard_inventory"), HTTP_HX_REQUEST="true")
+        self.assertEqual(again.status_code, 304)
+        self.assertIn("private", first["Cache-Control"])
+        self.assertFalse(self.client.get(reverse("dashboard_inventory")).has_header("ETag"))
+
+        self.client.force_login(User.objects.create_superuser("admin", password="pw"))
+        other = self.client.get(reverse("dashboard_inventory"), HTTP_HX_REQUEST="true",
+                                HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(other.status_code, 200)
+
+
+class LoadTestSeedTests(TestCase):
+    def test_seeded_items_are_in_the_ledger_and_the_rollups(self):
+        loadtest.seed(30, 2, random.Random(1), batch_size=20, log=lambda message: None)
+
+        self.assertEqual(StockMovement.objects.filter(reason=StockMovement.REASON_OPENING).count(), 30)
+        self.assertEqual(stats.get().total_items, 30)
+        self.assertEqual(cube.rollup()[0]["total_items"], 30)
+        self.assertEqual((cube.drift(), cube.cost_drift()), ([], []))
+
+
+class GenerateDatasetTests(TestCase):
+    def test_same_seed_draws_the_same_columns(self):
+        spec = datagen.DatasetSpec(items=500, users=50, holdings=400, as_of=date(2025, 1, 1))
+
+        first, second = (datagen.generate_items(np.random.default_rng(7), spec) for _ in range(2))
+
+        for key in first:
+            np.testing.assert_array_equal(first[key], second[key])
+
+    def test_loads_consistent_items_holdings_and_carts(self):
+        call_command("generate_dataset", "--items", "400", "--users", "40", "--holdings", "300",
+                     "--cart-share", "0.5", "--batch-size", "150", "--as-of", "2025-01-01", stdout=io.StringIO())
+
+        items = Item.objects.filter(sku__startswith="GEN-").annotate(borrowed=Sum("inventoryitem__quantity"))
+        self.assertEqual(items.count(), 400)
+        self.assertTrue(all(item.in_stock + (item.borrowed or 0) == item.total_amount for item in items))
+        self.assertEqual(InventoryItem.objects.count(), 300)
+        self.assertTrue(CartItem.objects.filter(cart__user__username__startswith="gen-").exists())
+        # Every cart line is a hold the stock on hand covers
+        self.assertTrue(items.filter(reserved__gt=0).exists())
+        self.assertFalse(Item.objects.filter(sku__startswith="GEN-", reserved__gt=F("in_stock")).exists())
+        self.assertLess(User.objects.filter(username__startswith="gen-", is_staff=True).count(), 10)
+        self.assertEqual(stats.get().total_items, 400)
+        with self.assertRaises(CommandError):
+            call_command("generate_dataset", "--items", "1", stdout=io.StringIO())
@@ -1,25 +1,59 @@
 from rest_framework import viewsets
 from rest_framework.views import APIView
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
 
 from django.shortcuts import render, get_object_or_404, redirect, HttpResponse
 from rest_framework import viewsets, permissions
 from rest_framework.response import Response
 from rest_framework import status
 
-from .models import Cart, CartItem, Item, InventoryItem, ItemCategory
-from .serializers import ItemCategorySerializer, ItemSerializer
-from authentication.models import User
+from . import bulk, export, reservations
+from .conditional import (
+    category_etag, category_last_modified, conditional, inventory_etag, inventory_last_modified, inventory_table_etag,
+    item_etag, item_last_modified,
+)
+from .renderers import UJSONRenderer
+from .models import Cart, CartItem, Item, InventoryItem, ItemCategory, StockMovement
+from .serializers import ItemCategorySerializer, ItemRowSerializer, ItemSerializer
+from .checkout import CheckoutError, checkout_cart
+from .search import get_search_backend
+from .pagination import InvalidCursor, KeysetPagination, KeysetPaginator, count_mode
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
-from django.db import models
-from django.core.paginator import Paginator
-from django.http import HttpResponseForbidden, HttpResponse
+from django.db import models, transaction
+from django.conf import settings
+from django.http import Http404, HttpResponseForbidden, HttpResponse, StreamingHttpResponse
+from rest_framework.renderers import BrowsableAPIRenderer
+from django.utils.decorators import method_decorator
 
+@method_decorator(conditional(item_etag, item_last_modified), name='retrieve')
 class ItemViewSet(viewsets.ModelViewSet):
-    queryset = Item.objects.all()
+    queryset = Item.objects.select_related('category')
     serializer_class = ItemSerializer
+    pagination_class = KeysetPagination
+    renderer_classes = [UJSONRenderer, BrowsableAPIRenderer]
+
+    @method_decorator(conditional(inventory_etag, inventory_last_modified))
+    def list(self, request, *args, **kwargs):
+        """Same output as ModelViewSet.list, read as values() rows so no Item instances are built."""
+        rows = ItemRowSerializer()
+        queryset = rows.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(rows.to_representation(page))
+        return Response(rows.to_representation(queryset))
+
+    def _actor(self):
+        return self.request.user if self.request.user.is_authenticated else None
+
+    def perform_create(self, serializer):
+        actor = self._actor()
+        serializer.save(created_by=actor, updated_by=actor)
+
+    def perform_update(self, serializer):
+        # The stock ledger credits the write to updated_by
+        serializer.save(updated_by=self._actor())
 
     def destroy(self, request, *args, **kwargs):
         """Soft-delete: mark item inactive so dashboards can log the event."""
@@ -32,91 +66,107 @@ class ItemViewSet(viewsets.ModelViewSet):
         instance.save(update_fields=["is_active", "updated_at", "updated_by"])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, url_path='export', url_name='export', permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=[export.CSVRenderer, export.JSONLinesRenderer])
+    def export_items(self, request):
+        """Every active item matching q/status/category, streamed as CSV or JSON Lines (``?gzip=1`` to compress)."""
+        fmt = request.accepted_renderer.format
+        gzip = request.query_params.get('gzip') in ('1', 'true')
+        items = apply_item_filters(
+            Item.objects.filter(is_active=True),
+            **{key: request.query_params.get(key) for key in ('q', 'status', 'category')},
+        )
+        response = StreamingHttpResponse(
+            export.export(items, fmt, gzip),
+            content_type='application/gzip' if gzip else export.FORMATS[fmt],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export.filename(fmt, gzip)}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='bulk', url_name='bulk',
+            permission_classes=[permissions.IsAuthenticated])
+    def bulk_items(self, request):
+        """Create, update and soft-delete many items in one transaction; all rows are validated first."""
+        try:
+            result = bulk.apply(request.data, user=request.user)
+        except bulk.BulkError as e:
+            return Response(e.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+@method_decorator(conditional(category_etag, category_last_modified), name='list')
+@method_decorator(conditional(category_etag, category_last_modified), name='retrieve')
 class ItemCategoryViewSet(viewsets.ModelViewSet):
     queryset = ItemCategory.objects.all()
     serializer_class = ItemCategorySerializer
 
+def _cart_line(data, minimum):
+    """``(item_id, quantity)`` from a cart request; raises ValueError with the message for a 400."""
+    try:
+        item_id, quantity = int(data.get('item_id')), int(data.get('quantity'))
+    except (TypeError, ValueError):
+        raise ValueError("item_id and quantity must be integers.")
+    if quantity < minimum:
+        raise ValueError(f"Quantity must be at least {minimum}.")
+    return item_id, quantity
+
 class CartAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, format=None):
-        """Create or update the current user's cart."""
-        item_id = int(request.data.get('item_id'))
-        quantity = int(request.data.get('quantity'))
-        
+        """Add to the current user's cart, holding the stock for them."""
+        try:
+            item_id, quantity = _cart_line(request.data, 1)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        cart_item = cart.cart_items.filter(item__id=item_id).first()
-        
-        if not cart_item:
-            item = get_object_or_404(Item, id=item_id)
-            cart_item = CartItem(cart=cart, item=item, quantity=0)
-            
-        if quantity + cart_item.quantity > cart_item.item.in_stock:
-            return Response({"detail": "Not enough stock available."}, status=status.HTTP_400_BAD_REQUEST)
-
-        cart_item.quantity += quantity
-        cart_item.save()
+        try:
+            reservations.hold(cart, item_id, quantity, add=True)
+        except Item.DoesNotExist:
+            raise Http404
+        except reservations.ReservationError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return redirect("dashboard_cart")
    
     def patch(self, request, format=None):
-        """Update the quantity of an item in the current user's cart."""
-        item_id = int(request.data.get('item_id'))
-        quantity = int(request.data.get('quantity'))
+        """Set the quantity of an item in the current user's cart; 0 removes it."""
+        try:
+            item_id, quantity = _cart_line(request.data, 0)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         cart = get_object_or_404(Cart, user=request.user)
-        cart_item = get_object_or_404(CartItem, cart=cart, item__id=item_id)
-
-        if quantity > cart_item.item.in_stock:
-            return Response({"detail": "Not enough stock available."}, status=status.HTTP_400_BAD_REQUEST)
+        get_object_or_404(CartItem, cart=cart, item__id=item_id)
 
-        cart_item.quantity = quantity
-        cart_item.save()
+        try:
+            reservations.hold(cart, item_id, quantity)
+        except reservations.ReservationError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_200_OK)
     
     def delete(self, request, format=None):
-        """Remove an item from the current user's cart."""
+        """Remove some or all of an item from the current user's cart, releasing its hold."""
+        try:
+            item_id, quantity = _cart_line(request.data, 1)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         cart = get_object_or_404(Cart, user=request.user)
-        item_id = request.data.get('item_id')
-        quantity = request.data.get('quantity')
         cart_item = get_object_or_404(CartItem, cart=cart, item__id=item_id)
 
-        if cart_item.quantity >quantity:
+        if quantity > cart_item.quantity:
             return Response({"detail": "Quantity to remove exceeds quantity in cart."}, status=status.HTTP_400_BAD_REQUEST)
-        elif cart_item.quantity == quantity:
-            cart_item.quantity -= quantity
-            cart_item.save()
-            
-            if cart_item.quantity == 0:
-                cart_item.delete()
-        
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        reservations.hold(cart, item_id, cart_item.quantity - quantity)
+        return Response(status=status.HTTP_204_NO_CONTENT)
     
 @login_required
 def add_to_inventory_view(request):
-    """Add an item to the user's inventory."""
-    user = User.objects.get(id=request.user.id)
-    cart = user.cart.first()
-    
-    for cart_item in cart.cart_items.all():
-        item = cart_item.item
-        quantity = cart_item.quantity
-        
-        if item.in_stock < quantity:
-            return HttpResponse(status=400, content=f"Not enough {item.name}'s in stock")
-        
-        if user.inventory.filter(item=item).exists():
-            inventory_item = user.inventory.get(item=item)
-            inventory_item.quantity += quantity
-            inventory_item.save()
-        else:
-            inventory_item = InventoryItem(borrower=user, item=item, quantity=quantity)
-            inventory_item.save()
-            user.inventory.add(inventory_item)
-        
-        item.in_stock -= quantity
-        item.save()
-        
-        cart_item.delete()
+    """Check the user's cart out into their inventory."""
+    cart = Cart.objects.filter(user=request.user).first()
+    if cart:
+        try:
+            checkout_cart(request.user, cart)
+        except CheckoutError as e:
+            return HttpResponse(status=400, content=str(e))
     
     return redirect("user_inventory_page")
 
@@ -137,49 +187,36 @@ def add_category(request):
 @login_required
 def return_to_inventory_view(request):
     """Remove an item from the user's inventory."""
-    user = User.objects.get(id=request.user.id)
+    user = request.user
     item_id = int(request.POST.get('item_id'))
     quantity = int(request.POST.get('quantity'))
-    
-    item = get_object_or_404(Item, id=item_id)
-    inventory_item = get_object_or_404(InventoryItem, borrower=user, item=item)
-    
-    if inventory_item.quantity >= quantity:
-        inventory_item.quantity -= quantity
-        inventory_item.save()
-    
-    if inventory_item.quantity == 0:
-        inventory_item.delete()
-
-    item.in_stock += quantity
-    item.save()
+    if quantity <= 0:
+        return HttpResponse(status=400, content="Quantity must be positive.")
+
+    with transaction.atomic():
+        holding = InventoryItem.objects.filter(borrower=user, item_id=item_id)
+        # Conditional decrement, so two returns racing can't give back more than was borrowed
+        if not holding.filter(quantity__gte=quantity).update(quantity=models.F('quantity') - quantity):
+            get_object_or_404(holding)
+            return HttpResponse(status=400, content="You can't return more than you borrowed.")
+        holding.filter(quantity=0).delete()
+        Item.objects.adjust_stock([(item_id, quantity)], actor=user, reason=StockMovement.REASON_RETURN)
     return redirect("user_inventory_page")
 
 @login_required
+@conditional(inventory_table_etag, private=True)
 def inventory(request):
-    user = User.objects.get(id=request.user.id)
     categories = ItemCategory.objects.all()
     items = filter_items(request)
 
     per_page = get_pos_int_parameter('per_page', request, 10)
-    page_number = get_pos_int_parameter('page', request, 1)
+    items = keyset_page(request, items, per_page, ordering=('name', 'id'))
+    context = {'items': items, "categories": categories, "per_page": per_page}
 
-    paginator = Paginator(items, per_page)
-    items = paginator.get_page(page_number)
-    
-    cart = user.cart.first()
-    
-    if cart:
-        for item in items:
-            cart_item = cart.cart_items.filter(item=item).first()
-            if cart_item:
-                item.in_stock -= cart_item.quantity
-            
-        
     if 'HX-Request' in request.headers:
-        return render(request, 'cart/partials/inventory_table.html', {'items': items, "categories": categories,})
+        return render(request, 'cart/partials/inventory_table.html', context)
     
-    return render(request, "cart/inventory.html", {'items': items, "categories": categories, "full_inventory": True})
+    return render(request, "cart/inventory.html", {**context, "full_inventory": True})
 
 
 @login_required
@@ -195,15 +232,10 @@ def item_form(request, id=None):
 @login_required
 def my_inventory_view(request):
     """Render the user's inventory page."""
-    user = User.objects.get(id=request.user.id)
-    inventory_items = user.inventory.all()
+    inventory_items = request.user.inventory.select_related('item__category')
     
     per_page = get_pos_int_parameter('per_page', request, 10)
-    page_number = get_pos_int_parameter('page', request, 1)
-
-    paginator = Paginator(inventory_items, per_page)
-    inventory_items = paginator.get_page(page_number)
-    print(inventory_items)
+    inventory_items = keyset_page(request, inventory_items, per_page, ordering=('item__name', 'id'))
 
     if 'HX-Request' in request.headers:
         return render(request, 'cart/partials/my_inventory_table.html', {'items': inventory_items})
@@ -230,15 +262,37 @@ def get_pos_int_parameter(param_name: str, request, default: int) -> int:
     finally:
         return param
 
+def keyset_page(request, queryset, per_page, ordering):
+    """The page of ``queryset`` named by the ``cursor`` parameter; a bad cursor gives the first page.
+
+    ``?count=exact|estimate|none`` overrides ``INVENTRO_PAGINATION_COUNT`` for the total shown.
+    """
+    count = count_mode(request.GET.get('count'), getattr(settings, 'INVENTRO_PAGINATION_COUNT', 'estimate'))
+    paginator = KeysetPaginator(queryset, min(per_page, 100), ordering=ordering, count=count)
+    try:
+        return paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return paginator.page()
+
 def filter_items(request):
-    items = Item.objects.select_related('category').filter(is_active=True)
+    items = apply_item_filters(
+        Item.objects.select_related('category').filter(is_active=True),
+        q=request.GET.get('q'),
+        status=request.GET.get('status'),
+        category=request.GET.get('category'),
+    )
+    # compute value as in the full view
+    value_expr = models.ExpressionWrapper(models.F('cost') * models.F('in_stock'), output_field=models.DecimalField(max_digits=20, decimal_places=2))
+    # Item.available is in_stock - reserved, read straight off the row
+    items = items.annotate(value=value_expr)
+    return items
 
-    q = (request.GET.get('q') or '').strip()
-    status = request.GET.get('status')
-    category = request.GET.get('category')
 
+def apply_item_filters(items, q=None, status=None, category=None):
+    """The inventory list's q/status/category filters, shared with the export."""
+    q = (q or '').strip()
     if q:
-        items = items.filter(models.Q(name__icontains=q) | models.Q(sku__icontains=q))
+        items = get_search_backend().filter(items, q)
 
     if category:
         items = items.filter(category__name__iexact=category)
@@ -246,13 +300,9 @@ def filter_items(request):
     if status == 'in':
         items = items.filter(in_stock__gt=0)
     elif status == 'out':
-        items = items.filter(in_stock=0)
+        items = items.filter(in_stock__lte=0)
     elif status == 'low':
         items = items.filter(in_stock__lt=models.F('total_amount'))
-        
-    # compute value as in the full view
-    value_expr = models.ExpressionWrapper(models.F('cost') * models.F('in_stock'), output_field=models.DecimalField(max_digits=20, decimal_places=2))
-    items = items.annotate(value=value_expr)
     return items
 
 
@@ -319,12 +369,18 @@ def api_search(request):
     q = (request.GET.get("q") or "").strip()
     results = {"items": [], "inventory": []}
     if q:
+        backend = get_search_backend()
         results["items"] = list(
-            Item.objects.filter(name__icontains=q).values("id", "name", "SKU")[:10]
+            backend.rank(Item.objects.filter(is_active=True), q).values("id", "name", "sku")[:10]
         )
         results["inventory"] = list(
-            InventoryItem.objects.filter(name__icontains=q).values(
-                "id", "name", "category", "location"
+            InventoryItem.objects.filter(item__in=backend.filter(Item.objects.all(), q))
+            .order_by("item__name", "id")
+            .values(
+                "id",
+                name=models.F("item__name"),
+                category=models.F("item__category__name"),
+                location=models.F("item__location"),
             )[:10]
         )
-    return Response(results)
\ No newline at end of file
+    return Response(results)
@@ -3,6 +3,7 @@ Django settings for inventro project (k8s-friendly).
 """
 from pathlib import Path
 import os
+import sys
 # from dotenv import load_dotenv
 # load_dotenv()
 
@@ -35,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'authentication',
     'dashboard',
     'channels',
@@ -153,11 +155,20 @@ WHITENOISE_USE_FINDERS = DEBUG
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Postgres LISTEN/NOTIFY, so group_send reaches consumers in every worker and pod
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "BACKEND": "inventory.channel_layer.PostgresChannelLayer",
+        "CONFIG": {
+            "expiry": 60,
+            "group_expiry": 86400,
+            "capacity": 100,
+        },
     }
 }
+# Tests keep messages in process; the Postgres layer would hold connections to the test database open
+if "test" in sys.argv[1:2]:
+    CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
 
 # Allow users to authenticate using either their username or email address.
 AUTHENTICATION_BACKENDS = [
@@ -178,3 +189,21 @@ OPENSEARCH_URL = os.getenv("OPENSEARCH_URL", "")
 OPENSEARCH_USER = os.getenv("OPENSEARCH_USER", "")
 OPENSEARCH_PASSWORD = os.getenv("OPENSEARCH_PASSWORD", "")
 OPENSEARCH_INDEX = os.getenv("OPENSEARCH_INDEX", "items")
+
+# Item search backend (dotted path); empty picks one from the database vendor
+INVENTRO_SEARCH_BACKEND = os.getenv("INVENTRO_SEARCH_BACKEND", "")
+
+# Totals shown with paginated lists: "estimate" (planner statistics), "exact" or "none"
+INVENTRO_PAGINATION_COUNT = os.getenv("INVENTRO_PAGINATION_COUNT", "estimate")
+
+# Low-stock WebSocket alerts: seconds to gather a batch, and to stay quiet about an item once announced
+INVENTRO_LOW_STOCK_ALERT_DELAY = float(os.getenv("INVENTRO_LOW_STOCK_ALERT_DELAY", "1"))
+INVENTRO_LOW_STOCK_ALERT_WINDOW = float(os.getenv("INVENTRO_LOW_STOCK_ALERT_WINDOW", "300"))
+
+# Seconds the inventory delta stream waits to batch item changes into one message
+INVENTRO_DELTA_DELAY = float(os.getenv("INVENTRO_DELTA_DELAY", "0.1"))
+# Age of the resume version a live delta message carries; must exceed how long any process takes to publish
+INVENTRO_DELTA_SETTLE = float(os.getenv("INVENTRO_DELTA_SETTLE", "5"))
+
+# Seconds a cart line keeps its stock reserved after the cart was last changed
+INVENTRO_CART_HOLD_SECONDS = int(os.getenv("INVENTRO_CART_HOLD_SECONDS", "1800"))
@@ -3,8 +3,8 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 from django.conf import settings
 
-from inventory.views import ItemCategoryViewSet, ItemViewSet, CartAPIView
-from dashboard.api_views import dashboard_stats, metrics, recent_activity
+from inventory.views import ItemCategoryViewSet, ItemViewSet, CartAPIView, api_search
+from dashboard.api_views import dashboard_stats, metrics, metrics_cube, recent_activity
 
 from django.urls import path
 # from inventro.dashboard.templates import views as dash_views
@@ -20,7 +20,9 @@ urlpatterns = [
     path('api/cart/', CartAPIView.as_view(), name='cart_api'),
     path('api/stats/', dashboard_stats, name='dashboard_stats'),
     path('api/metrics/', metrics, name='metrics'),
+    path('api/metrics/cube/', metrics_cube, name='metrics_cube'),
     path('api/activity/', recent_activity, name='recent_activity'),
+    path('api/search/', api_search, name='api_search'),
     path('dashboard/', include('dashboard.urls')),
     path('inventory/', include('inventory.urls')),
     # # Redirect root to login
@@ -38,6 +38,7 @@ kubectl -n inventro create secret generic inventro-url-secret --from-literal=TRU
 
 echo "Starting web deployments..."
 kubectl apply -f deployments/web-deployment.yaml
+kubectl apply -f deployments/worker-deployment.yaml
 
 kubectl wait --namespace inventro \
   --for=condition=ready pod \